@@ -0,0 +1,99 @@
+"""FrameDecoder and decode_stream fed with recorded serial reads and HID reports"""
+
+from zk9500_protocol import HID_REPORT_SIZE, FrameDecoder, decode_stream, encode_frame, split_frame
+
+TEMPLATE = bytes(i % 251 + 1 for i in range(300))
+
+
+def hid_reports(data: bytes):
+    """data cut into zero-padded 64-byte reports, as the scanner sends it"""
+    return [data[i:i + HID_REPORT_SIZE].ljust(HID_REPORT_SIZE, b'\x00')
+            for i in range(0, len(data), HID_REPORT_SIZE)]
+
+
+def test_serial_header_split_across_reads():
+    frame = encode_frame(0, 87, b'\x10\x20\x30')
+    chunks = [frame[:1], frame[1:3], frame[3:5], frame[5:]]
+    assert decode_stream(chunks) == [frame]
+
+
+def test_serial_two_frames_in_one_read():
+    first = encode_frame(0, 80, TEMPLATE[:20])
+    second = encode_frame(2, 0)
+    assert decode_stream([first + second]) == [first, second]
+
+
+def test_serial_frame_completes_in_the_read_that_starts_the_next():
+    first = encode_frame(0, 80, TEMPLATE[:10])
+    second = encode_frame(0, 81, TEMPLATE[10:30])
+    stream = first + second
+    chunks = [stream[:7], stream[7:len(first) + 2], stream[len(first) + 2:]]
+    assert decode_stream(chunks) == [first, second]
+
+
+def test_serial_resync_after_oversized_length():
+    # Left over from an aborted transfer; with the frame's first bytes every
+    # 4-byte window over it reads as a length far above max_payload
+    frame = encode_frame(0, 0x50, bytes(range(1, 245)))
+    decoder = FrameDecoder()
+    assert decoder.feed(b'\xff\xff' + frame[:20]) == []
+    assert decoder.feed(frame[20:]) == [frame]
+    assert decoder.discarded == 2
+    assert decoder.pending == 0
+
+
+def test_length_above_max_payload_is_not_a_header():
+    decoder = FrameDecoder(max_payload=8)
+    assert decoder.feed(b'\x00\x50\x09\x00') == []
+    assert decoder.discarded == 1
+    assert decoder.feed(encode_frame(0, 0x50, b'\x01' * 8)[1:]) == [encode_frame(0, 0x50, b'\x01' * 8)]
+
+
+def test_hid_template_over_several_reports():
+    frame = encode_frame(0, 90, TEMPLATE)
+    reports = hid_reports(frame)
+    assert len(reports) > 4
+    frames = decode_stream(reports, padded=True)
+    assert frames == [frame]
+    status, quality, payload = split_frame(frames[0])
+    assert (status, quality, bytes(payload)) == (0, 90, TEMPLATE)
+
+
+def test_hid_all_zero_reports_are_padding():
+    idle = bytes(HID_REPORT_SIZE)
+    frame = encode_frame(0, 90, TEMPLATE[:100])
+    reports = [idle, idle] + hid_reports(frame) + [idle]
+    assert decode_stream(reports, padded=True) == [frame]
+
+
+def test_hid_padding_after_a_frame_is_not_a_new_header():
+    decoder = FrameDecoder()
+    short = encode_frame(3, 0)
+    assert decoder.feed(hid_reports(short)[0], padded=True) == [short]
+    assert decoder.pending == 0
+
+
+def test_hid_zero_report_fed_alone_yields_nothing():
+    decoder = FrameDecoder()
+    assert decoder.feed(bytes(HID_REPORT_SIZE), padded=True) == []
+    assert decoder.pending == 0
+
+
+def test_hid_recorded_capture_session():
+    # Idle reports, a template, garbage from an aborted transfer, then a failed scan
+    idle = bytes(HID_REPORT_SIZE)
+    capture = encode_frame(0, 80, TEMPLATE)
+    resynced = encode_frame(0, 80, bytes(range(1, 245)))
+    failed = encode_frame(2, 0)
+    reports = ([idle] + hid_reports(capture) + [idle] + hid_reports(b'\xff\xff' + resynced)
+               + hid_reports(failed) + [idle])
+    assert decode_stream(reports, padded=True) == [capture, resynced, failed]
+
+
+def test_reset_drops_a_partial_frame():
+    decoder = FrameDecoder()
+    frame = encode_frame(0, 70, TEMPLATE[:40])
+    decoder.feed(frame[:10])
+    assert decoder.pending == 10
+    decoder.reset()
+    assert decoder.feed(frame) == [frame]
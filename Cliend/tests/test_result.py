@@ -0,0 +1,95 @@
+"""CaptureResult: dict behaviour, capture-time device fields and encodings"""
+
+import json
+
+import pytest
+
+from zk9500_result import HAS_MSGPACK, CaptureResult
+
+
+def device_info(**overrides):
+    info = {
+        'last_scan_time': 1700000000.0,
+        'total_scans': 12,
+        'serial': 'ZK1234',
+        'firmware': '1.2.3',
+        'resolution': '500 DPI',
+        'client_hostname': 'frontdesk',
+        'client_ip': '100.64.0.7'
+    }
+    info.update(overrides)
+    return info
+
+
+def make_result(**kwargs):
+    return CaptureResult(device_info(), memoryview(b'\x01\x02\x03'), 80, 'zkfinger_sdk', capture_mode='template',
+                         **kwargs)
+
+
+def test_reads_like_the_old_dict():
+    result = make_result()
+    assert result['success'] is True
+    assert result['quality'] == 80
+    assert result['imageSize'] == '3 bytes'
+    assert result.get('fingerprint_data') is None
+    assert 'fingerprint_data' not in result
+    assert list(result)[:3] == ['success', 'templateData', 'quality']
+
+
+def test_device_fields_are_taken_at_capture_time():
+    info = device_info()
+    result = CaptureResult(info, b'\x01', 70, 'usb_hid')
+    info.update(serial='OTHER', firmware='9.9', client_ip='10.0.0.1', total_scans=99)
+    assert result['deviceSerial'] == 'ZK1234'
+    assert result['firmware'] == '1.2.3'
+    assert result['scanCount'] == 12
+    assert result['clientInfo'] == {'hostname': 'frontdesk', 'tailscale_ip': '100.64.0.7'}
+
+
+def test_missing_quality_is_left_out():
+    result = CaptureResult(device_info(), b'\x01', None, 'zkfinger_sdk')
+    assert 'quality' not in result
+    assert 'quality' not in result.jsonable()
+
+
+def test_extra_keys_and_setdefault():
+    result = make_result()
+    result.setdefault('deviceId', 'sdk-0')
+    result['matchedUser'] = 'u1'
+    assert result['deviceId'] == 'sdk-0'
+    assert result.jsonable()['matchedUser'] == 'u1'
+    with pytest.raises(TypeError):
+        result['clientInfo'] = {}
+
+
+def test_json_encodings():
+    result = make_result(image=b'\xff' * 4, image_width=2, image_height=2)
+    legacy = json.loads(result.json_body())
+    assert legacy['templateData'] == [1, 2, 3]
+    assert legacy['fingerprint_data_base64'] == '/////w=='
+    binary = json.loads(result.json_body('binary'))
+    assert binary['templateFormat'] == 'binary' and binary['templateLength'] == 3
+    assert 'templateData' not in binary
+
+
+def test_body_is_encoded_once_until_the_result_changes():
+    result = make_result()
+    first = result.json_body()
+    assert result.json_body() is first
+    result['deviceId'] = 'sdk-1'
+    assert json.loads(result.json_body())['deviceId'] == 'sdk-1'
+
+
+def test_message_wraps_the_shared_body():
+    result = make_result()
+    text, template = result.message(command='capture_fingerprint').encode('binary')
+    assert json.loads(text)['command'] == 'capture_fingerprint'
+    assert bytes(template) == b'\x01\x02\x03'
+
+
+@pytest.mark.skipif(not HAS_MSGPACK, reason="msgpack not installed")
+def test_msgpack_keeps_templates_binary():
+    import msgpack
+    data = msgpack.unpackb(make_result().to_msgpack(type='scan'), raw=False)
+    assert data['type'] == 'scan'
+    assert data['templateData'] == b'\x01\x02\x03'
@@ -0,0 +1,127 @@
+"""CaptureScheduler queueing, coalescing, cancellation and shutdown"""
+
+import asyncio
+
+from zk9500_events import EventBus
+from zk9500_metrics import ServiceMetrics
+from zk9500_worker import CaptureScheduler
+
+
+class FakePool:
+    def __init__(self, controller):
+        self.controller = controller
+
+    def devices(self):
+        return [self.controller]
+
+    def get(self, device_id):
+        return self.controller if device_id == self.controller.device_id else None
+
+
+class FakeScanner:
+    """Stands in for ZK9500Controller; each scan waits for release()"""
+
+    def __init__(self):
+        self.device_id = 'dev-1'
+        self.device_info = {'connected': True}
+        self.metrics = ServiceMetrics()
+        self.events = EventBus()
+        self.pool = FakePool(self)
+        self.scans = 0
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def capture_fingerprint_async(self, timeout=None, **options):
+        self.scans += 1
+        self.started.set()
+        await self.release.wait()
+        return {'success': True, 'template': b'\x01\x02', 'quality': 80, 'scan': self.scans}
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+
+def test_explicit_client_id_coalesces_into_one_scan():
+    async def main():
+        scanner = FakeScanner()
+        scheduler = CaptureScheduler(scanner)
+        tasks = [asyncio.create_task(scheduler.capture(client_id='a')) for _ in range(3)]
+        await scanner.started.wait()
+        scanner.release.set()
+        results = await asyncio.gather(*tasks)
+        await scheduler.close()
+        return scanner, scheduler, results
+
+    scanner, scheduler, results = run(main())
+    assert scanner.scans == 1
+    assert scheduler.stats['coalesced'] == 2
+    assert all(r['success'] and r['scan'] == 1 for r in results)
+
+
+def test_anonymous_requests_never_coalesce():
+    async def main():
+        scanner = FakeScanner()
+        scanner.release.set()
+        scheduler = CaptureScheduler(scanner)
+        results = await asyncio.gather(scheduler.capture(), scheduler.capture())
+        await scheduler.close()
+        return scanner, results
+
+    scanner, results = run(main())
+    assert scanner.scans == 2
+    assert sorted(r['scan'] for r in results) == [1, 2]
+
+
+def test_cancel_answers_every_waiter_of_a_queued_request():
+    async def main():
+        scanner = FakeScanner()
+        scheduler = CaptureScheduler(scanner)
+        busy = asyncio.create_task(scheduler.capture(client_id='other'))
+        await scanner.started.wait()
+        waiters = [asyncio.create_task(scheduler.capture(client_id='a')) for _ in range(2)]
+        await asyncio.sleep(0)
+        cancelled = scheduler.cancel('a')
+        results = await asyncio.gather(*waiters)
+        scanner.release.set()
+        await busy
+        await scheduler.close()
+        return scanner, scheduler, cancelled, results
+
+    scanner, scheduler, cancelled, results = run(main())
+    assert cancelled == 1
+    assert [r['reason'] for r in results] == ['cancelled', 'cancelled']
+    assert scanner.scans == 1
+    assert scheduler.get_status()['depth'] == 0
+
+
+def test_close_answers_queued_and_in_flight_waiters():
+    async def main():
+        scanner = FakeScanner()
+        scheduler = CaptureScheduler(scanner)
+        in_flight = asyncio.create_task(scheduler.capture())
+        await scanner.started.wait()
+        queued = asyncio.create_task(scheduler.capture())
+        await asyncio.sleep(0)
+        await scheduler.close()
+        return await asyncio.gather(in_flight, queued)
+
+    results = run(main())
+    assert [r['reason'] for r in results] == ['shutting_down', 'shutting_down']
+
+
+def test_queued_request_times_out_with_a_result():
+    async def main():
+        scanner = FakeScanner()
+        scheduler = CaptureScheduler(scanner)
+        busy = asyncio.create_task(scheduler.capture())
+        await scanner.started.wait()
+        result = await scheduler.capture(timeout=0.05)
+        scanner.release.set()
+        await busy
+        await scheduler.close()
+        return scheduler, result
+
+    scheduler, result = run(main())
+    assert result['reason'] == 'request_timeout'
+    assert scheduler.stats['expired'] == 1
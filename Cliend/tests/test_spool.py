@@ -0,0 +1,85 @@
+"""UploadSpool: durable queue, batching, retries and dead rows"""
+
+import json
+
+import pytest
+
+from zk9500_spool import UploadError, UploadSpool, encode_payload
+
+
+@pytest.fixture
+def spool(tmp_path):
+    spool = UploadSpool(None, tmp_path / 'upload_spool.db', url='http://backend.invalid/upload',
+                        batch_size=2, max_items=5)
+    spool.open()
+    yield spool
+    spool.close()
+
+
+def capture_posts(spool, error=None):
+    """Replace the HTTP post with a recorder, failing with error when given"""
+    batches = []
+
+    def post(batch):
+        if error is not None:
+            raise error
+        batches.append([key for _, key, _, _, _ in batch])
+    spool.post = post
+    return batches
+
+
+def test_payload_encodes_bytes_and_leaves_out_the_image():
+    data = json.loads(encode_payload({'templateData': b'\x01\x02', 'fingerprint_data': b'\xff' * 10, 'quality': 80}))
+    assert data == {'templateData': 'AQI=', 'quality': 80}
+
+
+def test_drain_uploads_in_order_and_in_batches(spool):
+    keys = [spool.enqueue('scan', {'n': n}) for n in range(3)]
+    batches = capture_posts(spool)
+    assert spool.drain() == 3
+    assert batches == [keys[:2], keys[2:]]
+    assert spool.depth()['depth'] == 0
+
+
+def test_same_idempotency_key_is_queued_once(spool):
+    spool.enqueue('scan', {'n': 1}, key='k1')
+    spool.enqueue('scan', {'n': 2}, key='k1')
+    assert spool.depth()['depth'] == 1
+
+
+def test_queue_survives_a_reopen(spool):
+    spool.enqueue('identify', {'userId': 'u1'}, key='k1')
+    spool.close()
+    spool.open()
+    batches = capture_posts(spool)
+    assert spool.drain() == 1
+    assert batches == [['k1']]
+
+
+def test_retryable_failure_keeps_items_and_backs_off(spool):
+    spool.enqueue('scan', {'n': 1})
+    capture_posts(spool, UploadError('connection refused'))
+    assert spool.drain() == 0
+    assert spool.failures == 1
+    assert spool.depth()['depth'] == 1
+    assert spool.depth()['dead'] == 0
+    assert spool.next_batch() == []  # Not due again until the backoff passes
+
+
+def test_permanent_failure_marks_items_dead(spool):
+    spool.enqueue('scan', {'n': 1})
+    spool.enqueue('scan', {'n': 2})
+    capture_posts(spool, UploadError('HTTP 422 Unprocessable Entity', permanent=True))
+    assert spool.drain() == 0
+    assert spool.stats['rejected'] == 2
+    assert spool.failures == 0
+    assert spool.depth()['dead'] == 2
+
+
+def test_full_spool_drops_the_oldest_items(spool):
+    keys = [spool.enqueue('scan', {'n': n}) for n in range(7)]
+    assert spool.stats['evicted'] == 2
+    spool.batch_size = 10
+    batches = capture_posts(spool)
+    spool.drain()
+    assert batches == [keys[2:]]
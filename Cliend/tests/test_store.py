@@ -0,0 +1,92 @@
+"""TemplateStore: append, tombstones, string deletes, crash recovery and compaction"""
+
+import pytest
+
+from zk9500_store import HEADER_SIZE, TemplateStore
+
+
+def record(user_id, finger=0, fill=1, size=64):
+    return {'userId': user_id, 'finger': finger, 'template': bytes([fill]) * size}
+
+
+def live(store):
+    return {(r['userId'], r['finger']): bytes(r['template']) for r in store.records()}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TemplateStore(tmp_path / 'templates.dat', template_size=128)
+    store.open()
+    return store
+
+
+def test_records_survive_a_reopen(store):
+    store.apply([record('u1', 0, 1), record('u1', 1, 2), record('u2', 0, 3)], sync_version=7)
+    reopened = TemplateStore(store.path)
+    assert reopened.open() == 3
+    assert reopened.sync_version == 7
+    assert live(reopened)[('u1', 1)] == bytes([2]) * 64
+
+
+def test_upsert_replaces_a_finger(store):
+    store.apply([record('u1', 0, 1)])
+    store.apply([record('u1', 0, 9)])
+    assert live(store) == {('u1', 0): bytes([9]) * 64}
+    assert store.dead == 1
+
+
+def test_string_delete_removes_every_finger_of_the_user(store):
+    store.apply([record('u1', 0), record('u1', 1), record('u2', 0)])
+    applied, deleted = store.apply([record('u3', 0)], ['u1'])
+    assert sorted(deleted) == [('u1', 0), ('u1', 1)]
+    assert len(applied) == 1
+    assert sorted(live(store)) == [('u2', 0), ('u3', 0)]
+
+
+def test_dict_delete_with_and_without_finger(store):
+    store.apply([record('u1', 0), record('u1', 1), record('u2', 0), record('u2', 3)])
+    _, deleted = store.apply(deletes=[{'userId': 'u1', 'finger': 1}, {'userId': 'u2'}])
+    assert sorted(deleted) == [('u1', 1), ('u2', 0), ('u2', 3)]
+    reopened = TemplateStore(store.path)
+    reopened.open()
+    assert sorted(live(reopened)) == [('u1', 0)]
+
+
+def test_malformed_delete_is_rejected_before_any_write(store):
+    store.apply([record('u1', 0)], sync_version=1)
+    size = store.path.stat().st_size
+    with pytest.raises(ValueError):
+        store.apply([record('u2', 0)], ['u1', {'finger': 0}], sync_version=2)
+    assert store.path.stat().st_size == size
+    assert store.sync_version == 1
+    assert sorted(live(store)) == [('u1', 0)]
+
+
+def test_torn_append_is_cut_off_on_open(store):
+    store.apply([record('u1', 0)])
+    with open(store.path, 'ab') as f:
+        f.write(b'\x01' * 50)  # Half a record, never committed in the header
+    reopened = TemplateStore(store.path)
+    assert reopened.open() == 1
+    assert store.path.stat().st_size == HEADER_SIZE + reopened.record_size
+
+
+def test_corrupt_record_is_skipped(store):
+    store.apply([record('u1', 0, 1), record('u2', 0, 2)])
+    with open(store.path, 'r+b') as f:
+        f.seek(HEADER_SIZE + store.record_size + 60)
+        f.write(b'\xee')
+    reopened = TemplateStore(store.path)
+    assert reopened.open() == 1
+    assert reopened.corrupt == 1
+    assert sorted(live(reopened)) == [('u1', 0)]
+
+
+def test_compaction_keeps_only_live_records(store):
+    store.apply([record(f'u{i}') for i in range(5)])
+    store.apply(deletes=['u0', 'u1', 'u2'])
+    assert store.compact() == 6
+    assert store.count == 2
+    reopened = TemplateStore(store.path)
+    assert reopened.open() == 2
+    assert sorted(live(reopened)) == [('u3', 0), ('u4', 0)]
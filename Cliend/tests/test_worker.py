@@ -0,0 +1,68 @@
+"""DeviceWorker: one device-owning thread, also across stop()"""
+
+import threading
+import time
+
+import pytest
+
+from zk9500_worker import DeviceWorker
+
+
+def test_calls_run_on_the_worker_thread():
+    worker = DeviceWorker()
+    try:
+        assert worker.call(threading.current_thread).name == worker.name
+        assert worker.call(worker.in_worker_thread)
+    finally:
+        worker.stop()
+    assert not worker.is_alive
+
+
+def test_stop_timeout_never_starts_a_second_owner():
+    worker = DeviceWorker()
+    release = threading.Event()
+    active, overlaps = [], []
+
+    def device_call(seconds):
+        active.append(threading.current_thread())
+        if len(active) > 1:
+            overlaps.append(list(active))
+        if seconds:
+            release.wait(seconds)
+        active.remove(threading.current_thread())
+        return threading.current_thread()
+
+    long_call = worker.submit(device_call, 5)
+    while not worker.busy:
+        time.sleep(0.01)
+    worker.stop(timeout=0.05)
+    assert worker.is_alive  # Still finishing the long call
+
+    later = worker.submit(device_call, 0)
+    time.sleep(0.1)
+    assert not later.done()  # Waits for the old thread instead of running beside it
+
+    release.set()
+    first = long_call.result(2)
+    second = later.result(2)
+    worker.stop()
+    assert overlaps == []
+    assert first is not second
+    assert not first.is_alive()
+
+
+def test_stop_fails_queued_calls():
+    worker = DeviceWorker()
+    release = threading.Event()
+    busy = worker.submit(release.wait, 5)
+    while not worker.busy:
+        time.sleep(0.01)
+    queued = worker.submit(lambda: 'never')
+    stopper = threading.Thread(target=worker.stop)
+    stopper.start()
+    with pytest.raises(RuntimeError):
+        queued.result(2)
+    release.set()
+    stopper.join(2)
+    assert busy.result(1) is True
+    assert not worker.is_alive
@@ -0,0 +1,734 @@
+#!/usr/bin/env python3
+"""
+ZK9500 Benchmarks
+=================
+
+Benchmarks for the ZK9500 bridge that run without a physical scanner.
+
+Usage:
+    python zk9500_benchmark.py [--json] serial [--runs 20] [--template-size 512]
+    python zk9500_benchmark.py [--json] ws_payload [--runs 2000] [--template-size 1024]
+    python zk9500_benchmark.py [--json] identify [--sizes 1000,10000] [--probes 20]
+    python zk9500_benchmark.py [--json] result_alloc [--scans 2000] [--clients 4]
+    python zk9500_benchmark.py [--json] hid_decode [--runs 2000] [--template-size 1024]
+    python zk9500_benchmark.py [--json] load [--ws-clients 8] [--http-clients 4] [--duration 20]
+
+Author: Pattani Installment System
+Version: 1.0.0
+"""
+
+import argparse
+import asyncio
+import collections
+import configparser
+import contextlib
+import gc
+import itertools
+import json
+import logging
+import os
+import shutil
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Add current directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds"""
+    ordered = sorted(samples)
+    return {
+        'runs': len(ordered),
+        'mean_ms': round(statistics.mean(ordered) * 1000, 2),
+        'p50_ms': round(ordered[len(ordered) // 2] * 1000, 2),
+        'p95_ms': round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000, 2),
+        'p99_ms': round(ordered[min(int(len(ordered) * 0.99), len(ordered) - 1)] * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2)
+    }
+
+class PtyFakeDevice:
+    """Fake serial ZK9500 on a pseudo-terminal (Linux/macOS only)
+
+    Answers the test command with a short frame and the capture command
+    with a framed template after finger_delay seconds, written in small
+    chunks like a real UART would deliver it.
+    """
+
+    def __init__(self, template_size: int = 512, finger_delay: float = 0.05,
+                 chunk_size: int = 64, chunk_gap: float = 0.002):
+        import pty
+        import tty
+
+        self.template_size = template_size
+        self.finger_delay = finger_delay
+        self.chunk_size = chunk_size
+        self.chunk_gap = chunk_gap
+        self.master_fd, self.slave_fd = pty.openpty()
+        tty.setraw(self.master_fd)
+        self.port_name = os.ttyname(self.slave_fd)
+        self.running = True
+        self.thread = threading.Thread(target=self._serve, name="pty-fake-zk9500", daemon=True)
+        self.thread.start()
+
+    def frame(self, status: int, quality: int, payload: bytes) -> bytes:
+        return bytes([status, quality]) + len(payload).to_bytes(2, 'little') + payload
+
+    def _serve(self):
+        while self.running:
+            try:
+                command = os.read(self.master_fd, 4)
+            except OSError:
+                break
+            if command[:2] == b'\x02\x01':
+                time.sleep(self.finger_delay)
+                response = self.frame(0, 87, bytes(i % 256 for i in range(self.template_size)))
+            else:
+                response = self.frame(0, 0, (12345).to_bytes(4, 'little') + bytes([1, 0]))
+
+            for offset in range(0, len(response), self.chunk_size):
+                os.write(self.master_fd, response[offset:offset + self.chunk_size])
+                time.sleep(self.chunk_gap)
+
+    def close(self):
+        self.running = False
+        for fd in (self.master_fd, self.slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+def legacy_poll_capture(port, timeout: float = 15.0) -> bytes:
+    """The pre-reader-thread capture loop, kept here as the baseline"""
+    port.reset_input_buffer()
+    port.write(bytes([0x02, 0x01, 0x00, 0x00]))
+    port.flush()
+
+    start_time = time.time()
+    response_data = b''
+    while time.time() - start_time < timeout:
+        if port.in_waiting > 0:
+            chunk = port.read(port.in_waiting)
+            response_data += chunk
+            if len(response_data) >= 8:
+                break
+        time.sleep(0.1)
+    return response_data
+
+def bench_serial(args) -> Dict:
+    """Time-to-result for serial capture: legacy polling vs reader thread"""
+    import serial
+    from zk9500_service import ZK9500Controller
+
+    device = PtyFakeDevice(template_size=args.template_size, finger_delay=args.finger_delay)
+    try:
+        port = serial.Serial(device.port_name, 115200, timeout=3, write_timeout=3)
+
+        legacy, legacy_sizes = [], []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            data = legacy_poll_capture(port)
+            legacy.append(time.perf_counter() - start)
+            legacy_sizes.append(max(len(data) - 4, 0))
+            time.sleep(0.05)
+            port.reset_input_buffer()
+
+        controller = ZK9500Controller(configparser.ConfigParser())
+        controller.port = port
+        controller.connection_type = 'serial'
+        controller.device_info['connected'] = True
+        controller.start_serial_reader()
+
+        reader, reader_sizes = [], []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            result = controller.capture_fingerprint_serial()
+            reader.append(time.perf_counter() - start)
+            reader_sizes.append(len(result.get('templateData') or []))
+
+        controller.stop_serial_reader()
+        port.close()
+    finally:
+        device.close()
+
+    return {
+        'benchmark': 'serial',
+        'template_size': args.template_size,
+        'finger_delay_ms': args.finger_delay * 1000,
+        'legacy_polling': {**summarize(legacy), 'template_bytes': min(legacy_sizes)},
+        'reader_thread': {**summarize(reader), 'template_bytes': min(reader_sizes)}
+    }
+
+def bench_ws_payload(args) -> Dict:
+    """WebSocket capture response size and encode time per template format"""
+    import base64
+    from zk9500_service import ZK9500WebSocketServer
+
+    template = os.urandom(args.template_size)
+    response = {
+        'command': 'capture_fingerprint',
+        'success': True,
+        'templateData': template,
+        'quality': 87,
+        'deviceSerial': 'ZK12345',
+        'firmware': 'v1.0',
+        'resolution': '500 DPI',
+        'imageSize': f"{len(template)} bytes",
+        'captureTime': time.time(),
+        'scanCount': 1,
+        'connectionType': 'serial',
+        'clientInfo': {'hostname': 'bench', 'tailscale_ip': '100.64.0.1'}
+    }
+
+    encoders = {
+        'json_int_list': lambda: ZK9500WebSocketServer.encode_response(response, 'json'),
+        'json_base64': lambda: [json.dumps({**response, 'templateData': base64.b64encode(template).decode('utf-8')})],
+        'binary': lambda: ZK9500WebSocketServer.encode_response(response, 'binary')
+    }
+
+    report = {'benchmark': 'ws_payload', 'template_size': args.template_size}
+    for name, encode in encoders.items():
+        messages = encode()
+        payload = sum(len(m.encode('utf-8')) if isinstance(m, str) else len(m) for m in messages)
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            encode()
+        elapsed = time.perf_counter() - start
+        report[name] = {
+            'payload_bytes': payload,
+            'messages': len(messages),
+            'encode_us': round(elapsed / args.runs * 1e6, 2)
+        }
+    return report
+
+def bench_identify(args) -> Dict:
+    """1:N identification time through FingerprintIdentifier with the bitwise matcher
+
+    The gallery is random bytes and probes are copies with bits flipped,
+    so the recall reported here says nothing about real ZK templates.
+    """
+    import numpy as np
+    from zk9500_matcher import BitwiseTemplateMatcher, FingerprintIdentifier
+
+    rng = np.random.default_rng(9500)
+    report = {
+        'benchmark': 'identify',
+        'templates': 'synthetic',
+        'template_size': args.template_size,
+        'noise': args.noise
+    }
+    for size in (int(s) for s in args.sizes.split(',')):
+        gallery = rng.integers(0, 256, (size, args.template_size), dtype=np.uint8)
+        identifier = FingerprintIdentifier(None, BitwiseTemplateMatcher(), threshold=0)
+
+        # Probes are enrolled templates with a share of their bits flipped
+        targets = rng.integers(0, size, args.probes)
+        probes = []
+        for target in targets:
+            flips = np.packbits(rng.random(args.template_size * 8) < args.noise)
+            probes.append(bytes(gallery[target] ^ flips))
+
+        start = time.perf_counter()
+        for index, template in enumerate(gallery):
+            identifier.add(f"user-{index}", template.tobytes())
+        load = time.perf_counter() - start
+
+        samples, hits = [], 0
+        for target, probe in zip(targets, probes):
+            start = time.perf_counter()
+            result = identifier.identify(probe)
+            samples.append(time.perf_counter() - start)
+            hits += result['userId'] == f"user-{target}"
+        report[f"exhaustive_{size}"] = {
+            **summarize(samples),
+            'load_s': round(load, 2),
+            'recall': round(hits / len(probes), 3)
+        }
+    return report
+
+def recorded_hid_reports(template: bytes) -> Tuple[List[bytes], List[bytes]]:
+    """HID reports as a scanner delivers them, and the frames they must decode to
+
+    Covers idle all-zero reports, a template split over several padded
+    reports, garbage left over from an aborted transfer, and a short
+    status-only frame.
+    """
+    from zk9500_protocol import encode_frame, HID_REPORT_SIZE
+
+    def reports(data: bytes) -> List[bytes]:
+        return [data[i:i + HID_REPORT_SIZE].ljust(HID_REPORT_SIZE, b'\x00')
+                for i in range(0, len(data), HID_REPORT_SIZE)]
+
+    idle = bytes(HID_REPORT_SIZE)
+    capture = encode_frame(0, 80, template)
+    # 244-byte payload: every 4-byte window over the garbage reads as too long to be a header
+    resynced = encode_frame(0, 80, bytes(range(1, 245)))
+    failed = encode_frame(2, 0)
+    return (
+        [idle, idle] + reports(capture) + [idle] + reports(b'\xff\xff' + resynced) + reports(failed) + [idle],
+        [capture, resynced, failed]
+    )
+
+def bench_hid_decode(args) -> Dict:
+    """HID report decoding: recorded reports through decode_stream, checked, then timed"""
+    from zk9500_protocol import FrameDecoder, decode_stream
+
+    template = bytes(i % 251 + 1 for i in range(args.template_size))
+    reports, expected = recorded_hid_reports(template)
+    assert [bytes(frame) for frame in decode_stream(reports, padded=True)] == expected
+    # Padding must not be read as an empty frame, even fed one report at a time
+    decoder = FrameDecoder()
+    assert [f for report in reports for f in decoder.feed(report, padded=True)][0] == expected[0]
+
+    samples = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        decode_stream(reports, padded=True)
+        samples.append(time.perf_counter() - start)
+    return {
+        'benchmark': 'hid_decode',
+        'template_size': args.template_size,
+        'reports': len(reports),
+        'frames': len(expected),
+        'decode': summarize(samples)
+    }
+
+def legacy_capture_result(device_info: Dict, template, quality: int) -> Dict:
+    """The per-scan dict the capture paths built before CaptureResult, kept as the baseline"""
+    template_data = bytes(template)
+    return {
+        'success': True,
+        'templateData': template_data,
+        'quality': min(quality, 100),
+        'deviceSerial': device_info['serial'],
+        'firmware': device_info['firmware'],
+        'resolution': device_info['resolution'],
+        'imageSize': f"{len(template_data)} bytes",
+        'captureTime': device_info['last_scan_time'],
+        'scanCount': device_info['total_scans'],
+        'connectionType': 'serial',
+        'clientInfo': {
+            'hostname': device_info['client_hostname'],
+            'tailscale_ip': device_info['client_ip']
+        }
+    }
+
+def bench_result_alloc(args) -> Dict:
+    """Per-scan allocations and time: result dicts vs CaptureResult, answered over
+    HTTP and fanned out to WebSocket subscribers"""
+    import tracemalloc
+    from zk9500_result import CaptureResult, merge_json
+    from zk9500_service import ZK9500WebSocketServer
+
+    # A received frame: 4-byte header, then the template
+    frame = bytearray(4) + bytearray(i % 256 for i in range(args.template_size))
+    device_info = {
+        'serial': 'ZK12345',
+        'firmware': 'v1.0',
+        'resolution': '500 DPI',
+        'last_scan_time': time.time(),
+        'total_scans': 1,
+        'client_hostname': 'bench',
+        'client_ip': '100.64.0.1'
+    }
+    timestamp = time.time()
+
+    def build_dict():
+        result = legacy_capture_result(device_info, memoryview(frame)[4:], 87)
+        result.setdefault('deviceId', 'zk0')
+        return result
+
+    def scan_dict():
+        result = build_dict()
+        # The HTTP route's old copy-and-convert step
+        response_data = result.copy()
+        response_data['templateData'] = list(result['templateData'])
+        messages = [json.dumps(response_data)]
+        for _ in range(args.clients):
+            messages += ZK9500WebSocketServer.encode_response(
+                {'type': 'scan', 'timestamp': timestamp, 'dropped': 0, **result}, 'json'
+            )
+        return messages
+
+    def build_compact():
+        result = CaptureResult(device_info, memoryview(frame)[4:], 87, 'serial')
+        result.setdefault('deviceId', 'zk0')
+        return result
+
+    def scan_compact():
+        result = build_compact()
+        messages = [merge_json({'timestamp': timestamp}, result.json_body())]
+        for _ in range(args.clients):
+            messages += ZK9500WebSocketServer.encode_response(
+                result.message(type='scan', timestamp=timestamp, dropped=0), 'json'
+            )
+        return messages
+
+    assert json.loads(scan_dict()[1]) == json.loads(scan_compact()[1])
+
+    report = {
+        'benchmark': 'result_alloc',
+        'template_size': args.template_size,
+        'clients': args.clients
+    }
+    for name, build, scan in (('dict', build_dict, scan_dict), ('capture_result', build_compact, scan_compact)):
+        tracemalloc.start()
+        # Memory held by results still referenced (queues, coalesced waiters)
+        base = tracemalloc.get_traced_memory()[0]
+        kept = [build() for _ in range(args.scans)]
+        retained = (tracemalloc.get_traced_memory()[0] - base) / args.scans
+        del kept
+
+        # Transient allocation peak of one scan answered to every client
+        peaks = []
+        for _ in range(100):
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            scan()
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        for _ in range(args.scans):
+            scan()
+        elapsed = time.perf_counter() - start
+        report[name] = {
+            'retained_bytes': round(retained),
+            'peak_bytes_per_scan': round(statistics.median(peaks)),
+            'us_per_scan': round(elapsed / args.scans * 1e6, 2)
+        }
+    return report
+
+# Load test: each client cycles through these; HTTP uses the matching route
+LOAD_COMMANDS = ('test', 'status', 'capture_fingerprint')
+HTTP_ROUTES = {
+    'test': ('GET', '/test'),
+    'status': ('GET', '/status'),
+    'capture_fingerprint': ('POST', '/capture')
+}
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def rss_bytes() -> Optional[int]:
+    """Resident memory of this process (Linux; None elsewhere)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class HTTPLoadClient:
+    """Keep-alive HTTP/1.1 client on asyncio streams, so the load test needs no HTTP package"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, method: str, path: str, body: bytes = b'') -> Tuple[int, bytes]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        headers = f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nContent-Length: {len(body)}\r\n"
+        if body:
+            headers += "Content-Type: application/json\r\n"
+        self.writer.write(headers.encode('ascii') + b"\r\n" + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("HTTP server closed the connection")
+        status = int(status_line.split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        return status, await self.reader.readexactly(length)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            with contextlib.suppress(Exception):
+                await self.writer.wait_closed()
+
+class LoadRecorder:
+    """Latency samples per front-end and command, kept only while measuring"""
+
+    def __init__(self):
+        self.measuring = False
+        self.samples: Dict[Tuple[str, str], List[float]] = collections.defaultdict(list)
+        self.errors: "collections.Counter[Tuple[str, str]]" = collections.Counter()
+        self.loop_lag: List[float] = []
+
+    def record(self, front_end: str, command: str, seconds: float, ok: bool):
+        if self.measuring:
+            self.samples[(front_end, command)].append(seconds)
+            if not ok:
+                self.errors[(front_end, command)] += 1
+
+async def ws_load_client(url: str, client_id: str, commands, recorder: LoadRecorder, stop: threading.Event):
+    """One WebSocket client sending commands back to back
+
+    Each client sends its own client_id, like a front-end that wants its
+    repeated capture requests coalesced.
+    """
+    import websockets
+
+    async with websockets.connect(url, max_size=None) as websocket:
+        await websocket.recv()  # Welcome message
+        for command in itertools.cycle(commands):
+            if stop.is_set():
+                return
+            started = time.perf_counter()
+            await websocket.send(json.dumps({'command': command, 'client_id': client_id}))
+            while True:
+                reply = json.loads(await websocket.recv())
+                if reply.get('command') == command:
+                    break
+            recorder.record('ws', command, time.perf_counter() - started, bool(reply.get('success')))
+
+async def http_load_client(port: int, client_id: str, commands, recorder: LoadRecorder, stop: threading.Event):
+    """One HTTP client on a keep-alive connection, with its own client_id"""
+    client = HTTPLoadClient('127.0.0.1', port)
+    body = json.dumps({'client_id': client_id}).encode('utf-8')
+    try:
+        for command in itertools.cycle(commands):
+            if stop.is_set():
+                return
+            method, path = HTTP_ROUTES[command]
+            started = time.perf_counter()
+            status, _ = await client.request(method, path, body if method == 'POST' else b'')
+            recorder.record('http', command, time.perf_counter() - started, status == 200)
+    finally:
+        await client.close()
+
+async def probe_loop_lag(recorder: LoadRecorder, stop: threading.Event, interval: float = 0.05):
+    """Runs on the service's loop: how late a short sleep wakes up"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        if recorder.measuring:
+            recorder.loop_lag.append(max(loop.time() - started - interval, 0.0))
+
+def load_test_config(args, workdir: Path) -> configparser.ConfigParser:
+    """config.ini with the simulator on, free local ports and scratch state files"""
+    config = configparser.ConfigParser()
+    config.read(Path(__file__).parent / 'config.ini')
+    simulator = {
+        'enabled': 'true',
+        'transports': args.transport,
+        'devices': str(args.devices),
+        'finger_delay': args.finger_delay
+    }
+    for option in args.sim:
+        key, _, value = option.partition('=')
+        simulator[key.strip()] = value.strip()
+    config.read_dict({
+        'server': {'host': '127.0.0.1', 'port': str(free_port())},
+        'api': {'host': '127.0.0.1', 'port': str(free_port())},
+        'device': {'state_file': str(workdir / 'device_state.json')},
+        'matcher': {'templates_url': '', 'templates_file': '', 'store_file': ''},
+        'upload': {'url': '', 'spool_file': str(workdir / 'upload_spool.db')},
+        'tracing': {'export_file': ''},
+        'simulator': simulator
+    })
+    return config
+
+def wait_for_service(service, devices: int, timeout: float = 30.0):
+    """Block until both servers listen and the simulated scanners are connected"""
+    controller = service.websocket_server.zkt_controller
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        http_up = service.http_server is None or (service.http_server.server is not None and service.http_server.server.started)
+        connected = sum(1 for device in controller.pool.devices() if device.device_info['connected'])
+        if service.websocket_server.is_running and http_up and connected >= devices:
+            return
+        time.sleep(0.1)
+    raise RuntimeError(f"Service not ready after {timeout:.0f}s (scanners connected: {connected}/{devices})")
+
+async def drive_load(args, service, recorder: LoadRecorder) -> Dict:
+    """Run the clients, measure after the warm-up, and summarize"""
+    config = service.config
+    commands = [command.strip() for command in args.commands.split(',') if command.strip()]
+    stop = threading.Event()
+    lag_probe = asyncio.run_coroutine_threadsafe(probe_loop_lag(recorder, stop), service.loop)
+
+    ws_url = f"ws://127.0.0.1:{config.get('server', 'port')}"
+    http_port = int(config.get('api', 'port'))
+    clients = [
+        asyncio.create_task(ws_load_client(ws_url, f"load-ws-{index}", commands, recorder, stop))
+        for index in range(args.ws_clients)
+    ]
+    if service.http_server:
+        clients += [
+            asyncio.create_task(http_load_client(http_port, f"load-http-{index}", commands, recorder, stop))
+            for index in range(args.http_clients)
+        ]
+
+    await asyncio.sleep(args.warmup)
+    gc.collect()
+    rss_start = rss_bytes()
+    objects_start = len(gc.get_objects())
+    rss_peak = rss_start or 0
+    watchdog = service.websocket_server.zkt_controller.loop_watchdog
+    stalls_start = watchdog.stats['stalls']
+    recorder.measuring = True
+    started = time.perf_counter()
+    while time.perf_counter() - started < args.duration:
+        await asyncio.sleep(0.5)
+        rss_peak = max(rss_peak, rss_bytes() or 0)
+    recorder.measuring = False
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    outcomes = await asyncio.gather(*clients, return_exceptions=True)
+    await asyncio.wrap_future(lag_probe)
+    gc.collect()
+    rss_end = rss_bytes()
+
+    total = sum(len(samples) for samples in recorder.samples.values())
+    captures = sum(len(samples) for (_, command), samples in recorder.samples.items() if command == 'capture_fingerprint')
+    report = {
+        'benchmark': 'load',
+        'transport': args.transport,
+        'devices': args.devices,
+        'finger_delay': args.finger_delay,
+        'ws_clients': args.ws_clients,
+        'http_clients': args.http_clients if service.http_server else 0,
+        'duration_s': round(elapsed, 2),
+        'requests_per_s': round(total / elapsed, 1),
+        'captures_per_s': round(captures / elapsed, 2),
+        'errors': sum(recorder.errors.values()),
+        'client_failures': sum(1 for outcome in outcomes if isinstance(outcome, Exception)),
+        'loop_stalls': watchdog.stats['stalls'] - stalls_start
+    }
+    for (front_end, command), samples in sorted(recorder.samples.items()):
+        report[f"{front_end}_{command}"] = {
+            **summarize(samples),
+            'per_s': round(len(samples) / elapsed, 1),
+            'errors': recorder.errors[(front_end, command)]
+        }
+    if recorder.loop_lag:
+        report['loop_lag'] = summarize(recorder.loop_lag)
+    if rss_start is not None:
+        report['memory'] = {
+            'rss_start_mb': round(rss_start / 2**20, 1),
+            'rss_end_mb': round(rss_end / 2**20, 1),
+            'rss_peak_mb': round(rss_peak / 2**20, 1),
+            'rss_growth_mb': round((rss_end - rss_start) / 2**20, 2),
+            'gc_objects_growth': len(gc.get_objects()) - objects_start
+        }
+    return report
+
+def bench_load(args) -> Dict:
+    """The whole service against simulated scanners, driven by concurrent WebSocket
+    and HTTP clients: latency per command, throughput, event-loop lag, memory growth
+
+    Clients share the process with the service (so its loop can be probed),
+    which puts their own CPU and memory into the figures; compare runs of
+    the same settings between releases rather than reading them as absolutes.
+    """
+    root = logging.getLogger()
+    # Service logs go to stderr so --json output stays parseable
+    for handler in root.handlers:
+        if isinstance(handler, logging.StreamHandler) and getattr(handler, 'stream', None) is sys.stdout:
+            handler.setStream(sys.stderr)
+    with contextlib.redirect_stdout(sys.stderr):
+        from zk9500_service import ZK9500WindowsService
+    root.setLevel(logging.WARNING)  # The service module sets INFO on import
+
+    workdir = Path(tempfile.mkdtemp(prefix='zk9500-load-'))
+    service = ZK9500WindowsService(load_test_config(args, workdir))
+    thread = threading.Thread(target=service.run, name="zk9500-load-service", daemon=True)
+    thread.start()
+    try:
+        wait_for_service(service, args.devices)
+        # One access-log line per request would dominate the run
+        logging.getLogger('uvicorn.access').setLevel(logging.WARNING)
+        return asyncio.run(drive_load(args, service, LoadRecorder()))
+    finally:
+        service.stop_event.set()
+        thread.join(30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def print_report(report: Dict):
+    """Print a benchmark report as aligned text"""
+    print(f"== {report['benchmark']} ==")
+    for key, value in report.items():
+        if isinstance(value, dict):
+            fields = '  '.join(f"{k}={v}" for k, v in value.items())
+            print(f"  {key:<24} {fields}")
+        elif key != 'benchmark':
+            print(f"  {key:<24} {value}")
+
+def main():
+    parser = argparse.ArgumentParser(description="ZK9500 bridge benchmarks")
+    parser.add_argument('--json', action='store_true', help="Print JSON instead of text")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    serial_parser = subparsers.add_parser('serial', help="Serial time-to-result against a pty fake device")
+    serial_parser.add_argument('--runs', type=int, default=20)
+    serial_parser.add_argument('--template-size', type=int, default=512)
+    serial_parser.add_argument('--finger-delay', type=float, default=0.05)
+    serial_parser.set_defaults(func=bench_serial)
+
+    payload_parser = subparsers.add_parser('ws_payload', help="WebSocket template payload size and encode time")
+    payload_parser.add_argument('--runs', type=int, default=2000)
+    payload_parser.add_argument('--template-size', type=int, default=1024)
+    payload_parser.set_defaults(func=bench_ws_payload)
+
+    identify_parser = subparsers.add_parser('identify', help="1:N identification over synthetic galleries")
+    identify_parser.add_argument('--sizes', default='1000,10000', help="Comma-separated gallery sizes")
+    identify_parser.add_argument('--probes', type=int, default=20)
+    identify_parser.add_argument('--template-size', type=int, default=512)
+    identify_parser.add_argument('--noise', type=float, default=0.1, help="Share of probe bits flipped")
+    identify_parser.set_defaults(func=bench_identify)
+
+    alloc_parser = subparsers.add_parser('result_alloc', help="Per-scan result allocations and encode time")
+    alloc_parser.add_argument('--scans', type=int, default=2000)
+    alloc_parser.add_argument('--clients', type=int, default=4, help="WebSocket subscribers per scan")
+    alloc_parser.add_argument('--template-size', type=int, default=512)
+    alloc_parser.set_defaults(func=bench_result_alloc)
+
+    decode_parser = subparsers.add_parser('hid_decode', help="Recorded HID reports through the frame decoder")
+    decode_parser.add_argument('--runs', type=int, default=2000)
+    decode_parser.add_argument('--template-size', type=int, default=1024)
+    decode_parser.set_defaults(func=bench_hid_decode)
+
+    load_parser = subparsers.add_parser('load', help="Concurrent WebSocket/HTTP clients against the simulated device")
+    load_parser.add_argument('--ws-clients', type=int, default=8)
+    load_parser.add_argument('--http-clients', type=int, default=4)
+    load_parser.add_argument('--duration', type=float, default=20, help="Seconds measured, after the warm-up")
+    load_parser.add_argument('--warmup', type=float, default=2)
+    load_parser.add_argument('--commands', default=','.join(LOAD_COMMANDS), help="Commands each client cycles through")
+    load_parser.add_argument('--transport', default='zkfinger_sdk', choices=('zkfinger_sdk', 'usb_hid', 'serial'))
+    load_parser.add_argument('--devices', type=int, default=1, help="Simulated scanners")
+    load_parser.add_argument('--finger-delay', default='uniform:0.05,0.15', help="Simulator latency spec")
+    load_parser.add_argument('--sim', action='append', default=[], metavar='KEY=VALUE',
+                             help="Other [simulator] settings, e.g. --sim failure_rate=0.05")
+    load_parser.set_defaults(func=bench_load)
+
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    report = args.func(args)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
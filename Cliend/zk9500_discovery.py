@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+ZK9500 Device Discovery
+=======================
+
+Runs the ZKFinger SDK, USB HID and serial probes concurrently, each with
+its own deadline, and returns the first healthy transport. Probe order is
+priority order: a lower-priority device is only picked once every
+higher-priority probe has failed or timed out, so SDK > HID > serial is
+preserved without waiting for the slow serial baud walk. run_all() keeps
+every healthy probe instead, for opening several scanners at once.
+
+The winning connection profile is persisted so the next start or
+reconnect can re-open it directly and skip discovery.
+
+Author: Pattani Installment System
+Version: 1.0.0
+"""
+
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class DeviceCandidate:
+    """An opened and tested transport returned by a discovery probe"""
+
+    def __init__(self, connection_type: str, profile: Dict[str, Any],
+                 close: Callable[[], None], **resources):
+        self.connection_type = connection_type
+        self.profile = profile      # Enough to re-open the same transport later
+        self.resources = resources  # port/reader, hid device or SDK handle
+        self._close = close
+
+    def close(self):
+        """Release the transport (used for probes that lost the race)"""
+        try:
+            self._close()
+        except Exception as e:
+            logger.debug(f"Error closing {self.connection_type} candidate: {e}")
+
+# (name, probe(cancel_event) -> Optional[DeviceCandidate], deadline in seconds)
+Probe = Tuple[str, Callable[[threading.Event], Optional[DeviceCandidate]], float]
+
+class DeviceDiscovery:
+    """Concurrent probe runner with per-probe deadlines"""
+
+    def __init__(self, overall_timeout: float = 8.0):
+        self.overall_timeout = overall_timeout
+        self.last_results: Dict[str, str] = {}
+        self.last_duration: Optional[float] = None
+        self.last_winner: Optional[str] = None
+
+    def run(self, probes: List[Probe]) -> Optional[DeviceCandidate]:
+        """Run probes concurrently and return the best healthy candidate"""
+        self.last_results = {}
+        self.last_winner = None
+        if not probes:
+            self.last_duration = 0.0
+            return None
+
+        started = time.monotonic()
+        cancel = threading.Event()
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=len(probes),
+            thread_name_prefix="zk9500-probe"
+        )
+
+        futures = [executor.submit(self._run_probe, name, probe, cancel) for name, probe, _ in probes]
+        deadlines = [started + min(timeout, self.overall_timeout) for _, _, timeout in probes]
+        results: List[Any] = [None] * len(probes)
+        finished = [False] * len(probes)
+        consumed = [False] * len(probes)
+        winner = None
+
+        try:
+            while winner is None:
+                now = time.monotonic()
+                for i, future in enumerate(futures):
+                    if finished[i]:
+                        continue
+                    if future.done():
+                        results[i] = future.result()
+                        finished[i] = consumed[i] = True
+                        self.last_results[probes[i][0]] = 'healthy' if results[i] else 'not found'
+                    elif now >= deadlines[i]:
+                        finished[i] = True
+                        self.last_results[probes[i][0]] = 'timeout'
+
+                # Highest-priority healthy probe wins once everything above it is settled
+                for i in range(len(probes)):
+                    if not finished[i]:
+                        break
+                    if results[i] is not None:
+                        winner = i
+                        break
+
+                if winner is not None or all(finished):
+                    break
+
+                pending = [f for i, f in enumerate(futures) if not finished[i]]
+                next_deadline = min(deadlines[i] for i in range(len(probes)) if not finished[i])
+                concurrent.futures.wait(
+                    pending,
+                    timeout=max(next_deadline - time.monotonic(), 0),
+                    return_when=concurrent.futures.FIRST_COMPLETED
+                )
+        finally:
+            cancel.set()
+
+            # Release every transport except the winner, including late finishers
+            for i, future in enumerate(futures):
+                if i == winner:
+                    continue
+                if results[i] is not None:
+                    results[i].close()
+                elif not consumed[i]:
+                    future.add_done_callback(self._close_late)
+            executor.shutdown(wait=False)
+
+        self.last_duration = time.monotonic() - started
+        if winner is not None:
+            self.last_winner = probes[winner][0]
+        summary = ', '.join(f"{name}={state}" for name, state in self.last_results.items())
+        logger.info(f"Device discovery finished in {self.last_duration:.2f}s: {summary or 'no probes'}")
+        return results[winner] if winner is not None else None
+
+    def run_all(self, probes: List[Probe]) -> List[Tuple[str, DeviceCandidate]]:
+        """Run probes concurrently and return every healthy candidate"""
+        self.last_results = {}
+        if not probes:
+            return []
+
+        started = time.monotonic()
+        cancel = threading.Event()
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=len(probes),
+            thread_name_prefix="zk9500-probe"
+        )
+        futures = {
+            executor.submit(self._run_probe, name, probe, cancel): (name, started + min(timeout, self.overall_timeout))
+            for name, probe, timeout in probes
+        }
+        found: List[Tuple[str, DeviceCandidate]] = []
+
+        try:
+            pending = set(futures)
+            while pending:
+                now = time.monotonic()
+                for future in [f for f in pending if futures[f][1] <= now and not f.done()]:
+                    pending.discard(future)
+                    self.last_results[futures[future][0]] = 'timeout'
+                    # Anything that finishes after its deadline is released
+                    future.add_done_callback(self._close_late)
+                if not pending:
+                    break
+
+                done, _ = concurrent.futures.wait(
+                    pending,
+                    timeout=max(min(futures[f][1] for f in pending) - now, 0),
+                    return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    pending.discard(future)
+                    name = futures[future][0]
+                    candidate = future.result()
+                    self.last_results[name] = 'healthy' if candidate else 'not found'
+                    if candidate:
+                        found.append((name, candidate))
+        finally:
+            cancel.set()
+            executor.shutdown(wait=False)
+
+        order = [name for name, _, _ in probes]
+        found.sort(key=lambda item: order.index(item[0]))
+        self.last_duration = time.monotonic() - started
+        logger.info(f"Device scan finished in {self.last_duration:.2f}s: {len(found)} device(s) found")
+        return found
+
+    @staticmethod
+    def _run_probe(name, probe, cancel) -> Optional[DeviceCandidate]:
+        try:
+            return probe(cancel)
+        except Exception as e:
+            logger.debug(f"Probe {name} failed: {e}")
+            return None
+
+    @staticmethod
+    def _close_late(future: concurrent.futures.Future):
+        if not future.cancelled() and future.exception() is None and future.result() is not None:
+            future.result().close()
+
+class ConnectionProfileStore:
+    """Last-known-good connection profile persisted as a small JSON file"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Read the saved profile (None if missing or unreadable)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            profile = data.get('profile')
+            if isinstance(profile, dict) and profile.get('connection_type'):
+                logger.info(f"Loaded last-known-good connection profile: {profile}")
+                return profile
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable connection profile {self.path}: {e}")
+        return None
+
+    def save(self, profile: Dict[str, Any]):
+        """Atomically replace the saved profile"""
+        temp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'profile': profile, 'saved_at': time.time()}, f, indent=2)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Could not save connection profile to {self.path}: {e}")
+
+    def clear(self):
+        """Forget the saved profile"""
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Could not remove connection profile {self.path}: {e}")
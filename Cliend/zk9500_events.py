@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+ZK9500 Event Bus
+================
+
+In-process publish/subscribe for device, capture and scan events, shared
+by the WebSocket server and the HTTP /events stream. Publishers may
+run on the event loop or on device threads; every subscriber gets its
+own bounded queue so a slow client can never stall the others.
+
+Author: Pattani Installment System
+Version: 1.0.0
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Every event type published on the bus
+EVENT_TYPES = ('device_connected', 'device_disconnected', 'device_reconnect_failed',
+               'capture', 'scan', 'quality_warning', 'identify')
+
+# Events whose data is a whole capture result (may carry raw template bytes)
+RESULT_EVENTS = ('capture', 'scan')
+
+def event_device_id(event: Dict[str, Any]) -> Optional[str]:
+    """Scanner an event is about (None for service-wide events)"""
+    data = event['data']
+    return data.get('deviceId', data.get('device_id'))
+
+class Subscription:
+    """One subscriber's bounded event queue
+
+    When the queue is full the oldest event is dropped, so a stalled
+    subscriber sees the latest state instead of blocking publishers.
+    """
+
+    def __init__(self, bus: "EventBus", types: Optional[Iterable[str]] = None, maxsize: int = 100,
+                 predicate: Optional[Callable[[Dict[str, Any]], bool]] = None):
+        self.bus = bus
+        self.types = set(types) if types else None
+        self.predicate = predicate  # Extra filter, e.g. one device ID
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    @property
+    def has_room(self) -> bool:
+        return not self.queue.full()
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        if self.types is not None and event['type'] not in self.types:
+            return False
+        return self.predicate is None or self.predicate(event)
+
+    def offer(self, event: Dict[str, Any]):
+        """Queue an event without blocking (drops the oldest when full)"""
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(event)
+
+    async def get(self) -> Dict[str, Any]:
+        """Wait for the next event"""
+        return await self.queue.get()
+
+    def close(self):
+        """Stop receiving events"""
+        self.bus.unsubscribe(self)
+
+class EventBus:
+    """Fan-out of events to every matching subscription"""
+
+    def __init__(self):
+        self.subscriptions = set()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+
+    def bind(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Attach to the event loop that owns the subscriber queues"""
+        self.loop = loop or asyncio.get_running_loop()
+
+    def subscribe(self, types: Optional[Iterable[str]] = None, maxsize: int = 100,
+                  predicate: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Subscription:
+        """Create a subscription (call from the event loop)"""
+        if self.loop is None:
+            self.bind()
+        subscription = Subscription(self, types, maxsize, predicate)
+        self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscriptions.discard(subscription)
+
+    def publish(self, event_type: str, data: Optional[Dict[str, Any]] = None):
+        """Publish from the event loop thread"""
+        event = {
+            'type': event_type,
+            'timestamp': time.time(),
+            'data': data or {}
+        }
+        self.published += 1
+        for subscription in list(self.subscriptions):
+            if subscription.matches(event):
+                subscription.offer(event)
+
+    def publish_threadsafe(self, event_type: str, data: Optional[Dict[str, Any]] = None):
+        """Publish from any thread (e.g. the device worker)"""
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self.publish, event_type, data)
+        except RuntimeError:
+            # Loop is shutting down
+            pass
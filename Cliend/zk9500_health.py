@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+ZK9500 Device Health Monitor
+============================
+
+Background supervisor that checks the scanner is still present and
+reconnects it with jittered exponential backoff, so a capture request
+never has to run discovery inline after the device was unplugged.
+
+Author: Pattani Installment System
+Version: 1.0.0
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Capture outcomes that point at the device rather than the finger
+DEVICE_FAULTS = frozenset({'capture_exception', 'device_status', 'sdk_capture_failed'})
+
+class DeviceHealthMonitor:
+    """Presence checks plus auto-reconnect on the device worker thread"""
+
+    def __init__(self, controller, check_interval: float = 2.0,
+                 backoff_min: float = 1.0, backoff_max: float = 60.0,
+                 failure_threshold: int = 3):
+        self.controller = controller
+        self.check_interval = check_interval
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.consecutive_failures = 0  # Device faults in a row, counted on the worker thread
+        self.paused = False  # Set by an explicit disconnect; cleared by connect
+        self.next_retry_at: Optional[float] = None
+        self.last_attempt_at = 0.0
+        self.stats = {
+            'checks': 0,
+            'devices_lost': 0,
+            'reconnects': 0,
+            'failed_attempts': 0
+        }
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def probe_due(self) -> bool:
+        """Captures keep failing, so check presence without waiting for an idle worker"""
+        return 0 < self.failure_threshold <= self.consecutive_failures
+
+    def backoff_delay(self, attempts: int) -> float:
+        """Exponential backoff with equal jitter (half fixed, half random)"""
+        delay = min(self.backoff_max, self.backoff_min * (2 ** max(attempts - 1, 0)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def run(self):
+        """Supervise the device until cancelled"""
+        while True:
+            try:
+                await self.step()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Health monitor error: {e}")
+                await self._sleep(self.check_interval)
+
+    async def step(self):
+        """One presence check, or one reconnect attempt plus its backoff"""
+        controller = self.controller
+        if controller.device_info['connected']:
+            # A running capture already proves the device is there, unless
+            # captures keep failing; then the check queues behind the current one
+            if not controller.worker.busy or self.probe_due:
+                self.stats['checks'] += 1
+                present = await controller.worker.run(controller.check_presence)
+                if not present and controller.device_info['connected']:
+                    logger.warning("⚠️ ZK9500 device lost, reconnecting in the background")
+                    self.stats['devices_lost'] += 1
+                    await controller.worker.run(controller.disconnect, 'device lost')
+                    return
+                self.consecutive_failures = 0
+            await self._sleep(self.check_interval)
+
+        elif self.paused:
+            await self._sleep(self.check_interval)
+
+        else:
+            self.last_attempt_at = time.monotonic()
+            if await controller.connect_async():
+                self.stats['reconnects'] += 1
+                self.next_retry_at = None
+                self.consecutive_failures = 0
+                return
+
+            attempts = controller.reconnect_attempts
+            self.stats['failed_attempts'] += 1
+            delay = self.backoff_delay(attempts)
+            self.next_retry_at = time.time() + delay
+            if attempts == controller.max_reconnect_attempts:
+                logger.warning(f"⚠️ ZK9500 still not found after {attempts} attempts, "
+                               f"retrying every {self.backoff_max:.0f}s at most")
+            controller.events.publish('device_reconnect_failed', {
+                'attempts': attempts,
+                'retry_in': round(delay, 2)
+            })
+            await self._sleep(delay)
+
+    async def _sleep(self, delay: float):
+        """Sleep until the delay passes or wake() is called"""
+        try:
+            await asyncio.wait_for(self._wake.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    def wake(self):
+        """Cut the current check interval or backoff short (thread-safe)"""
+        loop = self._loop
+        if loop is None or loop.is_closed() or self._wake is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            pass
+
+    def nudge(self):
+        """Retry soon because a client wants the device (thread-safe)
+
+        Rate-limited to one attempt per backoff_min so a burst of capture
+        requests cannot defeat the backoff.
+        """
+        if time.monotonic() - self.last_attempt_at >= self.backoff_min:
+            self.wake()
+
+    def record_capture(self, result: Dict[str, Any]):
+        """Count device faults in a row and probe early past failure_threshold (thread-safe)"""
+        if result.get('success') or result.get('reason') not in DEVICE_FAULTS:
+            self.consecutive_failures = 0
+            return
+        self.consecutive_failures += 1
+        if self.consecutive_failures == self.failure_threshold:
+            logger.warning(f"⚠️ {self.consecutive_failures} captures failed in a row, checking the device")
+            self.wake()
+
+    def pause(self):
+        """Stop auto-reconnecting (after an explicit disconnect)"""
+        self.paused = True
+
+    def resume(self):
+        """Resume auto-reconnecting"""
+        self.paused = False
+        self.wake()
+
+    def start(self):
+        """Start supervising on the running event loop"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = self._loop.create_task(self.run(), name="zk9500_health_monitor")
+
+    async def stop(self):
+        """Stop supervising"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def get_status(self) -> Dict[str, Any]:
+        """Monitor state for /status"""
+        return {
+            'running': self.running,
+            'paused': self.paused,
+            'reconnect_attempts': self.controller.reconnect_attempts,
+            'next_retry_at': self.next_retry_at,
+            'consecutive_failures': self.consecutive_failures,
+            **self.stats
+        }
@@ -16,12 +16,18 @@ import threading
 import logging
 import base64
 import socket
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Literal, Union
+
+from zk9500_events import EVENT_TYPES, RESULT_EVENTS, event_device_id
+from zk9500_matcher import decode_template
+from zk9500_result import CaptureResult, merge_json
+from zk9500_metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from zk9500_tracing import tracer
 
 try:
-    from fastapi import FastAPI, HTTPException
+    from fastapi import FastAPI, HTTPException, Request
     from fastapi.middleware.cors import CORSMiddleware
-    from fastapi.responses import JSONResponse
+    from fastapi.responses import JSONResponse, Response, StreamingResponse
     from pydantic import BaseModel
     import uvicorn
     HAS_FASTAPI = True
@@ -33,6 +39,16 @@ logger = logging.getLogger(__name__)
 class FingerprintRequest(BaseModel):
     """Request model for fingerprint operations"""
     timeout: Optional[int] = 30
+    client_id: Optional[str] = None
+    device_id: Optional[str] = None  # Target scanner; any idle one when omitted
+    mode: Literal['template', 'image', 'both'] = 'template'  # 'template' never reads the image (see score_template_captures)
+
+class IdentifyRequest(BaseModel):
+    """Request model for 1:N identification"""
+    template: Optional[Union[str, List[int]]] = None  # Base64 or byte list; captured when omitted
+    timeout: Optional[int] = 30
+    client_id: Optional[str] = None
+    device_id: Optional[str] = None
 
 class ZK9500HTTPServer:
     """HTTP REST API server for ZK9500 service"""
@@ -42,6 +58,7 @@ class ZK9500HTTPServer:
         self.config = config
         self.server = None
         self.server_task = None
+        self.event_heartbeat = float(config.get('api', 'event_heartbeat', fallback=15))
         
         if not HAS_FASTAPI:
             logger.warning("FastAPI not available. HTTP API will not be started.")
@@ -85,7 +102,12 @@ class ZK9500HTTPServer:
                     "POST /connect": "Connect to ZK9500 device", 
                     "POST /disconnect": "Disconnect from device",
                     "POST /capture": "Capture fingerprint",
+                    "GET /devices": "List attached scanners",
+                    "POST /identify": "Identify a fingerprint against the enrolled templates",
+                    "GET /events": "Stream capture, device and quality events (SSE or NDJSON)",
                     "GET /test": "Test service connection",
+                    "GET /metrics": "Prometheus metrics",
+                    "GET /debug/traces": "Recent request traces (per-phase timings)",
                     "GET /docs": "API documentation (Swagger UI)",
                     "GET /redoc": "API documentation (ReDoc)"
                 }
@@ -103,7 +125,14 @@ class ZK9500HTTPServer:
                     "connection_type": self.zk_controller.connection_type,
                     "connected": self.zk_controller.device_info['connected'],
                     "last_scan_time": self.zk_controller.device_info.get('last_scan_time'),
-                    "total_scans": self.zk_controller.device_info.get('total_scans', 0)
+                    "total_scans": self.zk_controller.device_info.get('total_scans', 0),
+                    "capture_queue": self.zk_controller.scheduler.get_status(),
+                    "health_monitor": self.zk_controller.health_monitor.get_status(),
+                    "event_loop": self.zk_controller.loop_watchdog.get_status(),
+                    "devices": self.zk_controller.pool.get_status(),
+                    "identifier": self.zk_controller.identifier.get_status(),
+                    "upload_queue": await asyncio.to_thread(self.zk_controller.upload_spool.get_status),
+                    "simulator": self.zk_controller.simulator.get_status() if self.zk_controller.simulator else None
                 }
             except Exception as e:
                 logger.error(f"Status error: {e}")
@@ -113,7 +142,8 @@ class ZK9500HTTPServer:
         async def get_device_info():
             """Get detailed device information"""
             try:
-                device_info = self.zk_controller.get_device_info()
+                await self.zk_controller.get_device_info_async()
+                device_info = self.zk_controller.device_info
                 return {
                     "success": True,
                     "timestamp": self.get_timestamp(),
@@ -129,12 +159,22 @@ class ZK9500HTTPServer:
                 logger.error(f"Device info error: {e}")
                 raise HTTPException(status_code=500, detail=f"Device info error: {str(e)}")
         
+        @self.app.get("/devices", tags=["Device"])
+        async def list_devices():
+            """List attached scanners and their IDs"""
+            return {
+                "success": True,
+                "timestamp": self.get_timestamp(),
+                "devices": self.zk_controller.pool.get_status()
+            }
+        
         @self.app.post("/connect", tags=["Device"])
         async def connect_device():
             """Connect to ZK9500 device"""
             try:
                 logger.info("API: Attempting to connect to ZK9500 device")
-                success = self.zk_controller.connect()
+                self.zk_controller.health_monitor.resume()
+                success = await self.zk_controller.connect_async()
                 
                 if success:
                     return {
@@ -160,7 +200,9 @@ class ZK9500HTTPServer:
             """Disconnect from ZK9500 device"""
             try:
                 logger.info("API: Disconnecting from ZK9500 device")
-                self.zk_controller.disconnect()
+                # Stay disconnected until the next /connect
+                self.zk_controller.health_monitor.pause()
+                await self.zk_controller.disconnect_async()
                 return {
                     "success": True,
                     "timestamp": self.get_timestamp(),
@@ -171,47 +213,49 @@ class ZK9500HTTPServer:
                 raise HTTPException(status_code=500, detail=f"Disconnect error: {str(e)}")
         
         @self.app.post("/capture", tags=["Fingerprint"])
+        @tracer.traced('http.capture', kind='server')
         async def capture_fingerprint(request: Optional[FingerprintRequest] = None):
             """Capture fingerprint from ZK9500 device"""
             try:
-                # Check if device is connected
-                if not self.zk_controller.device_info['connected']:
+                # Check if any scanner is connected
+                if not any(device.device_info['connected'] for device in self.zk_controller.pool.devices()):
                     raise HTTPException(
                         status_code=400, 
                         detail="Device not connected. Please connect to ZK9500 device first using POST /connect"
                     )
                 
                 logger.info("API: Starting fingerprint capture")
-                result = self.zk_controller.capture_fingerprint()
+                # Only an explicit client_id coalesces; callers behind one proxy share an IP
+                result = await self.zk_controller.scheduler.capture(
+                    client_id=request.client_id if request else None,
+                    timeout=request.timeout if request else None,
+                    device_id=request.device_id if request else None,
+                    mode=request.mode if request else 'template'
+                )
                 
                 if result['success']:
-                    # Convert binary data to base64 for JSON response
-                    response_data = result.copy()
-                    
-                    if result.get('fingerprint_data'):
-                        response_data['fingerprint_data_base64'] = base64.b64encode(
-                            result['fingerprint_data']
-                        ).decode('utf-8')
-                        response_data['fingerprint_data_length'] = len(result['fingerprint_data'])
-                        # Remove binary data from response
-                        del response_data['fingerprint_data']
-                    
-                    if result.get('template_data'):
-                        response_data['template_data_base64'] = base64.b64encode(
-                            result['template_data']
-                        ).decode('utf-8')
-                        response_data['template_data_length'] = len(result['template_data'])
-                        # Remove binary data from response
-                        del response_data['template_data']
-                    
-                    response_data['timestamp'] = self.get_timestamp()
                     logger.info("API: Fingerprint capture successful")
-                    return response_data
+                    with tracer.span('http.encode'):
+                        if isinstance(result, CaptureResult):
+                            # Reuse the JSON the result already encoded for other clients
+                            return Response(
+                                content=merge_json({'timestamp': self.get_timestamp()}, result.json_body()),
+                                media_type='application/json'
+                            )
+                        response_data = self.jsonable_result(result)
+                        response_data['timestamp'] = self.get_timestamp()
+                        return response_data
                 else:
-                    logger.warning(f"API: Fingerprint capture failed - {result.get('error', 'Unknown error')}")
-                    raise HTTPException(
+                    message = result.get('message', 'Fingerprint capture failed')
+                    logger.warning(f"API: Fingerprint capture failed - {message}")
+                    # detail as before, plus the reason (and quality for a low-quality rescan)
+                    return JSONResponse(
                         status_code=400,
-                        detail=result.get('error', 'Fingerprint capture failed')
+                        content={
+                            **self.jsonable_result(result),
+                            'detail': message,
+                            'timestamp': self.get_timestamp()
+                        }
                     )
                     
             except HTTPException:
@@ -220,6 +264,97 @@ class ZK9500HTTPServer:
                 logger.error(f"Capture error: {e}")
                 raise HTTPException(status_code=500, detail=f"Capture error: {str(e)}")
         
+        @self.app.post("/identify", tags=["Fingerprint"])
+        @tracer.traced('http.identify', kind='server')
+        async def identify_fingerprint(request: Optional[IdentifyRequest] = None):
+            """Match a template (or a new capture) against the enrolled templates"""
+            identifier = self.zk_controller.identifier
+            if not identifier.enabled:
+                raise HTTPException(status_code=503, detail=identifier.disabled_result()['message'])
+            try:
+                if request and request.template:
+                    try:
+                        template = decode_template(request.template)
+                    except (TypeError, ValueError) as e:
+                        raise HTTPException(status_code=400, detail=f"Invalid template: {str(e)}")
+                    result = await identifier.identify_async(template)
+                else:
+                    if not any(device.device_info['connected'] for device in self.zk_controller.pool.devices()):
+                        raise HTTPException(
+                            status_code=400,
+                            detail="Device not connected. Send a template or connect to ZK9500 device first using POST /connect"
+                        )
+                    result = await identifier.identify_capture(
+                        client_id=request.client_id if request else None,
+                        timeout=request.timeout if request else None,
+                        device_id=request.device_id if request else None
+                    )
+                
+                if not result['success']:
+                    raise HTTPException(status_code=400, detail=result.get('message', 'Identification failed'))
+                
+                result['timestamp'] = self.get_timestamp()
+                return result
+            
+            except HTTPException:
+                raise
+            except Exception as e:
+                logger.error(f"Identify error: {e}")
+                raise HTTPException(status_code=500, detail=f"Identify error: {str(e)}")
+        
+        @self.app.get("/events", tags=["Events"])
+        async def stream_events(request: Request, types: Optional[str] = None, device_id: Optional[str] = None,
+                                format: Literal['sse', 'ndjson'] = 'sse'):
+            """Stream capture results, device and quality events as they happen
+            
+            types is a comma-separated filter (default: everything but 'scan';
+            asking for 'scan' keeps the scanners armed like subscribe_scans).
+            """
+            event_types = [t.strip() for t in types.split(',') if t.strip()] if types else \
+                [t for t in EVENT_TYPES if t != 'scan']
+            unknown = [t for t in event_types if t not in EVENT_TYPES]
+            if unknown:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unknown event type(s): {', '.join(unknown)} (expected {', '.join(EVENT_TYPES)})"
+                )
+            if device_id and self.zk_controller.pool.get(device_id) is None:
+                raise HTTPException(status_code=404, detail=f"Unknown device: {device_id}")
+            
+            if 'scan' in event_types:
+                stream = self.zk_controller.scan_stream
+                subscription = stream.subscribe(device_id, event_types)
+                close = lambda: stream.unsubscribe(subscription)
+            else:
+                predicate = (lambda event: event_device_id(event) in (None, device_id)) if device_id else None
+                subscription = self.zk_controller.events.subscribe(event_types, predicate=predicate)
+                close = subscription.close
+            
+            return StreamingResponse(
+                self.event_stream(request, subscription, close, format),
+                media_type='text/event-stream' if format == 'sse' else 'application/x-ndjson',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+        
+        @self.app.get("/metrics", tags=["Info"])
+        async def get_metrics():
+            """Latency histograms, error counts and gauges in the Prometheus text format"""
+            return Response(content=self.zk_controller.metrics.render(), media_type=METRICS_CONTENT_TYPE)
+        
+        @self.app.get("/debug/traces", tags=["Info"])
+        async def get_traces(limit: int = 20, min_ms: float = 0.0, name: Optional[str] = None):
+            """Recent traces, newest first, with every span's offset and duration
+            
+            min_ms keeps only traces at least that slow; name filters on the
+            root span (e.g. ws.command, http.capture).
+            """
+            return {
+                "success": True,
+                "timestamp": self.get_timestamp(),
+                "tracing": tracer.get_status(),
+                "traces": tracer.traces(limit=max(limit, 1), min_duration_ms=min_ms, name=name)
+            }
+        
         @self.app.get("/test", tags=["Info"])
         async def test_connection():
             """Test service connection and health check"""
@@ -249,6 +384,7 @@ class ZK9500HTTPServer:
         async def global_exception_handler(request, exc):
             """Global exception handler"""
             logger.error(f"Unhandled exception: {exc}")
+            self.zk_controller.metrics.errors.inc(reason='http_server_error')
             return JSONResponse(
                 status_code=500,
                 content={
@@ -259,6 +395,69 @@ class ZK9500HTTPServer:
                 }
             )
     
+    def jsonable_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of a capture result with binary fields converted for JSON"""
+        if isinstance(result, CaptureResult):
+            return result.jsonable()
+        
+        response_data = result.copy()
+        
+        if result.get('fingerprint_data'):
+            response_data['fingerprint_data_base64'] = base64.b64encode(
+                result['fingerprint_data']
+            ).decode('utf-8')
+            response_data['fingerprint_data_length'] = len(result['fingerprint_data'])
+            # Remove binary data from response
+            del response_data['fingerprint_data']
+        
+        if result.get('template_data'):
+            response_data['template_data_base64'] = base64.b64encode(
+                result['template_data']
+            ).decode('utf-8')
+            response_data['template_data_length'] = len(result['template_data'])
+            # Remove binary data from response
+            del response_data['template_data']
+        
+        # Templates are raw bytes internally; keep the JSON int list format
+        if isinstance(result.get('templateData'), (bytes, bytearray)):
+            response_data['templateData'] = list(result['templateData'])
+        
+        return response_data
+    
+    async def event_stream(self, request, subscription, close, stream_format: str = 'sse'):
+        """Yield bus events as SSE or NDJSON until the client goes away"""
+        event_id = 0
+        self.zk_controller.metrics.event_streams.inc()
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.get(), self.event_heartbeat)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle stream
+                    yield ': keep-alive\n\n' if stream_format == 'sse' else '{"type": "heartbeat"}\n'
+                    continue
+                
+                event_id += 1
+                data = event['data']
+                envelope = {
+                    'type': event['type'],
+                    'timestamp': event['timestamp'],
+                    'dropped': subscription.dropped
+                }
+                if isinstance(data, CaptureResult):
+                    # One encoding of the scan shared by every stream
+                    text = json.dumps(envelope)[:-1] + ', "data": ' + data.json_body() + '}'
+                else:
+                    envelope['data'] = self.jsonable_result(data) if event['type'] in RESULT_EVENTS else data
+                    text = json.dumps(envelope)
+                if stream_format == 'sse':
+                    yield f"id: {event_id}\nevent: {event['type']}\ndata: {text}\n\n"
+                else:
+                    yield text + '\n'
+        finally:
+            self.zk_controller.metrics.event_streams.dec()
+            close()
+    
     def get_timestamp(self):
         """Get current timestamp"""
         import datetime
@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""
+ZK9500 Local Fingerprint Matching
+=================================
+
+1:N identification on the client PC, so a check-in no longer has to ship
+the template to the Node backend and wait for it to match.
+
+The enrolled templates for this branch are loaded into an in-memory
+index. Matching is done by a pluggable TemplateMatcher: the ZKFinger
+SDK's DB cache, or any class named in config.ini as module:Class. Without
+the SDK, identification is disabled rather than quietly downgraded; the
+bitwise similarity matcher is an explicit opt-in for tests and the
+simulator, since raw bit similarity does not match real ZK templates.
+
+Large galleries are searched by the SDK's native DB cache. There is no
+coarse pre-filter in front of it: a cheap feature vector that keeps the
+true match in its top K needs the minutiae decoded from ZK templates,
+and raw template bits bear no relation to them.
+
+With a TemplateStore the gallery is loaded from disk at startup (so
+identification works offline) and the backend only sends deltas.
+
+Author: Pattani Installment System
+Version: 1.0.0
+"""
+
+import asyncio
+import base64
+import importlib
+import json
+import logging
+import threading
+import time
+import urllib.parse
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from zk9500_store import TemplateStore
+
+logger = logging.getLogger(__name__)
+
+class TemplateMatcher:
+    """1:N matcher interface; templates are keyed by an integer fid"""
+
+    name = 'base'
+
+    def add(self, fid: int, template: bytes) -> bool:
+        raise NotImplementedError
+
+    def remove(self, fid: int) -> bool:
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def empty(self) -> "TemplateMatcher":
+        """New matcher of the same kind with nothing enrolled (a reload is built in one)"""
+        return type(self)()
+
+    def identify(self, template: bytes) -> Optional[Tuple[int, int]]:
+        """Best (fid, score) for the probe, or None"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class SDKTemplateMatcher(TemplateMatcher):
+    """Matching through the ZKFinger SDK DB cache (ZKFPM_DBAdd / ZKFPM_DBIdentify)"""
+
+    name = 'sdk'
+
+    def __init__(self, sdk):
+        self.sdk = sdk
+        self.cache = sdk.db_init()
+        if not self.cache:
+            raise RuntimeError("ZKFinger SDK DB cache not available")
+
+    def add(self, fid: int, template: bytes) -> bool:
+        return self.sdk.db_add(self.cache, fid, template)
+
+    def remove(self, fid: int) -> bool:
+        return self.sdk.db_del(self.cache, fid)
+
+    def clear(self):
+        self.sdk.db_clear(self.cache)
+
+    def empty(self) -> "SDKTemplateMatcher":
+        return SDKTemplateMatcher(self.sdk)
+
+    def identify(self, template: bytes) -> Optional[Tuple[int, int]]:
+        return self.sdk.db_identify(self.cache, template)
+
+    def close(self):
+        if self.cache:
+            self.sdk.db_free(self.cache)
+            self.cache = None
+
+class BitwiseTemplateMatcher(TemplateMatcher):
+    """Pure-Python matcher for tests and the simulator: score is the share of identical bits (0-100)
+
+    Two scans of the same real finger give ZK templates with unrelated
+    bytes, so this never matches real fingers; it is only chosen when
+    config.ini asks for it.
+    """
+
+    name = 'bitwise'
+
+    def __init__(self):
+        self.gallery: Dict[int, Tuple[int, int]] = {}  # fid -> (template as int, bit length)
+
+    def add(self, fid: int, template: bytes) -> bool:
+        self.gallery[fid] = (int.from_bytes(template, 'big'), len(template) * 8)
+        return True
+
+    def remove(self, fid: int) -> bool:
+        return self.gallery.pop(fid, None) is not None
+
+    def clear(self):
+        self.gallery.clear()
+
+    def identify(self, template: bytes) -> Optional[Tuple[int, int]]:
+        probe = int.from_bytes(template, 'big')
+        probe_bits = len(template) * 8
+        best = None
+        for fid, (candidate, bits) in self.gallery.items():
+            if bits != probe_bits:
+                continue
+            score = 100 - (bin(probe ^ candidate).count('1') * 100 // bits)
+            if best is None or score > best[1]:
+                best = (fid, score)
+        return best
+
+def create_matcher(backend: str, sdk=None) -> TemplateMatcher:
+    """Matcher for a config value: auto, sdk, bitwise or module:Class
+
+    auto means the SDK matcher and raises when the SDK DB cache is not
+    available; it never falls back to bitwise matching.
+    """
+    if backend == 'auto':
+        if sdk is None or not sdk.has_db:
+            raise RuntimeError("ZKFinger SDK DB functions not available (libzkfp.dll not loaded)")
+        backend = 'sdk'
+    if backend == 'sdk':
+        return SDKTemplateMatcher(sdk)
+    if backend == 'bitwise':
+        return BitwiseTemplateMatcher()
+    if ':' in backend:
+        module_name, class_name = backend.split(':', 1)
+        return getattr(importlib.import_module(module_name), class_name)()
+    raise ValueError(f"Unknown matcher backend: {backend}")
+
+def decode_template(value) -> bytes:
+    """Template from JSON: base64 string or list of ints"""
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    if isinstance(value, list):
+        return bytes(value)
+    if not value:
+        raise ValueError("missing template")
+    return base64.b64decode(value)
+
+class FingerprintIdentifier:
+    """In-memory index of enrolled templates for this branch
+
+    With matcher=None identification is disabled: nothing is loaded and
+    every identify returns an error carrying disabled_reason.
+    """
+
+    def __init__(self, controller, matcher: Optional[TemplateMatcher], threshold: int = 70,
+                 templates_url: str = '', templates_file: str = '', branch_code: str = '',
+                 reload_interval: float = 300.0, store: Optional[TemplateStore] = None,
+                 disabled_reason: str = ''):
+        self.controller = controller
+        self.matcher = matcher
+        self.disabled_reason = disabled_reason
+        self.store = store  # On-disk copy of the gallery; syncs become deltas
+        self.threshold = threshold
+        self.templates_url = templates_url
+        self.templates_file = templates_file
+        self.branch_code = branch_code
+        self.reload_interval = reload_interval
+        self.users: Dict[int, Dict[str, Any]] = {}  # fid -> {'userId', 'finger'}
+        self._fids: Dict[Tuple[str, int], int] = {}  # (userId, finger) -> fid
+        self._next_fid = 1
+        self._lock = threading.Lock()  # Matching runs in a thread; the SDK cache is not thread-safe
+        self.loaded_at: Optional[float] = None
+        self.stats = {
+            'identifications': 0,
+            'matches': 0,
+            'total_match_time': 0.0,
+            'load_errors': 0,
+            'syncs': 0
+        }
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def count(self) -> int:
+        return len(self.users)
+
+    @property
+    def enabled(self) -> bool:
+        return self.matcher is not None
+
+    def disabled_result(self) -> Dict[str, Any]:
+        """Error returned by every identify while no matcher is available"""
+        return {
+            'success': False,
+            'reason': 'identify_disabled',
+            'message': f'Local identification is disabled: {self.disabled_reason or "no matcher available"}'
+        }
+
+    def add(self, user_id: str, template: bytes, finger: int = 0) -> bool:
+        """Enroll or replace one finger of a user"""
+        with self._lock:
+            key = (str(user_id), finger)
+            fid = self._fids.get(key)
+            if fid is not None:
+                self.matcher.remove(fid)
+            else:
+                fid = self._next_fid
+                self._next_fid += 1
+            if not self.matcher.add(fid, template):
+                self._fids.pop(key, None)
+                self.users.pop(fid, None)
+                return False
+            self._fids[key] = fid
+            self.users[fid] = {'userId': str(user_id), 'finger': finger}
+            return True
+
+    def remove(self, user_id: str, finger: Optional[int] = None) -> int:
+        """Drop one finger of a user, or all of them"""
+        with self._lock:
+            removed = 0
+            for key in [k for k in self._fids if k[0] == str(user_id) and finger in (None, k[1])]:
+                fid = self._fids.pop(key)
+                self.users.pop(fid, None)
+                self.matcher.remove(fid)
+                removed += 1
+            return removed
+
+    def load(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Replace the whole index with decoded records (see decode_records)
+
+        The new gallery is built beside the live one and swapped in under
+        the lock, so identifications during a reload never see it partly
+        loaded.
+        """
+        staged = FingerprintIdentifier(self.controller, self.matcher.empty())
+        loaded = 0
+        try:
+            for record in records:
+                if staged.add(record['userId'], bytes(record['template']), record['finger']):
+                    loaded += 1
+        except Exception:
+            staged.matcher.close()
+            raise
+
+        with self._lock:
+            replaced = self.matcher
+            self.matcher = staged.matcher
+            self.users, self._fids, self._next_fid = staged.users, staged._fids, staged._next_fid
+            replaced.close()
+        self.loaded_at = time.time()
+        return loaded
+
+    def fetch_records(self) -> Dict[str, Any]:
+        """Blocking: enrollment data from the backend URL or the local file
+
+        Returns {'templates', 'deleted', 'version', 'full'}. A plain list is
+        a full snapshot; with a store the URL gets ?since=<version> and may
+        answer with only the changes.
+        """
+        if self.templates_url:
+            params = {}
+            if self.branch_code:
+                params['branch'] = self.branch_code
+            if self.store:
+                params['since'] = self.store.sync_version
+            url = self.templates_url
+            if params:
+                separator = '&' if '?' in url else '?'
+                url += separator + urllib.parse.urlencode(params)
+            with urllib.request.urlopen(url, timeout=30) as response:
+                data = json.loads(response.read().decode('utf-8'))
+        elif self.templates_file:
+            path = Path(__file__).parent / self.templates_file
+            data = json.loads(path.read_text(encoding='utf-8'))
+        else:
+            data = []
+
+        if not isinstance(data, dict):
+            data = {'templates': data, 'full': True}
+        return {
+            'templates': data.get('templates', []),
+            'deleted': data.get('deleted', []),
+            'version': int(data.get('version', 0)),
+            'full': bool(data.get('full', False))
+        }
+
+    def decode_records(self, records: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Records with their templates as bytes; invalid ones are skipped"""
+        decoded = []
+        for record in records:
+            try:
+                decoded.append({
+                    'userId': str(record['userId']),
+                    'finger': int(record.get('finger', 0)),
+                    'template': decode_template(record.get('template', record.get('templateData')))
+                })
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"⚠️ Skipping enrolled template: {e}")
+        return decoded
+
+    def sync(self, data: Dict[str, Any]) -> int:
+        """Blocking: apply fetched enrollment data to the store and the index"""
+        templates = self.decode_records(data['templates'])
+        if not self.store:
+            return self.load(templates)
+
+        if data['full']:
+            self.store.replace(templates, data['version'])
+            loaded = self.load(templates)
+        else:
+            applied, deleted = self.store.apply(templates, data['deleted'], data['version'])
+            for user_id, finger in deleted:
+                self.remove(user_id, finger)
+            for record in applied:
+                self.add(record['userId'], record['template'], record['finger'])
+            loaded = self.count
+
+        # Runs here, off the event loop, so compaction never stalls clients
+        if self.store.needs_compaction:
+            self.store.compact()
+        return loaded
+
+    def open_store(self) -> int:
+        """Blocking: load the gallery saved by the last sync"""
+        try:
+            self.store.open()
+        except ValueError as e:
+            # Unreadable header: keep the file for inspection and start over
+            corrupt_path = self.store.path.with_suffix(self.store.path.suffix + '.corrupt')
+            logger.error(f"{e}; moved to {corrupt_path.name}, resyncing from scratch")
+            self.store.path.replace(corrupt_path)
+            self.store.open()
+        return self.load(self.store.records())
+
+    async def reload(self) -> Dict[str, Any]:
+        """Sync the enrolled templates without blocking the event loop"""
+        try:
+            data = await asyncio.to_thread(self.fetch_records)
+            loaded = await asyncio.to_thread(self.sync, data)
+            self.stats['syncs'] += 1
+            logger.info(f"✅ {loaded} enrolled templates after sync ({self.matcher.name} matcher)")
+            return {
+                'success': True,
+                'count': loaded,
+                'message': f'{loaded} templates loaded'
+            }
+        except Exception as e:
+            self.stats['load_errors'] += 1
+            logger.error(f"Template load error: {e}")
+            return {
+                'success': False,
+                'message': f'Template load error: {str(e)}'
+            }
+
+    def identify(self, template: bytes) -> Dict[str, Any]:
+        """Blocking 1:N match of a probe template against the index"""
+        if not self.enabled:
+            return self.disabled_result()
+        start = time.perf_counter()
+        with self._lock:
+            best = self.matcher.identify(template) if self.users else None
+            user = self.users.get(best[0]) if best else None
+        elapsed = time.perf_counter() - start
+
+        self.stats['identifications'] += 1
+        self.stats['total_match_time'] += elapsed
+        matched = user is not None and best[1] >= self.threshold
+        if matched:
+            self.stats['matches'] += 1
+        return {
+            'success': True,
+            'matched': matched,
+            'userId': user['userId'] if matched else None,
+            'finger': user['finger'] if matched else None,
+            'score': best[1] if best else 0,
+            'threshold': self.threshold,
+            'galleryCount': self.count,
+            'matchTimeMs': round(elapsed * 1000, 2),
+            'message': 'Fingerprint identified' if matched else 'No matching fingerprint'
+        }
+
+    async def identify_async(self, template: bytes, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Identify off the event loop and publish the result as an 'identify' event"""
+        if not self.enabled:
+            return self.disabled_result()
+        result = await asyncio.to_thread(self.identify, template)
+        if context:
+            result.update(context)
+        self.controller.events.publish('identify', result)
+        return result
+
+    async def identify_capture(self, client_id: Optional[str] = None, timeout: Optional[float] = None,
+                               device_id: Optional[str] = None) -> Dict[str, Any]:
+        """Capture through the scheduler, then identify the captured template"""
+        if not self.enabled:
+            return self.disabled_result()
+        result = await self.controller.scheduler.capture(
+            client_id=client_id,
+            timeout=timeout,
+            device_id=device_id,
+            mode='template'
+        )
+        if not result.get('success'):
+            return result
+        if not result.get('templateData'):
+            return {
+                'success': False,
+                'message': 'Capture returned no template to identify'
+            }
+
+        return await self.identify_async(bytes(result['templateData']), {
+            'deviceId': result.get('deviceId'),
+            'quality': result.get('quality'),
+            'captureTime': result.get('captureTime')
+        })
+
+    async def run(self):
+        """Load the stored gallery, then sync every reload_interval"""
+        if self.store:
+            try:
+                loaded = await asyncio.to_thread(self.open_store)
+                logger.info(f"✅ Loaded {loaded} enrolled templates from {self.store.path.name}")
+            except Exception as e:
+                self.stats['load_errors'] += 1
+                logger.error(f"Template store error: {e}")
+        if not (self.templates_url or self.templates_file):
+            return
+
+        while True:
+            await self.reload()
+            if self.reload_interval <= 0:
+                return
+            await asyncio.sleep(self.reload_interval)
+
+    def start(self):
+        """Start loading on the running event loop (no-op without a template source or matcher)"""
+        if not self.enabled or not (self.templates_url or self.templates_file or self.store):
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run(), name="zk9500_identifier")
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        if self.matcher:
+            with self._lock:
+                self.matcher.close()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Index size and match timings for /status"""
+        identifications = self.stats['identifications']
+        return {
+            'enabled': self.enabled,
+            'disabled_reason': self.disabled_reason or None,
+            'matcher': self.matcher.name if self.matcher else None,
+            'templates': self.count,
+            'threshold': self.threshold,
+            'loaded_at': self.loaded_at,
+            'identifications': identifications,
+            'matches': self.stats['matches'],
+            'avg_match_ms': round(self.stats['total_match_time'] / identifications * 1000, 2) if identifications else 0.0,
+            'load_errors': self.stats['load_errors'],
+            'syncs': self.stats['syncs'],
+            'store': self.store.get_status() if self.store else None
+        }
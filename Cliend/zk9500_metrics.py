@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+ZK9500 Metrics
+==============
+
+In-process counters, gauges and latency histograms for the bridge,
+rendered in the Prometheus text format by GET /metrics, so slow branch
+PCs can be found by scraping the fleet instead of reading logs.
+
+No client library is needed: metrics are plain locked dicts, updated
+from the event loop and the device worker threads alike. Label values
+must come from a small fixed set (connection types, commands, failure
+reasons), never from client input.
+
+Author: Pattani Installment System
+Version: 1.0.0
+"""
+
+import bisect
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; captures include waiting for the finger, so they run long
+CAPTURE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 12, 15, 30)
+CONNECT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 15, 30)
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30)
+HANDLER_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 15, 30)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names: Iterable[str], values: Iterable[str], extra: str = '') -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class Metric:
+    """One metric family with a fixed set of label names"""
+
+    type = 'untyped'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+class Counter(Metric):
+    """Monotonic count, e.g. errors by reason"""
+
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{format_labels(self.labels, key)} {format_value(value)}" for key, value in items]
+
+class Gauge(Metric):
+    """Current value; set directly or read from function at scrape time"""
+
+    type = 'gauge'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 function: Optional[Callable[[], float]] = None):
+        super().__init__(name, help_text, labels)
+        self.function = function
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[str]:
+        if self.function is not None:
+            return [f"{self.name} {format_value(self.function())}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{format_labels(self.labels, key)} {format_value(value)}" for key, value in items]
+
+class Histogram(Metric):
+    """Latency distribution in fixed buckets (seconds)"""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = HANDLER_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (last one is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a with-block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {format_value(round(total, 6))}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """Named metric families, rendered together"""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+              function: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, help_text, labels, function))
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = HANDLER_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        """Prometheus text exposition of every metric"""
+        return '\n'.join(metric.render() for metric in self.metrics.values()) + '\n'
+
+class ServiceMetrics(MetricsRegistry):
+    """The bridge's metrics, shared by the primary controller and its pool"""
+
+    def __init__(self, version: str = '1.0.0'):
+        super().__init__()
+        self.started_at = time.monotonic()
+
+        self.gauge('zk9500_build_info', 'Service version and host (always 1)', ('version', 'hostname')) \
+            .set(1, version=version, hostname=socket.gethostname())
+        self.gauge('zk9500_uptime_seconds', 'Seconds since the service started', function=self.uptime)
+
+        self.capture_seconds = self.histogram(
+            'zk9500_capture_duration_seconds', 'One scan on the device, including waiting for the finger',
+            ('connection_type', 'outcome'), CAPTURE_BUCKETS
+        )
+        self.discovery_seconds = self.histogram(
+            'zk9500_discovery_duration_seconds', 'Scanner discovery (profile: last-known-good probe)',
+            ('kind',), CONNECT_BUCKETS
+        )
+        self.connect_seconds = self.histogram(
+            'zk9500_connect_duration_seconds', 'Whole connect() call, discovery included',
+            ('outcome',), CONNECT_BUCKETS
+        )
+        self.queue_wait_seconds = self.histogram(
+            'zk9500_capture_queue_wait_seconds', 'Time a capture request waited for a free scanner',
+            buckets=WAIT_BUCKETS
+        )
+        self.ws_message_seconds = self.histogram(
+            'zk9500_ws_message_duration_seconds', 'WebSocket command handling, response sent included',
+            ('command',), HANDLER_BUCKETS
+        )
+        self.errors = self.counter(
+            'zk9500_errors_total', 'Failures by reason', ('reason',)
+        )
+        self.loop_lag_seconds = self.histogram(
+            'zk9500_event_loop_lag_seconds', 'How late the event loop ran the watchdog timer',
+            buckets=LAG_BUCKETS
+        )
+        self.loop_stalls = self.counter(
+            'zk9500_event_loop_stalls_total', 'Times a handler blocked the event loop past the watchdog threshold'
+        )
+        self.loop_stalls.inc(0)
+        self.event_streams = self.gauge(
+            'zk9500_http_event_streams', 'Open GET /events streams'
+        )
+        self.event_streams.set(0)
+
+    def uptime(self) -> float:
+        return round(time.monotonic() - self.started_at, 3)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+ZK9500 Network Helpers
+======================
+
+Cached Tailscale IP lookup. The lookup shells out to `tailscale ip -4`
+(up to 10s), so it runs in the background after the servers bind and
+every reader gets the cached value.
+
+Author: Pattani Installment System
+Version: 1.0.0
+"""
+
+import asyncio
+import logging
+import platform
+import socket
+import subprocess
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+class TailscaleIPResolver:
+    """Tailscale IP cache with TTL and background refresh"""
+
+    def __init__(self, ttl: float = 300.0, configured_ip: Optional[str] = None,
+                 on_change: Optional[Callable[[str], None]] = None):
+        self.ttl = ttl
+        self.configured_ip = configured_ip if configured_ip and configured_ip != 'auto' else None
+        self.on_change = on_change
+        self.ip = self.configured_ip or '127.0.0.1'  # Placeholder until the first lookup finishes
+        self.source = 'config' if self.configured_ip else 'pending'
+        self.updated_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def lookup(self) -> str:
+        """Blocking lookup of the Tailscale IP (run off the event loop)"""
+        try:
+            # Try tailscale command
+            result = subprocess.run(
+                ['tailscale', 'ip', '-4'],
+                capture_output=True,
+                text=True,
+                timeout=10,
+                creationflags=subprocess.CREATE_NO_WINDOW if platform.system() == 'Windows' else 0
+            )
+            if result.returncode == 0 and result.stdout.strip():
+                ip = result.stdout.strip().splitlines()[0]
+                self.source = 'tailscale'
+                return ip
+        except Exception as e:
+            logger.warning(f"Could not get Tailscale IP via command: {e}")
+
+        # Fallback: try to detect from network interfaces
+        try:
+            # Try to connect to a Tailscale IP range to get our Tailscale IP
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+                s.connect(("100.64.0.1", 80))  # Tailscale IP range
+                tailscale_ip = s.getsockname()[0]
+                if tailscale_ip.startswith("100."):
+                    self.source = 'socket'
+                    return tailscale_ip
+        except Exception as e:
+            logger.warning(f"Could not detect Tailscale IP from socket: {e}")
+
+        # Ultimate fallback
+        fallback_ip = socket.gethostbyname(socket.gethostname())
+        logger.warning(f"Using fallback IP: {fallback_ip}")
+        self.source = 'hostname'
+        return fallback_ip
+
+    def refresh(self) -> str:
+        """Blocking refresh of the cache; returns the (possibly unchanged) IP"""
+        if self.configured_ip:
+            return self.ip
+
+        try:
+            ip = self.lookup()
+        except Exception as e:
+            logger.warning(f"Tailscale IP lookup failed, keeping {self.ip}: {e}")
+            return self.ip
+
+        self.updated_at = time.monotonic()
+        if ip != self.ip:
+            logger.info(f"Tailscale IP detected: {ip} (via {self.source})")
+            self.ip = ip
+            if self.on_change:
+                self.on_change(ip)
+        return ip
+
+    async def run(self):
+        """Refresh now, then again every ttl seconds"""
+        while True:
+            await asyncio.to_thread(self.refresh)
+            await asyncio.sleep(self.ttl)
+
+    def start(self):
+        """Start background refresh on the running event loop"""
+        if self.configured_ip:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run(), name="tailscale_ip_refresh")
+
+    async def stop(self):
+        """Stop background refresh"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+ZK9500 Device Pool
+==================
+
+Keeps every scanner attached to this PC open, not just the first one.
+The primary controller owns the first scanner it connects to; the pool
+opens each other SDK index / HID device / serial port on the same backend
+as an extra member controller with its own device worker, so captures on
+different scanners run in parallel.
+
+Each scanner gets a stable ID derived from where it is attached
+(sdk-1, serial-COM4, hid-1b55:0120-3f2a9c1d) that clients can target.
+
+Author: Pattani Installment System
+Version: 1.0.0
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from zk9500_discovery import DeviceCandidate, DeviceDiscovery
+
+logger = logging.getLogger(__name__)
+
+def device_id_for(profile: Dict[str, Any]) -> str:
+    """Stable device ID for a connection profile"""
+    connection_type = profile.get('connection_type')
+    if connection_type == 'zkfinger_sdk':
+        return f"sdk-{profile.get('sdk_index', 0)}"
+    if connection_type == 'usb_hid':
+        device_id = f"hid-{profile['vendor_id']:04x}:{profile['product_id']:04x}"
+        if profile.get('path'):
+            # Tells identical scanners apart by the USB port they sit on
+            device_id += '-' + hashlib.sha1(profile['path'].encode('utf-8')).hexdigest()[:8]
+        return device_id
+    if connection_type == 'serial':
+        return f"serial-{profile['port']}"
+    return str(connection_type)
+
+class DevicePool:
+    """The primary controller plus one member controller per extra scanner"""
+
+    def __init__(self, controller, max_devices: int = 4, rescan_interval: float = 30.0):
+        self.controller = controller
+        self.max_devices = max_devices
+        self.rescan_interval = rescan_interval
+        self.members: Dict[str, Any] = {}  # device_id -> member controller
+        self.discovery = DeviceDiscovery(overall_timeout=controller.discovery.overall_timeout)
+        self.last_scan = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def devices(self) -> List[Any]:
+        """Every controller that can take captures, primary first"""
+        return [self.controller, *self.members.values()]
+
+    def get(self, device_id: str):
+        """Controller holding the given device ID, or None"""
+        if device_id == self.controller.device_id:
+            return self.controller
+        return self.members.get(device_id)
+
+    def scan(self) -> List[Tuple[str, DeviceCandidate]]:
+        """Blocking: open scanners not yet held, on the primary's backend"""
+        controller = self.controller
+        with controller.discovery_lock:
+            if not controller.device_info['connected']:
+                return []
+            room = self.max_devices - len(self.devices())
+            if room <= 0:
+                return []
+
+            held = {device.device_id for device in self.devices()}
+            with controller.metrics.discovery_seconds.time(kind='pool'):
+                found = self.discovery.run_all(controller.pool_probes(controller.connection_type, held))
+            for _, candidate in found[room:]:
+                candidate.close()
+            return found[:room]
+
+    async def refresh(self):
+        """Drop lost members, then add any newly attached scanners"""
+        await self.prune()
+        await self.add_new()
+
+    async def prune(self):
+        """Close and drop members whose scanner is gone"""
+        removed = False
+        for device_id, member in list(self.members.items()):
+            if member.worker.busy and not member.health_monitor.probe_due:
+                continue
+            if member.device_info['connected'] and await member.worker.run(member.check_presence):
+                continue
+            if self.members.get(device_id) is not member:
+                continue  # Already removed by a concurrent refresh
+            logger.warning(f"⚠️ Scanner {device_id} lost, removing it from the pool")
+            del self.members[device_id]
+            removed = True
+            await member.worker.run(member.disconnect, 'device lost')
+            await asyncio.to_thread(member.worker.stop)
+
+        if removed:
+            self.controller.scheduler.refresh_devices()
+
+    async def add_new(self):
+        """Open scanners attached since the last scan"""
+        self.last_scan = time.monotonic()
+        if self.max_devices > 1:
+            for device_id, candidate in await asyncio.to_thread(self.scan):
+                member = self.controller.create_member()
+                member.worker.name = f"zk9500-device-{device_id}"
+                await member.worker.run(member.apply_candidate, candidate)
+                self.members[member.device_id] = member
+                logger.info(f"✅ Added scanner {member.device_id} to the pool ({len(self.devices())} total)")
+
+        self.controller.scheduler.refresh_devices()
+
+    async def run(self):
+        """Check members every health-check interval, rescan every rescan_interval"""
+        scanned_connected = False
+        while True:
+            try:
+                await self.prune()
+                connected = self.controller.device_info['connected']
+                # Scan as soon as the primary (re)connects, then periodically
+                if connected and (not scanned_connected or
+                                  time.monotonic() - self.last_scan >= self.rescan_interval):
+                    await self.add_new()
+                scanned_connected = connected
+            except Exception as e:
+                logger.error(f"Device pool refresh error: {e}")
+            await asyncio.sleep(self.controller.health_monitor.check_interval)
+
+    def start(self):
+        """Start rescanning on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run(), name="zk9500_device_pool")
+
+    async def stop(self):
+        """Stop rescanning and close every member"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+        for member in self.members.values():
+            await member.worker.run(member.disconnect)
+            await asyncio.to_thread(member.worker.stop)
+        self.members.clear()
+
+    def get_status(self) -> List[Dict[str, Any]]:
+        """Per-scanner state for /status and /devices"""
+        return [
+            {
+                'device_id': device.device_id,
+                'primary': device is self.controller,
+                'connection_type': device.connection_type,
+                'connected': device.device_info['connected'],
+                'busy': device.worker.busy,
+                'serial': device.device_info['serial'],
+                'total_scans': device.device_info['total_scans'],
+                'last_scan_time': device.device_info['last_scan_time']
+            }
+            for device in self.devices()
+        ]
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+ZK9500 Wire Protocol
+====================
+
+Response framing shared by the serial and USB HID transports, and the
+event-driven serial reader.
+
+Frame layout (little-endian):
+    status (1) | quality (1) | payload_length (2) | payload (payload_length)
+
+Author: Pattani Installment System
+Version: 1.0.0
+"""
+
+import collections
+import logging
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+import serial
+import serial.threaded
+
+logger = logging.getLogger(__name__)
+
+HEADER_SIZE = 4
+HID_REPORT_SIZE = 64
+TEMPLATE_MAX_SIZE = 2048  # Same as the ZKFinger SDK template buffer
+
+class FrameDecoder:
+    """Incremental decoder for ZK9500 response frames
+
+    Feed it whatever the transport delivered; it returns every frame that
+    became complete and keeps partial data for the next call. Each frame
+    is allocated once at its final size as soon as the header is known,
+    and received bytes are copied straight into it through memoryviews,
+    so a multi-packet template is reassembled without intermediate copies.
+
+    Serial data is a plain byte stream. HID data arrives as fixed 64-byte
+    reports whose tail is zero padding once a frame ends; pass
+    padded=True for those so the padding is not read as a new header.
+    In that mode an all-zero header (an idle or flushed report) is
+    padding too, never an empty frame.
+    """
+
+    def __init__(self, max_payload: int = TEMPLATE_MAX_SIZE):
+        self.max_payload = max_payload
+        self.header = bytearray(HEADER_SIZE)
+        self.header_filled = 0
+        self.frame: Optional[bytearray] = None
+        self.frame_filled = 0
+        self.discarded = 0
+
+    @property
+    def pending(self) -> int:
+        """Bytes of the frame currently being assembled"""
+        return self.frame_filled if self.frame is not None else self.header_filled
+
+    def feed(self, data, padded: bool = False) -> List[bytearray]:
+        """Add received bytes (or one HID report) and return the completed frames"""
+        view = memoryview(data).cast('B')
+        size = len(view)
+        position = 0
+        frames = []
+
+        while position < size:
+            if self.frame is None:
+                take = min(HEADER_SIZE - self.header_filled, size - position)
+                self.header[self.header_filled:self.header_filled + take] = view[position:position + take]
+                self.header_filled += take
+                position += take
+                if self.header_filled < HEADER_SIZE:
+                    break
+
+                if padded and not any(self.header):
+                    # Idle or flushed report: nothing but padding
+                    self.header_filled = 0
+                    break
+
+                length = int.from_bytes(self.header[2:4], 'little')
+                if length > self.max_payload:
+                    # Not a valid header, resync on the next byte
+                    self.header[0:HEADER_SIZE - 1] = self.header[1:HEADER_SIZE]
+                    self.header_filled = HEADER_SIZE - 1
+                    self.discarded += 1
+                    continue
+
+                self.frame = bytearray(HEADER_SIZE + length)
+                self.frame[:HEADER_SIZE] = self.header
+                self.frame_filled = HEADER_SIZE
+                self.header_filled = 0
+
+            take = min(len(self.frame) - self.frame_filled, size - position)
+            self.frame[self.frame_filled:self.frame_filled + take] = view[position:position + take]
+            self.frame_filled += take
+            position += take
+
+            if self.frame_filled == len(self.frame):
+                frames.append(self.frame)
+                self.frame = None
+                self.frame_filled = 0
+                if padded:
+                    # Rest of this report is padding
+                    break
+
+        return frames
+
+    def reset(self):
+        """Drop any partial frame"""
+        self.header_filled = 0
+        self.frame = None
+        self.frame_filled = 0
+
+def decode_stream(chunks: Iterable, padded: bool = False) -> List[bytearray]:
+    """Decode a recorded sequence of reads or HID reports into frames"""
+    decoder = FrameDecoder()
+    frames = []
+    for chunk in chunks:
+        frames.extend(decoder.feed(chunk, padded=padded))
+    return frames
+
+def split_frame(frame: bytearray) -> Tuple[int, int, memoryview]:
+    """Return status, quality and a zero-copy view of the payload"""
+    return frame[0], frame[1], memoryview(frame)[HEADER_SIZE:]
+
+def encode_frame(status: int, quality: int, payload: bytes = b'') -> bytes:
+    """Build a response frame, as the scanner would send it"""
+    return bytes([status, quality]) + len(payload).to_bytes(2, 'little') + bytes(payload)
+
+class FrameProtocol(serial.threaded.Protocol):
+    """pyserial Protocol that decodes frames as bytes arrive"""
+
+    def __init__(self):
+        self.decoder = FrameDecoder()
+        self.frames = collections.deque()
+        self.bytes_received = 0
+        self.error: Optional[Exception] = None
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def data_received(self, data):
+        with self.condition:
+            self.bytes_received += len(data)
+            self.frames.extend(self.decoder.feed(data))
+            self.condition.notify_all()
+
+    def connection_lost(self, exc):
+        with self.condition:
+            self.error = exc
+            self.closed = True
+            self.condition.notify_all()
+
+class SerialFrameReader:
+    """Reader thread that feeds a FrameDecoder from a serial port
+
+    Callers block on a condition variable instead of polling in_waiting,
+    so a response is handed back as soon as its last byte arrives.
+    """
+
+    def __init__(self, port: serial.Serial):
+        self.port = port
+        self.protocol = FrameProtocol()
+        self.thread: Optional[serial.threaded.ReaderThread] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.thread is not None and self.thread.alive
+
+    def start(self):
+        """Start reading from the port"""
+        if self.alive:
+            return
+        with self.protocol.condition:
+            self.protocol.closed = False
+            self.protocol.error = None
+        self.thread = serial.threaded.ReaderThread(self.port, lambda: self.protocol)
+        self.thread.name = f"zk9500-serial-{self.port.port}"
+        self.thread.start()
+        self.thread.connect()
+
+    def stop(self):
+        """Stop the reader thread (the port stays open)"""
+        if self.thread:
+            self.thread.stop()
+            self.thread = None
+
+    def reset(self):
+        """Discard buffered frames and partial data before a new command"""
+        with self.protocol.condition:
+            self.protocol.frames.clear()
+            self.protocol.decoder.reset()
+            self.protocol.bytes_received = 0
+
+    def write(self, data: bytes):
+        """Thread-safe write of a command"""
+        if self.thread:
+            self.thread.write(data)
+        else:
+            self.port.write(data)
+        self.port.flush()
+
+    def wait_for_frame(self, timeout: float) -> Optional[bytearray]:
+        """Block until a complete frame arrives or the timeout expires"""
+        deadline = time.monotonic() + timeout
+        protocol = self.protocol
+        with protocol.condition:
+            while not protocol.frames:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or protocol.closed:
+                    break
+                protocol.condition.wait(remaining)
+            if protocol.closed and protocol.error:
+                raise serial.SerialException(f"Serial reader stopped: {protocol.error}")
+            return protocol.frames.popleft() if protocol.frames else None
+
+    def wait_for_data(self, timeout: float) -> int:
+        """Block until any byte arrives; return the number of bytes received"""
+        deadline = time.monotonic() + timeout
+        protocol = self.protocol
+        with protocol.condition:
+            while protocol.bytes_received == 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or protocol.closed:
+                    break
+                protocol.condition.wait(remaining)
+            return protocol.bytes_received
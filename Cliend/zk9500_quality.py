@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+ZK9500 Image Quality
+====================
+
+Local quality score (0-100) for a raw fingerprint image, so a smudged or
+partial capture is retried on the scanner instead of costing a backend
+round trip and a manual rescan.
+
+The image is split into blocks and scored in one vectorized pass:
+  - coverage: share of blocks with enough grey-level contrast to hold
+    ridges (background and smudges are flat)
+  - clarity: mean orientation coherence of the gradients in those blocks
+    (1.0 = clean parallel ridges, 0.0 = noise)
+
+Needs NumPy; without it image_quality() returns None, the capture carries
+no quality value and it is never rejected for quality.
+
+Author: Pattani Installment System
+Version: 1.0.0
+"""
+
+import logging
+from typing import Optional
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+logger = logging.getLogger(__name__)
+
+def image_quality(image, width: int, height: int, block: int = 16,
+                  contrast_min: float = 12.0, full_coverage: float = 0.4) -> Optional[int]:
+    """Quality score for an 8-bit greyscale image buffer (None without NumPy)
+
+    full_coverage is the share of foreground blocks that counts as a fully
+    placed finger.
+    """
+    if not HAS_NUMPY:
+        return None
+
+    pixels = np.frombuffer(image, dtype=np.uint8, count=width * height).reshape(height, width)
+    rows, cols = height // block, width // block
+    img = pixels[:rows * block, :cols * block].astype(np.float32)
+
+    def block_mean(values):
+        return values.reshape(rows, block, cols, block).mean(axis=(1, 3))
+
+    # Contrast: per-block standard deviation
+    mean = block_mean(img)
+    std = np.sqrt(np.maximum(block_mean(img * img) - mean * mean, 0))
+    foreground = std >= contrast_min
+    coverage = float(foreground.mean())
+    if not foreground.any():
+        return 0
+
+    # Ridge clarity: orientation coherence from the gradient structure tensor
+    gy, gx = np.gradient(img)
+    gxx = block_mean(gx * gx)
+    gyy = block_mean(gy * gy)
+    gxy = block_mean(gx * gy)
+    energy = gxx + gyy
+    coherence = np.sqrt((gxx - gyy) ** 2 + 4 * gxy * gxy) / np.maximum(energy, 1e-6)
+    clarity = float(coherence[foreground].mean())
+
+    return int(round(100 * min(coverage / full_coverage, 1.0) * clarity))
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+ZK9500 Capture Result
+=====================
+
+Compact result object for one successful scan. The capture paths used to
+build a fresh dict per scan, copying the device fields into it along
+with a clientInfo dict and an imageSize string, and every front-end then
+copied it again to convert the binary fields. A CaptureResult holds
+references to the template and image buffers plus the few device fields
+in __slots__, taken at capture time so a spooled or later-serialized
+result still names the scanner and IP that took it. It is turned into
+JSON, binary WebSocket frames or msgpack when a transport asks for it.
+The JSON body is encoded once per format and shared by every client a
+scan is fanned out to.
+
+It still reads like the old dict (result['quality'], result.get(...),
+result.setdefault('deviceId', ...)) for code that inspects results.
+
+Author: Pattani Installment System
+Version: 1.0.0
+"""
+
+import base64
+import json
+from collections.abc import MutableMapping
+from typing import Any, Dict, List, Optional
+
+try:
+    import msgpack
+    HAS_MSGPACK = True
+except ImportError:
+    HAS_MSGPACK = False
+
+# Dict keys stored as they are, and the slot holding each
+SLOT_KEYS = {
+    'templateData': 'template',
+    'quality': 'quality',
+    'captureTime': 'capture_time',
+    'scanCount': 'scan_count',
+    'connectionType': 'connection_type',
+    'captureMode': 'capture_mode',
+    'fingerprint_data': 'image',
+    'imageWidth': 'image_width',
+    'imageHeight': 'image_height',
+    'qualityAttempts': 'quality_attempts',
+    'deviceId': 'device_id',
+    'deviceSerial': 'device_serial',
+    'firmware': 'firmware',
+    'resolution': 'resolution'
+}
+
+# Dict keys derived on access from the slots instead of stored per scan
+COMPUTED_KEYS = {
+    'success': lambda result: True,
+    'imageSize': lambda result: f"{len(result.template)} bytes" if result.template is not None else None,
+    'clientInfo': lambda result: {
+        'hostname': result.client_hostname,
+        'tailscale_ip': result.client_ip
+    }
+}
+
+# Key order of the old result dicts
+KEYS = ('success', 'templateData', 'quality', 'deviceSerial', 'firmware', 'resolution', 'imageSize',
+        'captureTime', 'scanCount', 'connectionType', 'captureMode', 'clientInfo',
+        'fingerprint_data', 'imageWidth', 'imageHeight', 'qualityAttempts', 'deviceId')
+
+def merge_json(fields: Dict[str, Any], body: str) -> str:
+    """Add top-level fields to an encoded JSON object without encoding it again"""
+    if not fields:
+        return body
+    head = json.dumps(fields)
+    return head if body == '{}' else head[:-1] + ', ' + body[1:]
+
+def pack_msgpack(data: Dict[str, Any]) -> bytes:
+    """msgpack encoding with bytes kept as raw bin fields"""
+    return msgpack.packb(data, use_bin_type=True)
+
+class CaptureResult(MutableMapping):
+    """One successful scan, serialized lazily per transport"""
+
+    __slots__ = ('template', 'quality', 'capture_time', 'scan_count', 'connection_type', 'capture_mode',
+                 'image', 'image_width', 'image_height', 'quality_attempts', 'device_id', 'device_serial',
+                 'firmware', 'resolution', 'client_hostname', 'client_ip', 'extra', '_encoded')
+
+    def __init__(self, device_info: Dict[str, Any], template, quality: Optional[int], connection_type: str,
+                 capture_mode: Optional[str] = None, image=None, image_width: Optional[int] = None,
+                 image_height: Optional[int] = None):
+        self.template = template  # bytes or a memoryview over the received frame
+        self.quality = quality
+        # Read now: after a reconnect or pool failover device_info describes another scanner
+        self.capture_time = device_info['last_scan_time']
+        self.scan_count = device_info['total_scans']
+        self.device_serial = device_info['serial']
+        self.firmware = device_info['firmware']
+        self.resolution = device_info['resolution']
+        self.client_hostname = device_info['client_hostname']
+        self.client_ip = device_info['client_ip']
+        self.connection_type = connection_type
+        self.capture_mode = capture_mode
+        self.image = image
+        self.image_width = image_width
+        self.image_height = image_height
+        self.quality_attempts: Optional[int] = None
+        self.device_id: Optional[str] = None
+        self.extra: Optional[Dict[str, Any]] = None  # Keys set by callers that have no slot
+        self._encoded: Optional[Dict[str, str]] = None  # template format -> JSON body
+
+    def __getitem__(self, key: str):
+        slot = SLOT_KEYS.get(key)
+        if slot is not None:
+            value = getattr(self, slot)
+        elif key in COMPUTED_KEYS:
+            value = COMPUTED_KEYS[key](self)
+        else:
+            value = self.extra.get(key) if self.extra else None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value):
+        if key in COMPUTED_KEYS:
+            raise TypeError(f"{key} is derived from the device and cannot be set")
+        slot = SLOT_KEYS.get(key)
+        if slot is not None:
+            setattr(self, slot, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+        self._encoded = None
+
+    def __delitem__(self, key: str):
+        if key not in self:
+            raise KeyError(key)
+        self[key] = None
+        self._encoded = None
+
+    def __iter__(self):
+        for key in KEYS:
+            if key in self:
+                yield key
+        if self.extra:
+            yield from (key for key, value in self.extra.items() if value is not None)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"CaptureResult(quality={self.quality}, connectionType={self.connection_type!r}, deviceId={self.device_id!r})"
+
+    def jsonable(self, template_format: str = 'json') -> Dict[str, Any]:
+        """Dict for JSON: the image as base64 and the template as an int list
+        (legacy), or only its length when it travels in a binary frame"""
+        data = {}
+        for key in self:
+            value = self[key]
+            if key == 'templateData':
+                if template_format == 'binary':
+                    data['templateFormat'] = 'binary'
+                    data['templateLength'] = len(value)
+                else:
+                    data[key] = list(value)
+            elif key == 'fingerprint_data':
+                data['fingerprint_data_base64'] = base64.b64encode(value).decode('utf-8')
+                data['fingerprint_data_length'] = len(value)
+            else:
+                data[key] = value
+        return data
+
+    def json_body(self, template_format: str = 'json') -> str:
+        """jsonable() as JSON text, encoded once per format"""
+        if self._encoded is None:
+            self._encoded = {}
+        body = self._encoded.get(template_format)
+        if body is None:
+            body = self._encoded[template_format] = json.dumps(self.jsonable(template_format))
+        return body
+
+    def to_msgpack(self, **fields) -> bytes:
+        """msgpack map with the template and image as raw bin fields"""
+        return pack_msgpack({**fields, **self})
+
+    def message(self, **fields) -> "ResultMessage":
+        """This result with per-message fields (command, type, ...) around it"""
+        return ResultMessage(self, fields)
+
+class ResultMessage:
+    """A CaptureResult plus the fields of the one message carrying it"""
+
+    __slots__ = ('result', 'fields')
+
+    def __init__(self, result: CaptureResult, fields: Dict[str, Any]):
+        self.result = result
+        self.fields = fields
+
+    def encode(self, template_format: str = 'json') -> List:
+        """WebSocket messages for one client's negotiated format"""
+        if template_format == 'msgpack':
+            return [self.result.to_msgpack(**self.fields)]
+        text = merge_json(self.fields, self.result.json_body(template_format))
+        if template_format == 'binary' and self.result.template is not None:
+            return [text, self.result.template]
+        return [text]
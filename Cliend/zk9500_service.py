@@ -13,12 +13,12 @@ Version: 1.0.0
 import asyncio
 import websockets
 import json
+import base64
 import serial
 import serial.tools.list_ports
 import logging
 import time
 import socket
-import subprocess
 import platform
 import threading
 import sys
@@ -26,7 +26,7 @@ import os
 import configparser
 import ctypes
 from ctypes import wintypes
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from pathlib import Path
 
 # USB HID imports
@@ -60,6 +60,24 @@ try:
 except ImportError:
     HAS_HTTP_API = False
 
+from zk9500_worker import DeviceWorker, CaptureScheduler
+from zk9500_network import TailscaleIPResolver
+from zk9500_discovery import DeviceDiscovery, DeviceCandidate, Probe, ConnectionProfileStore
+from zk9500_protocol import SerialFrameReader, FrameDecoder, split_frame, HID_REPORT_SIZE
+from zk9500_result import CaptureResult, ResultMessage, HAS_MSGPACK, pack_msgpack
+from zk9500_events import EventBus, EVENT_TYPES, RESULT_EVENTS
+from zk9500_health import DeviceHealthMonitor
+from zk9500_pool import DevicePool, device_id_for
+from zk9500_stream import ScanStream
+from zk9500_store import TemplateStore
+from zk9500_spool import UploadSpool
+from zk9500_metrics import ServiceMetrics
+from zk9500_tracing import tracer, OTLPFileExporter
+from zk9500_simulator import DeviceSimulator, load_script
+from zk9500_watchdog import LoopWatchdog
+from zk9500_quality import image_quality, HAS_NUMPY as HAS_QUALITY_SCORING
+from zk9500_matcher import FingerprintIdentifier, create_matcher, decode_template
+
 # Configure logging with UTF-8 encoding to fix Unicode errors
 log_dir = Path(__file__).parent / "logs"
 log_dir.mkdir(exist_ok=True)
@@ -97,13 +115,59 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Known ZKTeco USB IDs
+ZKTECO_HID_IDS = [
+    (0x1b55, 0x0124),  # ZK9500 (ค่าจริงที่พบ)
+    (0x1b55, 0x0010),  # ZKTeco ZK9500 variants
+    (0x1b55, 0x0020),  # ZKTeco variants
+    (0x2808, 0x0001),  # Alternative ZKTeco ID
+    (0x1a86, 0x0001),  # Some ZK devices
+]
+ZKTECO_VENDOR_IDS = [0x1b55, 0x2808, 0x1a86]
+ZKTECO_SERIAL_VIDS = [0x1b55, 0x2808, 0x1a86, 0x0403]  # Common ZKTeco vendor IDs
+
+# What a capture returns: template only (default), raw image only, or both
+CAPTURE_MODES = ('template', 'image', 'both')
+
+# WebSocket template encodings: legacy JSON int list, or JSON header + binary frame
+TEMPLATE_FORMATS = ('json', 'binary') + (('msgpack',) if HAS_MSGPACK else ())
+BINARY_SUBPROTOCOL = 'zk9500.binary.v1'
+MSGPACK_SUBPROTOCOL = 'zk9500.msgpack.v1'
+WS_COMMANDS = ('test', 'connect', 'disconnect', 'capture_fingerprint', 'identify', 'set_format',
+               'cancel_capture', 'subscribe_events', 'unsubscribe_events', 'subscribe_scans',
+               'unsubscribe_scans', 'list_devices', 'status')
+
+# Default events for subscribe_events (scans have their own command)
+DEVICE_EVENTS = ('device_connected', 'device_disconnected', 'device_reconnect_failed')
+SUBSCRIBABLE_EVENTS = tuple(t for t in EVENT_TYPES if t != 'scan')
+
+# ZKFPM_AcquireFingerprint never blocks; it returns this until a finger is on the sensor
+ZKFP_ERR_CAPTURE = -8
+SDK_POLL_INTERVAL = 0.1  # Seconds between AcquireFingerprint calls while waiting for a finger
+
+class SDKCaptureBuffers:
+    """ctypes buffers reused by every capture on one SDK device handle"""
+    
+    IMAGE_SIZE = 640 * 480  # Standard fingerprint image size
+    TEMPLATE_SIZE = 2048    # Template buffer size
+    
+    def __init__(self, width: int = 640, height: int = 480):
+        self.image = (ctypes.c_ubyte * self.IMAGE_SIZE)()
+        self.template = (ctypes.c_ubyte * self.TEMPLATE_SIZE)()
+        self.template_size = ctypes.c_uint(self.TEMPLATE_SIZE)
+        self.width = width  # Actual sensor image size, as reported by the SDK
+        self.height = height
+
 class ZKFingerSDKInterface:
     """Interface for ZKFinger SDK"""
     
     def __init__(self):
         self.dll = None
         self.initialized = False
+        self.has_db = False  # 1:N DB cache functions (ZKFPM_DB*) are exported
         self.devices = []
+        self.buffers: Dict[int, SDKCaptureBuffers] = {}  # device handle -> buffers
+        self.last_status: Dict[int, Optional[int]] = {}  # device handle -> last AcquireFingerprint result
         self.load_dll()
     
     def load_dll(self):
@@ -151,11 +215,52 @@ class ZKFingerSDKInterface:
                 ctypes.POINTER(ctypes.c_uint)    # template size
             ]
             self.dll.ZKFPM_AcquireFingerprint.restype = ctypes.c_int
-            
-            return True
         except AttributeError as e:
             logger.error(f"Error setting up ZKFinger SDK prototypes: {e}")
             return False
+        
+        try:
+            # 1:N matching cache (older DLLs may not export these)
+            self.dll.ZKFPM_DBInit.argtypes = []
+            self.dll.ZKFPM_DBInit.restype = ctypes.c_void_p
+            
+            self.dll.ZKFPM_DBFree.argtypes = [ctypes.c_void_p]
+            self.dll.ZKFPM_DBFree.restype = ctypes.c_int
+            
+            self.dll.ZKFPM_DBAdd.argtypes = [ctypes.c_void_p, ctypes.c_uint, ctypes.c_char_p, ctypes.c_uint]
+            self.dll.ZKFPM_DBAdd.restype = ctypes.c_int
+            
+            self.dll.ZKFPM_DBDel.argtypes = [ctypes.c_void_p, ctypes.c_uint]
+            self.dll.ZKFPM_DBDel.restype = ctypes.c_int
+            
+            self.dll.ZKFPM_DBClear.argtypes = [ctypes.c_void_p]
+            self.dll.ZKFPM_DBClear.restype = ctypes.c_int
+            
+            self.dll.ZKFPM_DBIdentify.argtypes = [
+                ctypes.c_void_p,  # DB cache handle
+                ctypes.c_char_p,  # probe template
+                ctypes.c_uint,    # template size
+                ctypes.POINTER(ctypes.c_uint),  # matched fid
+                ctypes.POINTER(ctypes.c_uint)   # score
+            ]
+            self.dll.ZKFPM_DBIdentify.restype = ctypes.c_int
+            self.has_db = True
+        except AttributeError as e:
+            logger.warning(f"ZKFinger SDK DB functions not available: {e}")
+        
+        try:
+            # Sensor image size, needed to score image quality
+            self.dll.ZKFPM_GetCaptureParamsEx.argtypes = [
+                ctypes.c_void_p,
+                ctypes.POINTER(ctypes.c_int),  # width
+                ctypes.POINTER(ctypes.c_int),  # height
+                ctypes.POINTER(ctypes.c_int)   # dpi
+            ]
+            self.dll.ZKFPM_GetCaptureParamsEx.restype = ctypes.c_int
+        except AttributeError as e:
+            logger.warning(f"ZKFinger SDK capture parameters not available: {e}")
+        
+        return True
     
     def initialize(self):
         """Initialize ZKFinger SDK"""
@@ -199,16 +304,34 @@ class ZKFingerSDKInterface:
         
         try:
             handle = self.dll.ZKFPM_OpenDevice(index)
-            return handle if handle else None
+            if not handle:
+                return None
+            
+            # Allocate capture buffers once per handle instead of per scan
+            self.buffers[handle] = SDKCaptureBuffers(*self.get_image_size(handle))
+            return handle
         except Exception as e:
             logger.error(f"Open device error: {e}")
             return None
     
+    def get_image_size(self, handle):
+        """Sensor image (width, height); 640x480 if the SDK cannot tell"""
+        width, height, dpi = ctypes.c_int(0), ctypes.c_int(0), ctypes.c_int(0)
+        try:
+            result = self.dll.ZKFPM_GetCaptureParamsEx(handle, ctypes.byref(width), ctypes.byref(height), ctypes.byref(dpi))
+            if result == 0 and 0 < width.value * height.value <= SDKCaptureBuffers.IMAGE_SIZE:
+                return width.value, height.value
+        except Exception as e:
+            logger.debug(f"Get capture params error: {e}")
+        return 640, 480
+    
     def close_device(self, handle):
         """Close device handle"""
         if not self.dll or not handle:
             return True
         
+        self.buffers.pop(handle, None)
+        self.last_status.pop(handle, None)
         try:
             result = self.dll.ZKFPM_CloseDevice(handle)
             return result == 0
@@ -216,51 +339,110 @@ class ZKFingerSDKInterface:
             logger.error(f"Close device error: {e}")
             return False
     
-    def capture_fingerprint(self, handle):
-        """Capture fingerprint from device"""
+    def db_init(self):
+        """Create a 1:N matching cache (None if unavailable)"""
+        if not self.has_db:
+            return None
+        if not self.initialized and not self.initialize()[0]:
+            return None
+        
+        try:
+            return self.dll.ZKFPM_DBInit() or None
+        except Exception as e:
+            logger.error(f"DB init error: {e}")
+            return None
+    
+    def db_free(self, cache):
+        """Release a matching cache"""
+        try:
+            self.dll.ZKFPM_DBFree(cache)
+        except Exception as e:
+            logger.warning(f"DB free error: {e}")
+    
+    def db_add(self, cache, fid: int, template: bytes) -> bool:
+        """Add an enrolled template to the cache"""
+        return self.dll.ZKFPM_DBAdd(cache, fid, template, len(template)) == 0
+    
+    def db_del(self, cache, fid: int) -> bool:
+        """Remove a template from the cache"""
+        return self.dll.ZKFPM_DBDel(cache, fid) == 0
+    
+    def db_clear(self, cache):
+        """Remove every template from the cache"""
+        self.dll.ZKFPM_DBClear(cache)
+    
+    def db_identify(self, cache, template: bytes):
+        """Best (fid, score) in the cache for a probe template, or None"""
+        fid = ctypes.c_uint(0)
+        score = ctypes.c_uint(0)
+        result = self.dll.ZKFPM_DBIdentify(cache, template, len(template), ctypes.byref(fid), ctypes.byref(score))
+        return (fid.value, score.value) if result == 0 else None
+    
+    def capture_fingerprint(self, handle, include_image: bool = False):
+        """Capture fingerprint from device
+        
+        Returns (image, template). The image is None unless include_image
+        is set; it is then a memoryview over this handle's pooled buffer,
+        valid until the next capture on the same handle, so copy it if
+        it has to outlive the call.
+        """
         if not self.dll or not handle:
             return None, None
         
         try:
-            # Allocate buffers
-            image_size = 640 * 480  # Standard fingerprint image size
-            template_size = 2048    # Template buffer size
-            
-            image_buffer = (ctypes.c_ubyte * image_size)()
-            template_buffer = (ctypes.c_ubyte * template_size)()
-            template_size_ref = ctypes.c_uint(template_size)
+            buffers = self.buffers.get(handle)
+            if buffers is None:
+                buffers = self.buffers[handle] = SDKCaptureBuffers()
+            buffers.template_size.value = SDKCaptureBuffers.TEMPLATE_SIZE
             
             # Capture fingerprint
             result = self.dll.ZKFPM_AcquireFingerprint(
                 handle,
-                image_buffer,
-                image_size,
-                template_buffer,
-                ctypes.byref(template_size_ref)
+                buffers.image,
+                SDKCaptureBuffers.IMAGE_SIZE,
+                buffers.template,
+                ctypes.byref(buffers.template_size)
             )
+            self.last_status[handle] = result
             
             if result == 0:  # Success
-                # Convert to bytes
-                image_data = bytes(image_buffer)
-                template_data = bytes(template_buffer[:template_size_ref.value])
+                # Template is small and outlives the pooled buffer, copy just its used part
+                template_data = ctypes.string_at(buffers.template, buffers.template_size.value)
+                tracer.annotate(template_bytes=len(template_data), include_image=include_image)
+                image_data = memoryview(buffers.image).cast('B')[:buffers.width * buffers.height] if include_image else None
                 return image_data, template_data
             else:
                 return None, None
                 
         except Exception as e:
             logger.error(f"Capture fingerprint error: {e}")
+            self.last_status[handle] = None
             return None, None
 
 class ZK9500Controller:
     """Controller for ZK9500 fingerprint scanner"""
     
-    def __init__(self, config):
+    def __init__(self, config, parent: Optional["ZK9500Controller"] = None):
         self.config = config
+        self.parent = parent  # Set for extra scanners owned by the primary's device pool
         self.port: Optional[serial.Serial] = None
+        self.serial_reader: Optional[SerialFrameReader] = None
         self.hid_device = None
         self.connection_type = None  # 'serial', 'usb_hid', or 'zkfinger_sdk'
-        self.zkfinger_sdk = ZKFingerSDKInterface()
+        
+        # Simulated scanners replace every real backend when [simulator] is enabled
+        self.simulator = parent.simulator if parent else self.create_simulator()
+        self.zkfinger_sdk = parent.zkfinger_sdk if parent else (
+            self.simulator.sdk if self.simulator else ZKFingerSDKInterface()
+        )
         self.device_handle = None
+        
+        # Tailscale lookup can take seconds; it runs after the servers bind
+        self.ip_resolver = parent.ip_resolver if parent else TailscaleIPResolver(
+            ttl=float(config.get('tailscale', 'cache_ttl', fallback=300)),
+            configured_ip=config.get('tailscale', 'ip', fallback=None),
+            on_change=self.set_client_ip
+        )
         self.device_info = {
             'model': 'ZK9500',
             'serial': 'unknown',
@@ -276,42 +458,209 @@ class ZK9500Controller:
         }
         self.reconnect_attempts = 0
         self.max_reconnect_attempts = int(config.get('device', 'max_reconnect_attempts', fallback=5))
+        
+        # SDK captures scored below min_quality are retried on the scanner, up to quality_attempts scans
+        self.min_quality = int(config.get('device', 'min_quality', fallback=40))
+        self.quality_attempts = max(int(config.get('device', 'quality_attempts', fallback=3)), 1)
+        # Template-only captures skip the image unless it is read just to score them
+        self.score_template_captures = config.getboolean('device', 'score_template_captures', fallback=False)
+        
+        # Backends are probed concurrently; the winner is cached for the next connect
+        self.probe_timeout = float(config.get('device', 'probe_timeout', fallback=3))
+        self.discovery = DeviceDiscovery(
+            overall_timeout=float(config.get('device', 'discovery_timeout', fallback=8))
+        )
+        
+        # Primary connect and pool scans must not open the same scanner twice
+        self.discovery_lock = parent.discovery_lock if parent else threading.Lock()
+        
+        # Last-known-good profile survives restarts so reconnects skip discovery
+        self.profile_store = None if parent else ConnectionProfileStore(
+            Path(__file__).parent / config.get('device', 'state_file', fallback='device_state.json')
+        )
+        self.connection_profile: Optional[Dict[str, Any]] = self.profile_store.load() if self.profile_store else None
+        
+        # Latency histograms and error counters for GET /metrics
+        self.metrics = parent.metrics if parent else ServiceMetrics()
+        
+        # Event-loop lag, and the stack of any handler blocking the loop, started with the servers
+        self.loop_watchdog = None if parent else LoopWatchdog(
+            self.metrics,
+            interval=float(config.get('watchdog', 'interval', fallback=0.1)),
+            threshold=float(config.get('watchdog', 'threshold', fallback=0.25)),
+            enabled=config.getboolean('watchdog', 'enabled', fallback=True)
+        )
+        
+        # All blocking device I/O runs on this thread, never on the event loop
+        self.worker = DeviceWorker()
+        
+        # Shared FIFO capture queue for the WebSocket and HTTP front-ends
+        self.scheduler = CaptureScheduler(
+            self,
+            default_timeout=float(config.get('device', 'request_timeout', fallback=30)),
+            quality_warning=int(config.get('device', 'quality_warning_threshold', fallback=50))
+        )
+        
+        # Device connect/disconnect events for subscribed clients
+        self.events = parent.events if parent else EventBus()
+        
+        # Presence checks and background reconnects, started by the WebSocket server
+        self.health_monitor = DeviceHealthMonitor(
+            self,
+            check_interval=float(config.get('device', 'health_check_interval', fallback=2)),
+            backoff_min=float(config.get('device', 'reconnect_backoff_min', fallback=1)),
+            backoff_max=float(config.get('device', 'reconnect_backoff_max', fallback=60)),
+            failure_threshold=int(config.get('device', 'health_check_after_failures', fallback=3))
+        )
+        
+        # Other scanners on the same PC, each with its own worker
+        self.pool = DevicePool(
+            self,
+            max_devices=int(config.get('device', 'max_devices', fallback=4)),
+            rescan_interval=float(config.get('device', 'pool_rescan_interval', fallback=30))
+        )
+        
+        # Push-mode scanning for clients that subscribe instead of polling
+        self.scan_stream = ScanStream(
+            self,
+            debounce=float(config.get('device', 'scan_debounce', fallback=1.5)),
+            window=float(config.get('device', 'scan_window', fallback=2)),
+            lift_window=float(config.get('device', 'scan_lift_window', fallback=0.5)),
+            queue_size=int(config.get('device', 'scan_queue_size', fallback=16))
+        )
+        
+        # Local 1:N identification against the branch's enrolled templates
+        self.identifier = parent.identifier if parent else self.create_identifier()
+        
+        # Results queued on disk for the attendance backend, uploaded in batches
+        self.upload_spool = parent.upload_spool if parent else UploadSpool(
+            self,
+            Path(__file__).parent / config.get('upload', 'spool_file', fallback='upload_spool.db'),
+            url=config.get('upload', 'url', fallback=''),
+            token=config.get('upload', 'token', fallback=''),
+            event_types=[t.strip() for t in config.get('upload', 'events', fallback='identify,scan').split(',') if t.strip()],
+            batch_size=int(config.get('upload', 'batch_size', fallback=50)),
+            interval=float(config.get('upload', 'interval', fallback=5)),
+            backoff_max=float(config.get('upload', 'backoff_max', fallback=300)),
+            max_items=int(config.get('upload', 'max_items', fallback=100000))
+        )
+        
+        if not parent:
+            self.register_metrics()
+            self.configure_tracing()
     
-    def get_tailscale_ip(self) -> str:
-        """Get Tailscale IP address"""
-        try:
-            # Try tailscale command
-            result = subprocess.run(
-                ['tailscale', 'ip', '-4'], 
-                capture_output=True, 
-                text=True, 
-                timeout=10,
-                creationflags=subprocess.CREATE_NO_WINDOW if platform.system() == 'Windows' else 0
-            )
-            if result.returncode == 0 and result.stdout.strip():
-                ip = result.stdout.strip()
-                logger.info(f"Tailscale IP detected: {ip}")
-                return ip
-        except Exception as e:
-            logger.warning(f"Could not get Tailscale IP via command: {e}")
+    def register_metrics(self):
+        """Gauges read from the live pool and queue at scrape time"""
+        self.metrics.gauge(
+            'zk9500_devices_connected', 'Connected scanners',
+            function=lambda: sum(1 for device in self.pool.devices() if device.device_info['connected'])
+        )
+        self.metrics.gauge(
+            'zk9500_scans', 'Successful scans since start, all scanners',
+            function=lambda: sum(device.device_info['total_scans'] for device in self.pool.devices())
+        )
+        self.metrics.gauge(
+            'zk9500_capture_queue_depth', 'Capture requests waiting for a scanner',
+            function=lambda: self.scheduler.get_status()['depth']
+        )
+        self.metrics.gauge(
+            'zk9500_scan_subscribers', 'Clients subscribed to pushed scans',
+            function=lambda: self.scan_stream.get_status()['subscribers']
+        )
+    
+    def configure_tracing(self):
+        """Ring buffer size and optional OTLP file export from [tracing]"""
+        export_file = self.config.get('tracing', 'export_file', fallback='').strip()
+        tracer.configure(
+            enabled=self.config.getboolean('tracing', 'enabled', fallback=True),
+            buffer_size=int(self.config.get('tracing', 'buffer_size', fallback=2048)),
+            exporter=OTLPFileExporter(
+                Path(__file__).parent / export_file,
+                max_bytes=int(self.config.get('tracing', 'export_max_bytes', fallback=10 * 1024 * 1024))
+            ) if export_file else None
+        )
+    
+    def create_simulator(self) -> Optional[DeviceSimulator]:
+        """Simulated scanners from [simulator], or None when it is off"""
+        config = self.config
+        if not config.getboolean('simulator', 'enabled', fallback=False):
+            return None
         
-        # Fallback: try to detect from network interfaces
+        script = config.get('simulator', 'script', fallback='').strip()
+        simulator = DeviceSimulator(
+            transports=[t.strip() for t in config.get('simulator', 'transports', fallback='zkfinger_sdk').split(',') if t.strip()],
+            devices=int(config.get('simulator', 'devices', fallback=1)),
+            finger_delay=config.get('simulator', 'finger_delay', fallback='lognormal:0.8,0.4'),
+            response_delay=config.get('simulator', 'response_delay', fallback='fixed:0.005'),
+            quality=config.get('simulator', 'quality', fallback='uniform:55,95'),
+            template_size=config.get('simulator', 'template_size', fallback='512'),
+            failure_rate=float(config.get('simulator', 'failure_rate', fallback=0)),
+            timeout_rate=float(config.get('simulator', 'timeout_rate', fallback=0)),
+            garbage_rate=float(config.get('simulator', 'garbage_rate', fallback=0)),
+            disconnect_rate=float(config.get('simulator', 'disconnect_rate', fallback=0)),
+            replug_delay=config.get('simulator', 'replug_delay', fallback='fixed:2'),
+            baud_rate=int(config.get('simulator', 'baud_rate', fallback=115200)),
+            chunk_size=int(config.get('simulator', 'serial_chunk_size', fallback=64)),
+            chunk_gap=float(config.get('simulator', 'serial_chunk_gap', fallback=0.002)),
+            image_width=int(config.get('simulator', 'image_width', fallback=300)),
+            image_height=int(config.get('simulator', 'image_height', fallback=400)),
+            seed=config.get('simulator', 'seed', fallback='').strip() or None,
+            script=load_script(Path(__file__).parent / script) if script else None,
+            script_repeat=config.getboolean('simulator', 'script_repeat', fallback=False)
+        )
+        logger.warning(f"⚠️ Device simulator enabled ({', '.join(simulator.transports)}, "
+                       f"{config.get('simulator', 'devices', fallback=1)} per transport): no real scanner will be used")
+        return simulator
+    
+    @property
+    def device_id(self) -> Optional[str]:
+        """Stable ID of the scanner this controller holds (None before the first connect)"""
+        return device_id_for(self.connection_profile) if self.connection_profile else None
+    
+    def create_member(self) -> "ZK9500Controller":
+        """Controller for an extra scanner in this controller's pool"""
+        return ZK9500Controller(self.config, parent=self)
+    
+    def create_identifier(self) -> FingerprintIdentifier:
+        """Template index with the configured matcher (identification disabled if it cannot be created)"""
+        config = self.config
+        backend = config.get('matcher', 'backend', fallback='auto')
+        if backend == 'auto' and self.simulator:
+            # Simulated templates are synthetic bytes, which the bitwise matcher does score
+            backend = 'bitwise'
+        matcher, disabled_reason = None, ''
         try:
-            import socket
-            # Try to connect to a Tailscale IP range to get our Tailscale IP
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-                s.connect(("100.64.0.1", 80))  # Tailscale IP range
-                tailscale_ip = s.getsockname()[0]
-                if tailscale_ip.startswith("100."):
-                    logger.info(f"Tailscale IP detected from socket: {tailscale_ip}")
-                    return tailscale_ip
+            matcher = create_matcher(backend, self.zkfinger_sdk)
         except Exception as e:
-            logger.warning(f"Could not detect Tailscale IP from socket: {e}")
+            # Never fall back to bitwise matching: it runs, but real fingers never match
+            disabled_reason = f"matcher '{backend}' not available ({e})"
+            logger.error(f"❌ Local identification disabled: {disabled_reason}")
+        
+        # Enrolled templates persisted between syncs (empty = keep them in memory only)
+        store_file = config.get('matcher', 'store_file', fallback='templates.dat')
+        store = TemplateStore(Path(__file__).parent / store_file) if store_file else None
         
-        # Ultimate fallback
-        fallback_ip = socket.gethostbyname(socket.gethostname())
-        logger.warning(f"Using fallback IP: {fallback_ip}")
-        return fallback_ip
+        return FingerprintIdentifier(
+            self,
+            matcher,
+            threshold=int(config.get('matcher', 'threshold', fallback=70)),
+            templates_url=config.get('matcher', 'templates_url', fallback=''),
+            templates_file=config.get('matcher', 'templates_file', fallback=''),
+            branch_code=config.get('matcher', 'branch_code', fallback=''),
+            reload_interval=float(config.get('matcher', 'reload_interval', fallback=300)),
+            store=store,
+            disabled_reason=disabled_reason
+        )
+    
+    def get_tailscale_ip(self) -> str:
+        """Get Tailscale IP address (cached; refreshed in the background)"""
+        return self.ip_resolver.ip
+    
+    def set_client_ip(self, ip: str):
+        """Called by the resolver when the Tailscale IP changes"""
+        self.device_info['client_ip'] = ip
+        for member in self.pool.members.values():
+            member.device_info['client_ip'] = ip
     
     def find_zk9500_zkfinger_sdk(self) -> Optional[Dict]:
         """Find ZK9500 devices via ZKFinger SDK"""
@@ -336,164 +685,99 @@ class ZK9500Controller:
         
         return None
 
-    def find_zk9500_hid_device(self) -> Optional[Dict]:
-        """Find ZK9500 device via USB HID (fallback)"""
+    def list_zk9500_hid_devices(self) -> List[Dict]:
+        """List ZK9500 candidates on USB HID without opening them"""
         logger.info("Scanning for ZK9500 via USB HID...")
+        if self.simulator:
+            return self.simulator.hid_devices()
+        devices = []
         
         # Try hidapi first
         if HAS_HID:
             try:
-                # Common ZKTeco vendor IDs and product IDs
-                zkteco_devices = [
-                    (0x1b55, 0x0124),  # ZK9500 (ค่าจริงที่พบ)
-                    (0x1b55, 0x0010),  # ZKTeco ZK9500 variants
-                    (0x1b55, 0x0020),  # ZKTeco variants
-                    (0x2808, 0x0001),  # Alternative ZKTeco ID
-                    (0x1a86, 0x0001),  # Some ZK devices
-                ]
-                
-                for vendor_id, product_id in zkteco_devices:
-                    try:
-                        device = hid.device()
-                        device.open(vendor_id, product_id)
-                        
-                        # Test if we can get device info
-                        manufacturer = device.get_manufacturer_string()
-                        product = device.get_product_string()
-                        
-                        device_info = {
-                            'vendor_id': vendor_id,
-                            'product_id': product_id,
-                            'manufacturer': manufacturer or 'ZKTeco',
-                            'product': product or 'ZK9500',
+                for entry in hid.enumerate():
+                    if (entry['vendor_id'], entry['product_id']) in ZKTECO_HID_IDS:
+                        devices.append({
+                            'vendor_id': entry['vendor_id'],
+                            'product_id': entry['product_id'],
+                            'path': entry.get('path'),
+                            'manufacturer': entry.get('manufacturer_string') or 'ZKTeco',
+                            'product': entry.get('product_string') or 'ZK9500',
                             'type': 'hidapi'
-                        }
-                        
-                        logger.info(f"Found ZK9500 via HID: {manufacturer} {product}")
-                        return device_info
-                        
-                    except Exception as e:
-                        logger.debug(f"HID device {vendor_id:04x}:{product_id:04x} not found: {e}")
-                        continue
-                        
+                        })
             except Exception as e:
                 logger.debug(f"Error scanning HID devices: {e}")
         
         # Try pywinusb as fallback
-        if HAS_PYWINUSB:
+        if not devices and HAS_PYWINUSB:
             try:
-                devices = pywinusb_hid.HidDeviceFilter().get_devices()
-                if not devices:
-                    logger.debug("No pywinusb devices found")
-                    return None
-                
-                for device in devices:
-                    vendor_id = device.vendor_id
-                    product_id = device.product_id
-                    
+                for device in pywinusb_hid.HidDeviceFilter().get_devices():
                     # Check for ZKTeco devices
-                    if vendor_id in [0x1b55, 0x2808, 0x1a86]:
-                        try:
-                            device.open()
-                            
-                            device_info = {
-                                'vendor_id': vendor_id,
-                                'product_id': product_id,
-                                'manufacturer': 'ZKTeco',
-                                'product': 'ZK9500',
-                                'type': 'pywinusb',
-                                'device': device
-                            }
-                            
-                            logger.info(f"Found ZK9500 via pywinusb: {vendor_id:04x}:{product_id:04x}")
-                            return device_info
-                            
-                        except Exception as e:
-                            logger.debug(f"Cannot open pywinusb device: {e}")
-                            continue
-                            
+                    if device.vendor_id in ZKTECO_VENDOR_IDS:
+                        devices.append({
+                            'vendor_id': device.vendor_id,
+                            'product_id': device.product_id,
+                            'manufacturer': 'ZKTeco',
+                            'product': 'ZK9500',
+                            'type': 'pywinusb',
+                            'device': device
+                        })
             except Exception as e:
                 logger.debug(f"Error scanning pywinusb devices: {e}")
         
-        logger.warning("No ZK9500 HID device found")
-        return None
+        if not devices:
+            logger.info("No ZK9500 HID device found")
+        return devices
     
-    def connect_zkfinger_sdk(self, device_info: Dict) -> bool:
-        """Connect to ZK9500 via ZKFinger SDK"""
-        try:
-            # Open first device
-            self.device_handle = self.zkfinger_sdk.open_device(0)
-            
-            if self.device_handle:
-                self.connection_type = 'zkfinger_sdk'
-                self.device_info['connection_type'] = 'zkfinger_sdk'
-                self.device_info['model'] = 'ZK9500 (SDK)'
-                self.device_info['serial'] = f"ZK{int(time.time()) % 10000}"
-                self.device_info['firmware'] = 'SDK v10.0'
-                logger.info(f"[OK] Connected to ZK9500 via ZKFinger SDK (Handle: {self.device_handle})")
-                return True
+    def open_hid(self, device_info: Dict):
+        """Open a HID device described by list_zk9500_hid_devices()"""
+        if device_info['type'] == 'simulator':
+            return self.simulator.open_hid(device_info)
+        
+        if device_info['type'] == 'hidapi':
+            device = hid.device()
+            if device_info.get('path'):
+                device.open_path(device_info['path'])
             else:
-                logger.error("Failed to open ZK9500 device via ZKFinger SDK")
-                return False
-                
-        except Exception as e:
-            logger.error(f"ZKFinger SDK connection failed: {e}")
-            return False
+                device.open(device_info['vendor_id'], device_info['product_id'])
+            device.set_nonblocking(True)
+            return device
+        
+        device = device_info['device']
+        if not device.is_opened():
+            device.open()
+        return device
     
-    def connect_hid(self, device_info: Dict) -> bool:
-        """Connect to ZK9500 via USB HID"""
+    def close_hid(self, device):
+        """Close a HID device handle"""
         try:
-            if device_info['type'] == 'hidapi':
-                self.hid_device = hid.device()
-                self.hid_device.open(device_info['vendor_id'], device_info['product_id'])
-                self.hid_device.set_nonblocking(True)
-                
-            elif device_info['type'] == 'pywinusb':
-                self.hid_device = device_info['device']
-                if not self.hid_device.is_opened():
-                    self.hid_device.open()
-            
-            # Test HID communication
-            if self.test_hid_communication():
-                self.connection_type = 'usb_hid'
-                self.device_info['connection_type'] = 'usb_hid'
-                logger.info("✅ Connected to ZK9500 via USB HID")
-                return True
-            else:
-                self.disconnect_hid()
-                return False
-                
+            if hasattr(device, 'close'):
+                device.close()
         except Exception as e:
-            logger.error(f"HID connection failed: {e}")
-            self.disconnect_hid()
-            return False
+            logger.warning(f"Error disconnecting HID device: {e}")
     
     def disconnect_hid(self):
         """Disconnect from HID device"""
         if self.hid_device:
-            try:
-                if hasattr(self.hid_device, 'close'):
-                    self.hid_device.close()
-                self.hid_device = None
-                logger.info("Disconnected from ZK9500 HID device")
-            except Exception as e:
-                logger.warning(f"Error disconnecting HID device: {e}")
+            self.close_hid(self.hid_device)
+            self.hid_device = None
+            logger.info("Disconnected from ZK9500 HID device")
     
-    def test_hid_communication(self) -> bool:
+    def test_hid_communication(self, device=None) -> bool:
         """Test HID communication with ZK9500"""
+        device = device or self.hid_device
         try:
             # Send test command via HID
-            if self.connection_type == 'usb_hid' and self.hid_device:
+            if device:
                 # ZK9500 HID test command (this may need adjustment based on actual protocol)
                 test_cmd = [0x01, 0x00, 0x00, 0x00] + [0x00] * 60  # 64-byte packet
                 
-                if hasattr(self.hid_device, 'write'):
+                if hasattr(device, 'write'):
                     # hidapi style
-                    self.hid_device.write(test_cmd)
-                    time.sleep(0.1)
+                    device.write(test_cmd)
                     
-                    # Try to read response
-                    response = self.hid_device.read(64)
+                    # Wait up to 100 ms for the response report
+                    response = device.read(HID_REPORT_SIZE, 100)
                     if response:
                         logger.debug(f"HID test response: {len(response)} bytes")
                         return True
@@ -506,157 +790,341 @@ class ZK9500Controller:
             logger.debug(f"HID communication test failed: {e}")
             return False
     
-    def find_zk9500_port(self) -> Optional[str]:
-        """Find ZK9500 device port"""
+    def list_zk9500_ports(self) -> List[str]:
+        """List serial ports that may have a ZK9500 attached"""
         logger.info("Scanning for ZK9500 device...")
-        ports = serial.tools.list_ports.comports()
-        
-        # Check for known ZKTeco vendor IDs
-        zkteco_vids = [0x1b55, 0x2808, 0x1a86, 0x0403]  # Common ZKTeco vendor IDs
+        if self.simulator:
+            return self.simulator.serial_ports()
+        ports = []
         
-        for port in ports:
+        for port in serial.tools.list_ports.comports():
             logger.debug(f"Found port: {port.device} - {port.description} (VID: {port.vid}, PID: {port.pid})")
             
             # Check vendor ID
-            if port.vid in zkteco_vids:
+            if port.vid in ZKTECO_SERIAL_VIDS:
                 logger.info(f"Found ZKTeco device by VID on {port.device}")
-                return port.device
+                ports.append(port.device)
+                continue
             
             # Check description
             description_keywords = ['zk', 'fingerprint', 'biometric', 'zkteco']
-            if any(keyword in port.description.lower() for keyword in description_keywords):
+            if any(keyword in (port.description or '').lower() for keyword in description_keywords):
                 logger.info(f"Found fingerprint device by description on {port.device}")
-                return port.device
+                ports.append(port.device)
         
         # Try configured port if specified
         configured_port = self.config.get('device', 'com_port', fallback=None)
-        if configured_port:
+        if configured_port and configured_port not in ports:
+            ports.insert(0, configured_port)
+        
+        # Fallback: probe common Windows COM ports
+        if not ports and platform.system() == 'Windows':
+            ports = [f'COM{i}' for i in range(1, 21)]
+        
+        return ports
+    
+    def get_baud_rates(self) -> List[int]:
+        """Baud rates to try, configured rate first"""
+        baud_rates = [9600, 115200, 57600, 38400, 19200]
+        configured_baud = self.config.get('device', 'baud_rate', fallback=None)
+        if configured_baud:
+            baud_rates.insert(0, int(configured_baud))
+        # Drop duplicates, keep order
+        return list(dict.fromkeys(baud_rates))
+    
+    def probe_zkfinger_sdk(self, index: int, cancel: threading.Event) -> Optional[DeviceCandidate]:
+        """Discovery probe: open SDK device by index"""
+        sdk_info = self.find_zk9500_zkfinger_sdk()
+        if not sdk_info or index >= sdk_info['device_count'] or cancel.is_set():
+            return None
+        
+        handle = self.zkfinger_sdk.open_device(index)
+        if not handle:
+            logger.error("Failed to open ZK9500 device via ZKFinger SDK")
+            return None
+        
+        return DeviceCandidate(
+            'zkfinger_sdk',
+            {'connection_type': 'zkfinger_sdk', 'sdk_index': index},
+            close=lambda: self.zkfinger_sdk.close_device(handle),
+            handle=handle,
+            device_count=sdk_info['device_count']
+        )
+    
+    def probe_hid(self, device_info: Dict, cancel: threading.Event) -> Optional[DeviceCandidate]:
+        """Discovery probe: open and test one HID device"""
+        device = self.open_hid(device_info)
+        if cancel.is_set() or not self.test_hid_communication(device):
+            self.close_hid(device)
+            return None
+        
+        logger.info(f"Found ZK9500 via HID: {device_info['manufacturer']} {device_info['product']}")
+        return DeviceCandidate(
+            'usb_hid',
+            self.hid_profile(device_info),
+            close=lambda: self.close_hid(device),
+            device=device
+        )
+    
+    def hid_profile(self, device_info: Dict) -> Dict[str, Any]:
+        """Connection profile for a HID device from list_zk9500_hid_devices()"""
+        profile = {
+            'connection_type': 'usb_hid',
+            'vendor_id': device_info['vendor_id'],
+            'product_id': device_info['product_id']
+        }
+        path = device_info.get('path')
+        if path:
+            profile['path'] = path.decode('utf-8', 'replace') if isinstance(path, bytes) else str(path)
+        return profile
+    
+    def probe_serial(self, port_name: str, baud_rates: List[int], cancel: threading.Event) -> Optional[DeviceCandidate]:
+        """Discovery probe: walk baud rates on one serial port"""
+        for baud_rate in baud_rates:
+            if cancel.is_set():
+                return None
+            
+            port = None
+            reader = None
             try:
-                test_port = serial.Serial(configured_port, 9600, timeout=1)
-                test_port.close()
-                logger.info(f"Using configured port: {configured_port}")
-                return configured_port
+                logger.info(f"Trying {port_name} at {baud_rate} baud")
+                
+                port = self.simulator.open_serial(port_name, baud_rate, timeout=3) if self.simulator else serial.Serial(
+                    port=port_name,
+                    baudrate=baud_rate,
+                    bytesize=serial.EIGHTBITS,
+                    parity=serial.PARITY_NONE,
+                    stopbits=serial.STOPBITS_ONE,
+                    timeout=3,
+                    write_timeout=3
+                )
+                port.reset_input_buffer()
+                port.reset_output_buffer()
+                reader = SerialFrameReader(port)
+                reader.start()
+                
+                # Test communication
+                if self.test_communication(reader):
+                    logger.info(f"Found ZK9500 on {port_name} at {baud_rate} baud")
+                    return DeviceCandidate(
+                        'serial',
+                        {'connection_type': 'serial', 'port': port_name, 'baud_rate': baud_rate},
+                        close=lambda: (reader.stop(), port.close()),
+                        port=port,
+                        reader=reader
+                    )
+                    
             except Exception as e:
-                logger.warning(f"Configured port {configured_port} not available: {e}")
+                logger.debug(f"Failed at {baud_rate} baud: {e}")
+            
+            if reader:
+                reader.stop()
+            if port and port.is_open:
+                port.close()
         
-        # Fallback: test common Windows COM ports
-        for i in range(1, 21):
-            port_name = f'COM{i}'
-            try:
-                test_port = serial.Serial(port_name, 9600, timeout=1)
-                test_port.close()
-                logger.info(f"Found available port: {port_name}")
-                return port_name
-            except:
-                continue
+        return None
+    
+    def discovery_probes(self, exclude=()) -> List[Probe]:
+        """Build the concurrent probe list in priority order: SDK, HID, serial
         
+        Probes are named by device ID; IDs in exclude (scanners already held
+        by the device pool) are skipped.
+        """
+        sdk_index = 0
+        while device_id_for({'connection_type': 'zkfinger_sdk', 'sdk_index': sdk_index}) in exclude:
+            sdk_index += 1
+        probes: List[Probe] = [(
+            device_id_for({'connection_type': 'zkfinger_sdk', 'sdk_index': sdk_index}),
+            lambda cancel: self.probe_zkfinger_sdk(sdk_index, cancel),
+            self.probe_timeout
+        )]
+        
+        if HAS_HID or HAS_PYWINUSB or self.simulator:
+            probes.extend(self.hid_probes(exclude))
+        probes.extend(self.serial_probes(exclude))
+        return probes
+    
+    def hid_probes(self, exclude=()) -> List[Probe]:
+        """One probe per HID match not in exclude"""
+        probes: List[Probe] = []
+        for info in self.list_zk9500_hid_devices():
+            name = device_id_for(self.hid_profile(info))
+            if name not in exclude:
+                probes.append((name, lambda cancel, info=info: self.probe_hid(info, cancel), self.probe_timeout))
+        return probes
+    
+    def serial_probes(self, exclude=()) -> List[Probe]:
+        """One baud-walk probe per serial port not in exclude"""
+        probes: List[Probe] = []
+        baud_rates = self.get_baud_rates()
+        for port_name in self.list_zk9500_ports():
+            name = device_id_for({'connection_type': 'serial', 'port': port_name})
+            if name in exclude:
+                continue
+            # Each baud attempt is bounded by the 0.5s test, so allow the full walk
+            deadline = max(self.probe_timeout, 0.6 * len(baud_rates))
+            probes.append((
+                name,
+                lambda cancel, port_name=port_name: self.probe_serial(port_name, baud_rates, cancel),
+                deadline
+            ))
+        return probes
+    
+    def pool_probes(self, connection_type: str, exclude=()) -> List[Probe]:
+        """Probes for every scanner on one backend whose ID is not in exclude"""
+        if connection_type == 'zkfinger_sdk':
+            sdk_info = self.find_zk9500_zkfinger_sdk()
+            probes: List[Probe] = []
+            for index in range(sdk_info['device_count'] if sdk_info else 0):
+                name = device_id_for({'connection_type': 'zkfinger_sdk', 'sdk_index': index})
+                if name not in exclude:
+                    probes.append((name, lambda cancel, index=index: self.probe_zkfinger_sdk(index, cancel), self.probe_timeout))
+            return probes
+        elif connection_type == 'usb_hid':
+            return self.hid_probes(exclude)
+        elif connection_type == 'serial':
+            return self.serial_probes(exclude)
+        return []
+    
+    def probe_profile(self, profile: Dict[str, Any]) -> Optional[DeviceCandidate]:
+        """Re-open the transport described by a cached connection profile"""
+        cancel = threading.Event()
+        try:
+            connection_type = profile.get('connection_type')
+            if connection_type == 'zkfinger_sdk':
+                return self.probe_zkfinger_sdk(profile.get('sdk_index', 0), cancel)
+            elif connection_type == 'usb_hid' and (HAS_HID or self.simulator):
+                return self.probe_hid({
+                    'vendor_id': profile['vendor_id'],
+                    'product_id': profile['product_id'],
+                    'path': profile['path'].encode('utf-8') if profile.get('path') else None,
+                    'manufacturer': 'ZKTeco',
+                    'product': 'ZK9500',
+                    'type': 'simulator' if self.simulator else 'hidapi'
+                }, cancel)
+            elif connection_type == 'serial':
+                return self.probe_serial(profile['port'], [profile['baud_rate']], cancel)
+        except Exception as e:
+            logger.debug(f"Cached profile {profile} failed: {e}")
         return None
     
+    def apply_candidate(self, candidate: DeviceCandidate):
+        """Take ownership of the transport that won discovery"""
+        resources = candidate.resources
+        
+        if candidate.connection_type == 'zkfinger_sdk':
+            self.device_handle = resources['handle']
+            self.device_info['model'] = 'ZK9500 (SDK)'
+            self.device_info['serial'] = f"ZK{int(time.time()) % 10000}"
+            self.device_info['firmware'] = 'SDK v10.0'
+            self.device_info['device_count'] = resources['device_count']
+            logger.info(f"[OK] Connected to ZK9500 via ZKFinger SDK (Handle: {self.device_handle})")
+        elif candidate.connection_type == 'usb_hid':
+            self.hid_device = resources['device']
+            logger.info("✅ Connected to ZK9500 via USB HID")
+        elif candidate.connection_type == 'serial':
+            self.port = resources['port']
+            self.serial_reader = resources['reader']
+            profile = candidate.profile
+            logger.info(f"✅ Connected to ZK9500 on {profile['port']} at {profile['baud_rate']} baud")
+        
+        self.connection_type = candidate.connection_type
+        self.device_info['connection_type'] = candidate.connection_type
+        if candidate.connection_type == 'serial':
+            self.get_device_info()
+        self.device_info['connected'] = True
+        if candidate.profile != self.connection_profile:
+            self.connection_profile = candidate.profile
+            if self.profile_store:
+                self.profile_store.save(candidate.profile)
+        self.reconnect_attempts = 0  # Reset on successful connection
+        self.events.publish_threadsafe('device_connected', {
+            'device_id': self.device_id,
+            'connection_type': self.connection_type,
+            'serial': self.device_info['serial'],
+            'model': self.device_info['model']
+        })
+    
     def connect(self) -> bool:
-        """Connect to ZK9500 device with retry logic"""
-        if self.reconnect_attempts >= self.max_reconnect_attempts:
-            logger.error("Max reconnection attempts reached")
-            return False
+        """Connect to ZK9500 device
+        
+        reconnect_attempts counts consecutive failures; it drives the health
+        monitor's backoff and never blocks a later attempt.
+        """
+        if self.device_info['connected']:
+            return True
         
+        connect_started = time.perf_counter()
+        connected = False
         try:
-            # Try ZKFinger SDK first (highest priority)
-            zkfinger_device_info = self.find_zk9500_zkfinger_sdk()
-            if zkfinger_device_info:
-                if self.connect_zkfinger_sdk(zkfinger_device_info):
-                    self.device_info['connected'] = True
-                    self.device_info['device_count'] = zkfinger_device_info['device_count']
-                    self.reconnect_attempts = 0
-                    return True
-                else:
-                    logger.info("ZKFinger SDK connection failed, trying HID...")
-            else:
-                logger.info("No ZKFinger SDK devices found, trying HID...")
-            
-            # Try USB HID as fallback
-            if HAS_HID or HAS_PYWINUSB:
-                hid_device_info = self.find_zk9500_hid_device()
-                if hid_device_info:
-                    if self.connect_hid(hid_device_info):
-                        self.get_device_info()
-                        self.device_info['connected'] = True
-                        self.reconnect_attempts = 0
-                        return True
-                    else:
-                        logger.info("HID connection failed, trying serial...")
-                else:
-                    logger.info("No HID device found, trying serial...")
-            
-            # Fallback to serial connection
-            port_name = self.find_zk9500_port()
-            if not port_name:
-                logger.error("No ZK9500 device found via ZKFinger SDK, serial or HID")
-                self.reconnect_attempts += 1
-                return False
-            
-            # Try different baud rates
-            baud_rates = [9600, 115200, 57600, 38400, 19200]
-            configured_baud = self.config.get('device', 'baud_rate', fallback=None)
-            if configured_baud:
-                baud_rates.insert(0, int(configured_baud))
-            
-            for baud_rate in baud_rates:
-                try:
-                    logger.info(f"Trying {port_name} at {baud_rate} baud")
-                    
-                    self.port = serial.Serial(
-                        port=port_name,
-                        baudrate=baud_rate,
-                        bytesize=serial.EIGHTBITS,
-                        parity=serial.PARITY_NONE,
-                        stopbits=serial.STOPBITS_ONE,
-                        timeout=3,
-                        write_timeout=3
-                    )
-                    
-                    # Test communication
-                    if self.test_communication():
-                        logger.info(f"✅ Connected to ZK9500 on {port_name} at {baud_rate} baud")
-                        self.get_device_info()
-                        self.device_info['connected'] = True
-                        self.device_info['connection_type'] = 'serial'
-                        self.connection_type = 'serial'
-                        self.reconnect_attempts = 0  # Reset on successful connection
-                        return True
+            with self.discovery_lock:
+                candidate = None
+                held = set(self.pool.members)  # Scanners the pool already owns
+                
+                # Last winning backend/port/baud goes first, skipping full discovery
+                if self.connection_profile and self.device_id not in held:
+                    started = time.monotonic()
+                    with self.metrics.discovery_seconds.time(kind='profile'):
+                        candidate = self.probe_profile(self.connection_profile)
+                    if candidate:
+                        logger.info(f"Reconnected with last-known-good profile in {(time.monotonic() - started) * 1000:.0f} ms")
                     else:
-                        self.port.close()
-                        
-                except Exception as e:
-                    if self.port and self.port.is_open:
-                        self.port.close()
-                    logger.debug(f"Failed at {baud_rate} baud: {e}")
-                    continue
-            
-            logger.error("Failed to establish communication with ZK9500")
-            self.reconnect_attempts += 1
-            return False
+                        logger.info("Last-known-good profile failed, running full discovery...")
+                
+                if not candidate:
+                    with self.metrics.discovery_seconds.time(kind='full'):
+                        candidate = self.discovery.run(self.discovery_probes(held))
+                
+                if not candidate:
+                    logger.error("No ZK9500 device found via ZKFinger SDK, serial or HID")
+                    self.metrics.errors.inc(reason='device_not_found')
+                    self.reconnect_attempts += 1
+                    return False
+                
+                self.apply_candidate(candidate)
+                connected = True
+                return True
             
         except Exception as e:
             logger.error(f"Connection error: {e}")
+            self.metrics.errors.inc(reason='connect_exception')
             self.reconnect_attempts += 1
             return False
+        finally:
+            self.metrics.connect_seconds.observe(
+                time.perf_counter() - connect_started, outcome='success' if connected else 'failure'
+            )
+    
+    def start_serial_reader(self):
+        """Start the event-driven reader thread on self.port"""
+        self.stop_serial_reader()
+        self.port.reset_input_buffer()
+        self.port.reset_output_buffer()
+        self.serial_reader = SerialFrameReader(self.port)
+        self.serial_reader.start()
     
-    def test_communication(self) -> bool:
+    def stop_serial_reader(self):
+        """Stop the serial reader thread (port stays open)"""
+        if self.serial_reader:
+            self.serial_reader.stop()
+            self.serial_reader = None
+    
+    def test_communication(self, reader: Optional[SerialFrameReader] = None) -> bool:
         """Test communication with device"""
+        reader = reader or self.serial_reader
         try:
-            # Clear buffers
-            self.port.reset_input_buffer()
-            self.port.reset_output_buffer()
+            reader.reset()
             
             # Send test command
             test_cmd = bytes([0x01, 0x00, 0x00, 0x00])
-            self.port.write(test_cmd)
-            self.port.flush()
+            reader.write(test_cmd)
             
-            # Wait for response
-            time.sleep(0.5)
-            if self.port.in_waiting > 0:
-                response = self.port.read(self.port.in_waiting)
-                logger.debug(f"Device test response: {len(response)} bytes")
+            # Returns as soon as the reply frame is complete, so no stale bytes
+            # are left behind for the next command; any reply within 0.5s counts
+            frame = reader.wait_for_frame(0.5)
+            received = len(frame) if frame else reader.wait_for_data(0)
+            if received > 0:
+                logger.debug(f"Device test response: {received} bytes")
                 return True
             
             return False
@@ -665,8 +1133,37 @@ class ZK9500Controller:
             logger.debug(f"Communication test failed: {e}")
             return False
     
-    def disconnect(self):
+    def check_presence(self) -> bool:
+        """Cheap check that the open transport still has a device behind it"""
+        try:
+            if self.connection_type == 'serial':
+                return bool(self.serial_reader and self.serial_reader.alive and self.port and self.port.is_open)
+            
+            elif self.connection_type == 'usb_hid':
+                if not self.hid_device:
+                    return False
+                if hasattr(self.hid_device, 'is_plugged'):
+                    # pywinusb and the simulator
+                    return self.hid_device.is_plugged()
+                profile = self.connection_profile or {}
+                entries = hid.enumerate(profile.get('vendor_id', 0), profile.get('product_id', 0))
+                if profile.get('path'):
+                    # Several identical scanners: this one must still be there
+                    return any(self.hid_profile(entry).get('path') == profile['path'] for entry in entries)
+                return bool(entries)
+            
+            elif self.connection_type == 'zkfinger_sdk':
+                sdk_index = (self.connection_profile or {}).get('sdk_index', 0)
+                return bool(self.device_handle) and self.zkfinger_sdk.get_device_count() > sdk_index
+            
+        except Exception as e:
+            logger.debug(f"Presence check failed: {e}")
+        return False
+    
+    def disconnect(self, reason: str = 'requested'):
         """Disconnect from ZK9500 device"""
+        was_connected = self.device_info['connected']
+        
         # Disconnect ZKFinger SDK connection
         if self.device_handle and self.connection_type == 'zkfinger_sdk':
             try:
@@ -677,6 +1174,7 @@ class ZK9500Controller:
                 logger.warning(f"Error during ZKFinger SDK disconnect: {e}")
         
         # Disconnect serial connection
+        self.stop_serial_reader()
         if self.port and self.port.is_open:
             try:
                 self.port.close()
@@ -691,18 +1189,25 @@ class ZK9500Controller:
         self.device_info['connected'] = False
         self.device_info['connection_type'] = None
         self.connection_type = None
+        if was_connected:
+            self.events.publish_threadsafe('device_disconnected', {
+                'device_id': self.device_id,
+                'reason': reason
+            })
     
     def get_device_info(self):
         """Get device information"""
         try:
+            if not self.serial_reader:
+                return
+            
             # Send device info command
+            self.serial_reader.reset()
             info_cmd = bytes([0x01, 0x00, 0x00, 0x00])
-            self.port.write(info_cmd)
-            self.port.flush()
+            self.serial_reader.write(info_cmd)
             
-            time.sleep(0.5)
-            if self.port.in_waiting > 0:
-                response = self.port.read(self.port.in_waiting)
+            response = self.serial_reader.wait_for_frame(0.5)
+            if response:
                 if len(response) >= 8:
                     try:
                         serial_num = int.from_bytes(response[4:8], 'little', signed=False)
@@ -718,107 +1223,198 @@ class ZK9500Controller:
         except Exception as e:
             logger.warning(f"Could not get device info: {e}")
     
-    def capture_fingerprint(self) -> Dict[str, Any]:
-        """Capture fingerprint from ZK9500"""
+    @tracer.traced('device.capture')
+    def capture_fingerprint(self, timeout: Optional[float] = None, mode: str = 'template') -> Dict[str, Any]:
+        """Capture fingerprint from ZK9500
+        
+        mode selects what is read back: 'template', 'image' or 'both'.
+        The raw image is only transferred and copied when asked for; the one
+        exception is [device] score_template_captures, which has the SDK read
+        it (without returning it) to score template-only captures.
+        """
+        if mode not in CAPTURE_MODES:
+            return {
+                'success': False,
+                'reason': 'invalid_mode',
+                'message': f"Invalid capture mode: {mode} (expected one of {', '.join(CAPTURE_MODES)})"
+            }
+        
         try:
             # Check connection
             if not self.device_info['connected']:
+                # The health monitor (or the pool, for extra scanners) owns
+                # reconnection; don't run discovery inline
+                if self.parent or self.health_monitor.running:
+                    self.health_monitor.nudge()
+                    return {
+                        'success': False,
+                        'reason': 'not_connected',
+                        'message': 'Device not connected, reconnecting in the background'
+                    }
+                
                 # Try to reconnect
-                if not self.connect():
+                with tracer.span('device.reconnect'):
+                    connected = self.connect()
+                if not connected:
                     return {
                         'success': False,
+                        'reason': 'not_connected',
                         'message': 'Device not connected and reconnection failed'
                     }
             
-            logger.info(f"Starting fingerprint capture via {self.connection_type}...")
+            # Debug only: armed scan streams start a capture every few seconds
+            logger.debug(f"Starting fingerprint capture via {self.connection_type} (mode: {mode})...")
+            tracer.annotate(device_id=self.device_id, connection_type=self.connection_type, mode=mode)
             
-            if self.connection_type == 'usb_hid':
-                return self.capture_fingerprint_hid()
-            elif self.connection_type == 'serial':
-                return self.capture_fingerprint_serial()
-            elif self.connection_type == 'zkfinger_sdk':
-                return self.capture_fingerprint_zkfinger_sdk()
-            else:
+            if mode == 'image' and self.connection_type != 'zkfinger_sdk':
                 return {
                     'success': False,
-                    'message': 'Unknown connection type'
+                    'reason': 'unsupported_mode',
+                    'message': f'Image capture is not supported via {self.connection_type}'
                 }
+            
+            scan_timeout = float(self.config.get('device', 'scan_timeout', fallback=15))
+            deadline = time.monotonic() + (min(timeout, scan_timeout) if timeout else scan_timeout)
+            best = None
+            for attempt in range(1, self.quality_attempts + 1):
+                started = time.perf_counter()
+                result = self.capture_once(max(deadline - time.monotonic(), 0.1), mode)
+                self.health_monitor.record_capture(result)
+                self.metrics.capture_seconds.observe(
+                    time.perf_counter() - started,
+                    connection_type=self.connection_type or 'none',
+                    outcome='success' if result.get('success') else result.get('reason', 'failure')
+                )
+                tracer.annotate(quality=result.get('quality'), attempts=attempt)
+                # Only a score computed here from the image gates a capture; the single
+                # quality byte serial and HID devices report is passed through untrusted
+                if (not result.get('success') or self.min_quality <= 0
+                        or self.connection_type != 'zkfinger_sdk' or result.get('quality') is None):
+                    return result
+                
+                result['qualityAttempts'] = attempt
+                if result['quality'] >= self.min_quality:
+                    return result
+                if best is None or result['quality'] > best['quality']:
+                    best = result
+                if time.monotonic() >= deadline:
+                    break
+                logger.warning(f"⚠️ Low quality capture ({result['quality']} < {self.min_quality}), "
+                               f"rescanning ({attempt}/{self.quality_attempts})")
+            
+            # Rejected here instead of after a backend round trip
+            return {
+                'success': False,
+                'reason': 'low_quality',
+                'message': f"Fingerprint quality too low ({best['quality']} < {self.min_quality}), please place the finger again",
+                'lowQuality': True,
+                'quality': best['quality'],
+                'qualityAttempts': attempt,
+                'deviceId': self.device_id
+            }
                 
         except Exception as e:
             logger.error(f"Fingerprint capture error: {e}")
-            # Try to reconnect on error
-            self.disconnect()
+            # The health monitor reconnects after an error
+            self.disconnect(f'capture error: {e}')
             return {
                 'success': False,
+                'reason': 'capture_exception',
                 'message': f'Capture error: {str(e)}'
             }
     
-    def capture_fingerprint_serial(self) -> Dict[str, Any]:
+    def capture_once(self, timeout: float, mode: str = 'template') -> Dict[str, Any]:
+        """One scan on the connected backend"""
+        if self.connection_type == 'usb_hid':
+            return self.capture_fingerprint_hid(timeout)
+        elif self.connection_type == 'serial':
+            return self.capture_fingerprint_serial(timeout)
+        elif self.connection_type == 'zkfinger_sdk':
+            return self.capture_fingerprint_zkfinger_sdk(timeout, mode)
+        else:
+            return {
+                'success': False,
+                'reason': 'unknown_connection',
+                'message': 'Unknown connection type'
+            }
+    
+    async def connect_async(self) -> bool:
+        """Connect on the device worker thread"""
+        return await self.worker.run(self.connect)
+    
+    async def disconnect_async(self, reason: str = 'requested'):
+        """Disconnect on the device worker thread"""
+        return await self.worker.run(self.disconnect, reason)
+    
+    async def get_device_info_async(self):
+        """Query device information on the device worker thread"""
+        return await self.worker.run(self.get_device_info)
+    
+    async def capture_fingerprint_async(self, **kwargs) -> Dict[str, Any]:
+        """Capture fingerprint on the device worker thread
+        
+        Front-ends should go through self.scheduler.capture() instead so
+        requests are queued, coalesced and bounded by their deadline.
+        """
+        return await self.worker.run(self.capture_fingerprint, **kwargs)
+    
+    @tracer.traced('device.scan.serial')
+    def capture_fingerprint_serial(self, timeout: Optional[float] = None) -> Dict[str, Any]:
         """Capture fingerprint via Serial connection"""
         try:
-            # Clear input buffer
-            self.port.reset_input_buffer()
+            if not self.serial_reader or not self.serial_reader.alive:
+                # Reader thread exits when the port goes away (e.g. USB unplug)
+                self.disconnect('serial connection lost')
+                return {
+                    'success': False,
+                    'reason': 'device_lost',
+                    'message': 'Serial connection lost'
+                }
+            
+            # Drop stale input before the new command
+            self.serial_reader.reset()
             
             # Send capture command
             capture_cmd = bytes([0x02, 0x01, 0x00, 0x00])
-            self.port.write(capture_cmd)
-            self.port.flush()
+            self.serial_reader.write(capture_cmd)
             
-            # Wait for response
-            timeout = float(self.config.get('device', 'scan_timeout', fallback=15))
-            start_time = time.time()
-            response_data = b''
+            # Wait for one complete response frame
+            scan_timeout = float(self.config.get('device', 'scan_timeout', fallback=15))
+            timeout = min(timeout, scan_timeout) if timeout else scan_timeout
+            with tracer.span('serial.wait_frame'):
+                response_data = self.serial_reader.wait_for_frame(timeout)
             
-            while time.time() - start_time < timeout:
-                if self.port.in_waiting > 0:
-                    chunk = self.port.read(self.port.in_waiting)
-                    response_data += chunk
-                    
-                    # Check for sufficient data
-                    if len(response_data) >= 8:
-                        break
-                
-                time.sleep(0.1)
-            
-            if len(response_data) < 4:
+            if not response_data:
                 return {
                     'success': False,
+                    'reason': 'timeout',
                     'message': 'No response from device (timeout)'
                 }
             
             # Parse response
-            status = response_data[0] if len(response_data) > 0 else 1
-            quality = response_data[1] if len(response_data) > 1 else 0
+            status, quality, template = split_frame(response_data)
+            
+            if status == 0 and not template:
+                return {
+                    'success': False,
+                    'reason': 'device_status',
+                    'message': 'Device reported success without a template'
+                }
             
             if status == 0:  # Success
-                template_data = list(response_data[4:]) if len(response_data) > 4 else []
-                
                 # Update statistics
                 self.device_info['last_scan_time'] = time.time()
                 self.device_info['total_scans'] += 1
                 
-                result = {
-                    'success': True,
-                    'templateData': template_data,
-                    'quality': min(quality, 100),
-                    'deviceSerial': self.device_info['serial'],
-                    'firmware': self.device_info['firmware'],
-                    'resolution': self.device_info['resolution'],
-                    'imageSize': f"{len(template_data)} bytes",
-                    'captureTime': self.device_info['last_scan_time'],
-                    'scanCount': self.device_info['total_scans'],
-                    'connectionType': 'serial',
-                    'clientInfo': {
-                        'hostname': self.device_info['client_hostname'],
-                        'tailscale_ip': self.device_info['client_ip']
-                    }
-                }
+                # The template stays a view over the frame it arrived in, no copy
+                result = CaptureResult(self.device_info, template, min(quality, 100), 'serial')
                 
-                logger.info(f"✅ Fingerprint captured via Serial: Quality {quality}%, Size {len(template_data)} bytes")
+                logger.info(f"✅ Fingerprint captured via Serial: Quality {quality}%, Size {len(template)} bytes")
                 return result
             else:
                 return {
                     'success': False,
+                    'reason': 'device_status',
                     'message': f'Capture failed (Status: {status})'
                 }
                 
@@ -826,90 +1422,92 @@ class ZK9500Controller:
             logger.error(f"Serial fingerprint capture error: {e}")
             return {
                 'success': False,
+                'reason': 'capture_exception',
                 'message': f'Serial capture error: {str(e)}'
             }
     
-    def capture_fingerprint_hid(self) -> Dict[str, Any]:
+    @tracer.traced('device.scan.hid')
+    def capture_fingerprint_hid(self, timeout: Optional[float] = None) -> Dict[str, Any]:
         """Capture fingerprint via USB HID connection"""
         try:
             if not self.hid_device:
                 return {
                     'success': False,
+                    'reason': 'not_connected',
                     'message': 'HID device not connected'
                 }
             
             # Send capture command via HID
             capture_cmd = [0x02, 0x01, 0x00, 0x00] + [0x00] * 60  # 64-byte packet
             
-            if hasattr(self.hid_device, 'write'):
-                self.hid_device.write(capture_cmd)
-            else:
+            if not hasattr(self.hid_device, 'write'):
                 return {
                     'success': False,
+                    'reason': 'unsupported_device',
                     'message': 'HID device does not support write operation'
                 }
+            try:
+                written = self.hid_device.write(capture_cmd)
+            except (OSError, ValueError) as e:
+                return self.hid_device_lost(e)
+            if isinstance(written, int) and written < 0:
+                return self.hid_device_lost('write failed')
             
             # Wait for response
-            timeout = float(self.config.get('device', 'scan_timeout', fallback=15))
+            scan_timeout = float(self.config.get('device', 'scan_timeout', fallback=15))
+            timeout = min(timeout, scan_timeout) if timeout else scan_timeout
             start_time = time.time()
-            response_data = []
+            decoder = FrameDecoder()
+            response_data = None
             
-            while time.time() - start_time < timeout:
+            while response_data is None and time.time() - start_time < timeout:
                 try:
                     if hasattr(self.hid_device, 'read'):
-                        chunk = self.hid_device.read(64)
-                        if chunk:
-                            response_data.extend(chunk)
-                            
-                            # Check for sufficient data
-                            if len(response_data) >= 8:
-                                break
-                    
-                    time.sleep(0.1)
+                        # Blocks until the next report (or 100 ms), no fixed sleep
+                        report = self.hid_device.read(HID_REPORT_SIZE, 100)
+                        if report:
+                            # Reports span multi-packet templates; padding ends each frame
+                            frames = decoder.feed(bytes(report), padded=True)
+                            if frames:
+                                response_data = frames[0]
+                    else:
+                        time.sleep(0.1)
                     
-                except Exception as e:
-                    logger.debug(f"HID read error: {e}")
-                    break
+                except (OSError, ValueError) as e:
+                    # hidapi raises once the device handle is gone (e.g. USB unplug)
+                    return self.hid_device_lost(e)
             
-            if len(response_data) < 4:
+            if response_data is None:
                 return {
                     'success': False,
+                    'reason': 'timeout',
                     'message': 'No response from HID device (timeout)'
                 }
             
             # Parse response
-            status = response_data[0] if len(response_data) > 0 else 1
-            quality = response_data[1] if len(response_data) > 1 else 0
+            status, quality, template = split_frame(response_data)
+            
+            if status == 0 and not template:
+                return {
+                    'success': False,
+                    'reason': 'device_status',
+                    'message': 'Device reported success without a template'
+                }
             
             if status == 0:  # Success
-                template_data = response_data[4:] if len(response_data) > 4 else []
-                
                 # Update statistics
                 self.device_info['last_scan_time'] = time.time()
                 self.device_info['total_scans'] += 1
                 
-                result = {
-                    'success': True,
-                    'templateData': template_data,
-                    'quality': min(quality, 100),
-                    'deviceSerial': self.device_info['serial'],
-                    'firmware': self.device_info['firmware'],
-                    'resolution': self.device_info['resolution'],
-                    'imageSize': f"{len(template_data)} bytes",
-                    'captureTime': self.device_info['last_scan_time'],
-                    'scanCount': self.device_info['total_scans'],
-                    'connectionType': 'usb_hid',
-                    'clientInfo': {
-                        'hostname': self.device_info['client_hostname'],
-                        'tailscale_ip': self.device_info['client_ip']
-                    }
-                }
+                # The template stays a view over the frame it arrived in, no copy
+                result = CaptureResult(self.device_info, template, min(quality, 100), 'usb_hid')
                 
-                logger.info(f"✅ Fingerprint captured via USB HID: Quality {quality}%, Size {len(template_data)} bytes")
+                logger.info(f"✅ Fingerprint captured via USB HID: Quality {quality}%, Size {len(template)} bytes")
                 return result
             else:
                 return {
                     'success': False,
+                    'reason': 'device_status',
                     'message': f'HID capture failed (Status: {status})'
                 }
                 
@@ -917,55 +1515,93 @@ class ZK9500Controller:
             logger.error(f"HID fingerprint capture error: {e}")
             return {
                 'success': False,
+                'reason': 'capture_exception',
                 'message': f'HID capture error: {str(e)}'
             }
     
-    def capture_fingerprint_zkfinger_sdk(self) -> Dict[str, Any]:
-        """Capture fingerprint via ZKFinger SDK"""
+    def hid_device_lost(self, error) -> Dict[str, Any]:
+        """Drop a HID connection whose I/O failed so the device is reconnected"""
+        logger.warning(f"⚠️ HID connection lost: {error}")
+        self.disconnect('HID connection lost')
+        return {
+            'success': False,
+            'reason': 'device_lost',
+            'message': 'HID connection lost'
+        }
+    
+    @tracer.traced('device.scan.sdk')
+    def capture_fingerprint_zkfinger_sdk(self, timeout: float, mode: str = 'template') -> Dict[str, Any]:
+        """Capture fingerprint via ZKFinger SDK, polling until a finger is placed or the timeout"""
         try:
             if not self.device_handle:
                 return {
                     'success': False,
+                    'reason': 'not_connected',
                     'message': 'Device handle not initialized'
                 }
             
-            # Capture fingerprint
-            image_data, template_data = self.zkfinger_sdk.capture_fingerprint(self.device_handle)
+            # Capture fingerprint; the image is also read to score quality when configured
+            include_image = mode in ('image', 'both')
+            read_image = include_image or (self.score_template_captures and HAS_QUALITY_SCORING)
+            deadline = time.monotonic() + timeout
+            # One span for the whole finger wait, not one per poll
+            with tracer.span('sdk.acquire') as span:
+                polls = 0
+                while True:
+                    polls += 1
+                    image_data, template_data = self.zkfinger_sdk.capture_fingerprint(
+                        self.device_handle,
+                        include_image=read_image
+                    )
+                    status = self.zkfinger_sdk.last_status.get(self.device_handle)
+                    if template_data or status != ZKFP_ERR_CAPTURE or time.monotonic() >= deadline:
+                        break
+                    time.sleep(SDK_POLL_INTERVAL)
+                span.set(polls=polls, status=status)
             
-            if image_data and template_data:
+            if template_data:
+                buffers = self.zkfinger_sdk.buffers[self.device_handle]
+                with tracer.span('quality.score'):
+                    quality = image_quality(image_data, buffers.width, buffers.height) if image_data is not None else None
+                
                 # Update statistics
                 self.device_info['last_scan_time'] = time.time()
                 self.device_info['total_scans'] += 1
                 
-                result = {
-                    'success': True,
-                    'templateData': template_data,
-                    'quality': 100,  # Assuming full quality for SDK capture
-                    'deviceSerial': self.device_info['serial'],
-                    'firmware': self.device_info['firmware'],
-                    'resolution': self.device_info['resolution'],
-                    'imageSize': f"{len(template_data)} bytes",
-                    'captureTime': self.device_info['last_scan_time'],
-                    'scanCount': self.device_info['total_scans'],
-                    'connectionType': 'zkfinger_sdk',
-                    'clientInfo': {
-                        'hostname': self.device_info['client_hostname'],
-                        'tailscale_ip': self.device_info['client_ip']
-                    }
-                }
+                result = CaptureResult(
+                    self.device_info,
+                    None if mode == 'image' else template_data,
+                    quality,  # None (left out of the result) without NumPy
+                    'zkfinger_sdk',
+                    capture_mode=mode
+                )
                 
-                logger.info(f"✅ Fingerprint captured via ZKFinger SDK: Size {len(template_data)} bytes")
+                if include_image and image_data is not None:
+                    # Copy out of the pooled SDK buffer before it leaves the worker thread
+                    result.image = bytes(image_data)
+                    result.image_width = buffers.width
+                    result.image_height = buffers.height
+                
+                logger.info(f"✅ Fingerprint captured via ZKFinger SDK: Quality {result.get('quality', 'n/a')}, Size {len(template_data)} bytes")
                 return result
+            elif status == ZKFP_ERR_CAPTURE:
+                return {
+                    'success': False,
+                    'reason': 'no_finger',
+                    'message': 'No finger placed on the scanner (timeout)'
+                }
             else:
                 return {
                     'success': False,
-                    'message': 'Failed to capture fingerprint'
+                    'reason': 'sdk_capture_failed',
+                    'message': f'Failed to capture fingerprint (SDK error {status})'
                 }
                 
         except Exception as e:
             logger.error(f"ZKFinger SDK fingerprint capture error: {e}")
             return {
                 'success': False,
+                'reason': 'capture_exception',
                 'message': f'SDK capture error: {str(e)}'
             }
 
@@ -977,12 +1613,23 @@ class ZK9500WebSocketServer:
         self.zkt_controller = ZK9500Controller(config)
         self.server = None
         self.clients = set()
+        self.client_formats = {}  # websocket -> template format
+        self.send_locks = {}  # websocket -> lock keeping header + binary frame adjacent
+        self.event_subscriptions = {}  # (websocket, 'events' | 'scans') -> (Subscription, forwarding task)
         self.is_running = False
+        self.metrics = self.zkt_controller.metrics
+        self.metrics.gauge('zk9500_ws_clients', 'Connected WebSocket clients', function=lambda: len(self.clients))
     
     async def handle_client(self, websocket, path):
         """Handle WebSocket client connections"""
         client_address = websocket.remote_address
         self.clients.add(websocket)
+        self.client_formats[websocket] = {
+            BINARY_SUBPROTOCOL: 'binary',
+            MSGPACK_SUBPROTOCOL: 'msgpack'
+        }.get(websocket.subprotocol, 'json')
+        self.send_locks[websocket] = asyncio.Lock()
+        capture_tasks = set()
         logger.info(f"Client connected: {client_address} (Total: {len(self.clients)})")
         
         try:
@@ -994,7 +1641,9 @@ class ZK9500WebSocketServer:
                     'hostname': socket.gethostname(),
                     'tailscale_ip': self.zkt_controller.device_info['client_ip'],
                     'service_version': '1.0.0',
-                    'device_connected': self.zkt_controller.device_info['connected']
+                    'device_connected': self.zkt_controller.device_info['connected'],
+                    'template_formats': list(TEMPLATE_FORMATS),
+                    'template_format': self.client_formats[websocket]
                 }
             }
             await websocket.send(json.dumps(welcome_msg))
@@ -1002,10 +1651,19 @@ class ZK9500WebSocketServer:
             async for message in websocket:
                 try:
                     data = json.loads(message)
-                    response = await self.handle_command(data)
-                    await websocket.send(json.dumps(response))
+                    
+                    if data.get('command') in ('capture_fingerprint', 'identify'):
+                        # Captures can take seconds; answer from a task so this
+                        # client can still send status or cancel_capture meanwhile
+                        task = asyncio.create_task(self.respond_to_command(websocket, data))
+                        capture_tasks.add(task)
+                        task.add_done_callback(capture_tasks.discard)
+                        continue
+                    
+                    await self.respond_to_command(websocket, data)
                     
                 except json.JSONDecodeError:
+                    self.metrics.errors.inc(reason='ws_invalid_json')
                     error_response = {
                         'success': False,
                         'message': 'Invalid JSON format'
@@ -1014,6 +1672,7 @@ class ZK9500WebSocketServer:
                     
                 except Exception as e:
                     logger.error(f"Error handling message: {e}")
+                    self.metrics.errors.inc(reason='ws_server_error')
                     error_response = {
                         'success': False,
                         'message': f'Server error: {str(e)}'
@@ -1026,8 +1685,157 @@ class ZK9500WebSocketServer:
             logger.error(f"WebSocket error: {e}")
         finally:
             self.clients.discard(websocket)
+            self.client_formats.pop(websocket, None)
+            self.stop_forwarding(websocket, 'events')
+            self.stop_forwarding(websocket, 'scans')
+            self.send_locks.pop(websocket, None)
+            # Queued captures nobody will read are dropped by the scheduler
+            for task in capture_tasks:
+                task.cancel()
+    
+    async def respond_to_command(self, websocket, data):
+        """Handle one command and send its response, timed per command"""
+        command = data.get('command')
+        started = time.perf_counter()
+        span = tracer.span('ws.command', kind='server', command=command if command in WS_COMMANDS else 'unknown')
+        try:
+            with span:
+                with tracer.span('ws.handle'):
+                    response = await self.handle_command(data, websocket)
+                await self.send_response(websocket, response)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        except Exception as e:
+            logger.error(f"Error handling message: {e}")
+            self.metrics.errors.inc(reason='ws_server_error')
+            try:
+                await websocket.send(json.dumps({
+                    'success': False,
+                    'message': f'Server error: {str(e)}'
+                }))
+            except websockets.exceptions.ConnectionClosed:
+                pass
+        finally:
+            self.metrics.ws_message_seconds.observe(
+                time.perf_counter() - started, command=command if command in WS_COMMANDS else 'unknown'
+            )
+    
+    @staticmethod
+    def encode_response(response: Dict[str, Any], template_format: str = 'json') -> list:
+        """Encode a response into the WebSocket messages to send
+        
+        'json'   - one text message, templateData as a list of ints (legacy)
+        'binary' - a JSON header with templateFormat/templateLength, then one
+                   binary message carrying the raw template bytes
+        'msgpack' - one binary msgpack message, template and image as bin fields
+        """
+        if isinstance(response, ResultMessage):
+            # Capture results encode themselves, once per format for all clients
+            return response.encode(template_format)
+        if template_format == 'msgpack':
+            return [pack_msgpack(response)]
+        
+        template = response.get('templateData')
+        if not isinstance(template, (bytes, bytearray, memoryview)):
+            return [json.dumps(response)]
+        
+        if template_format == 'binary':
+            header = dict(response)
+            del header['templateData']
+            header['templateFormat'] = 'binary'
+            header['templateLength'] = len(template)
+            return [json.dumps(header), bytes(template)]
+        
+        return [json.dumps({**response, 'templateData': list(template)})]
+    
+    @staticmethod
+    def encode_image(response: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace raw image bytes (only present when mode asked for them) with base64"""
+        image_data = response.pop('fingerprint_data', None)
+        if image_data is not None:
+            response['fingerprint_data_base64'] = base64.b64encode(image_data).decode('utf-8')
+            response['fingerprint_data_length'] = len(image_data)
+        return response
+    
+    async def send_response(self, websocket, response: Dict[str, Any]):
+        """Send a response using the client's negotiated template format"""
+        template_format = self.client_formats.get(websocket, 'json')
+        with tracer.span('ws.encode', format=template_format):
+            messages = self.encode_response(response, template_format)
+        
+        with tracer.span('ws.send', messages=len(messages), size=sum(len(m) for m in messages)):
+            lock = self.send_locks.get(websocket)
+            if lock is None:
+                for message in messages:
+                    await websocket.send(message)
+                return
+            
+            async with lock:
+                for message in messages:
+                    await websocket.send(message)
+    
+    def start_forwarding(self, websocket, kind: str, subscription):
+        """Forward a subscription's events to this client until stopped or disconnected"""
+        self.stop_forwarding(websocket, kind)
+        task = asyncio.create_task(self.forward_events(websocket, subscription))
+        self.event_subscriptions[(websocket, kind)] = (subscription, task)
     
-    async def handle_command(self, data):
+    def stop_forwarding(self, websocket, kind: str) -> bool:
+        """Stop forwarding events of one kind to this client"""
+        entry = self.event_subscriptions.pop((websocket, kind), None)
+        if entry is None:
+            return False
+        subscription, task = entry
+        if kind == 'scans':
+            self.zkt_controller.scan_stream.unsubscribe(subscription)
+        else:
+            subscription.close()
+        task.cancel()
+        return True
+    
+    async def forward_events(self, websocket, subscription):
+        """Push events from a subscription to the client"""
+        try:
+            while True:
+                event = await subscription.get()
+                if isinstance(event['data'], CaptureResult):
+                    # Flat like a capture_fingerprint response so the template
+                    # is sent in the client's negotiated format
+                    message = event['data'].message(
+                        type=event['type'],
+                        timestamp=event['timestamp'],
+                        dropped=subscription.dropped
+                    )
+                elif event['type'] in RESULT_EVENTS:
+                    message = self.encode_image({
+                        'type': event['type'],
+                        'timestamp': event['timestamp'],
+                        'dropped': subscription.dropped,
+                        **event['data']
+                    })
+                else:
+                    message = {
+                        'type': 'event',
+                        'event': event['type'],
+                        'timestamp': event['timestamp'],
+                        'data': event['data']
+                    }
+                with tracer.span('ws.forward', kind='server', event=event['type']):
+                    await self.send_response(websocket, message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+    
+    def get_client_id(self, data) -> Optional[str]:
+        """Client ID for capture coalescing, only when the client sent one
+
+        Never derived from the peer address: clients behind one proxy (or
+        the Node backend) share an IP and would be handed each other's scan.
+        """
+        if data.get('client_id'):
+            return str(data['client_id'])
+        return None
+    
+    async def handle_command(self, data, websocket=None):
         """Handle WebSocket commands"""
         command = data.get('command', '')
         
@@ -1046,7 +1854,8 @@ class ZK9500WebSocketServer:
             }
         
         elif command == 'connect':
-            success = self.zkt_controller.connect()
+            self.zkt_controller.health_monitor.resume()
+            success = await self.zkt_controller.connect_async()
             return {
                 'command': 'connect',
                 'success': success,
@@ -1055,7 +1864,9 @@ class ZK9500WebSocketServer:
             }
         
         elif command == 'disconnect':
-            self.zkt_controller.disconnect()
+            # Stay disconnected until the next connect command
+            self.zkt_controller.health_monitor.pause()
+            await self.zkt_controller.disconnect_async()
             return {
                 'command': 'disconnect',
                 'success': True,
@@ -1063,10 +1874,128 @@ class ZK9500WebSocketServer:
             }
         
         elif command == 'capture_fingerprint':
-            result = self.zkt_controller.capture_fingerprint()
-            return {
+            result = await self.zkt_controller.scheduler.capture(
+                client_id=self.get_client_id(data),
+                timeout=data.get('timeout'),
+                device_id=data.get('device_id'),
+                mode=data.get('mode', 'template')
+            )
+            if isinstance(result, CaptureResult):
+                return result.message(command='capture_fingerprint')
+            return self.encode_image({
                 'command': 'capture_fingerprint',
                 **result
+            })
+        
+        elif command == 'identify':
+            # Match a template sent by the client, or capture one first
+            identifier = self.zkt_controller.identifier
+            if data.get('template'):
+                try:
+                    template = decode_template(data['template'])
+                except (TypeError, ValueError) as e:
+                    return {
+                        'command': 'identify',
+                        'success': False,
+                        'message': f'Invalid template: {str(e)}'
+                    }
+                result = await identifier.identify_async(template)
+            else:
+                result = await identifier.identify_capture(
+                    client_id=self.get_client_id(data),
+                    timeout=data.get('timeout'),
+                    device_id=data.get('device_id')
+                )
+            return {
+                'command': 'identify',
+                **result
+            }
+        
+        elif command == 'set_format':
+            template_format = data.get('format', 'json')
+            if template_format not in TEMPLATE_FORMATS or websocket is None:
+                return {
+                    'command': 'set_format',
+                    'success': False,
+                    'message': f"Unsupported format: {template_format} (expected one of {', '.join(TEMPLATE_FORMATS)})"
+                }
+            self.client_formats[websocket] = template_format
+            return {
+                'command': 'set_format',
+                'success': True,
+                'format': template_format,
+                'message': f'Templates will be sent as {template_format}'
+            }
+        
+        elif command == 'cancel_capture':
+            cancelled = self.zkt_controller.scheduler.cancel(self.get_client_id(data))
+            return {
+                'command': 'cancel_capture',
+                'success': True,
+                'cancelled': cancelled,
+                'message': f'Cancelled {cancelled} queued capture request(s)'
+            }
+        
+        elif command == 'subscribe_events':
+            event_types = data.get('events') or list(DEVICE_EVENTS)
+            if isinstance(event_types, str):
+                event_types = [event_types]
+            unknown = [t for t in event_types if t not in SUBSCRIBABLE_EVENTS]
+            if unknown or websocket is None:
+                return {
+                    'command': 'subscribe_events',
+                    'success': False,
+                    'message': f"Unknown event(s): {', '.join(unknown)} (expected {', '.join(SUBSCRIBABLE_EVENTS)})"
+                }
+            self.start_forwarding(websocket, 'events', self.zkt_controller.events.subscribe(event_types))
+            return {
+                'command': 'subscribe_events',
+                'success': True,
+                'events': event_types,
+                'device_connected': self.zkt_controller.device_info['connected'],
+                'message': f"Subscribed to {', '.join(event_types)}"
+            }
+        
+        elif command == 'unsubscribe_events':
+            unsubscribed = websocket is not None and self.stop_forwarding(websocket, 'events')
+            return {
+                'command': 'unsubscribe_events',
+                'success': True,
+                'message': 'Unsubscribed from device events' if unsubscribed else 'Not subscribed'
+            }
+        
+        elif command == 'subscribe_scans':
+            device_id = data.get('device_id')
+            if websocket is None or (device_id and self.zkt_controller.pool.get(device_id) is None):
+                return {
+                    'command': 'subscribe_scans',
+                    'success': False,
+                    'message': f'Unknown device: {device_id}'
+                }
+            stream = self.zkt_controller.scan_stream
+            self.start_forwarding(websocket, 'scans', stream.subscribe(device_id))
+            return {
+                'command': 'subscribe_scans',
+                'success': True,
+                'device_id': device_id,
+                'debounce': stream.debounce,
+                'queue_size': stream.queue_size,
+                'message': f"Streaming scans from {device_id or 'all scanners'}"
+            }
+        
+        elif command == 'unsubscribe_scans':
+            unsubscribed = websocket is not None and self.stop_forwarding(websocket, 'scans')
+            return {
+                'command': 'unsubscribe_scans',
+                'success': True,
+                'message': 'Scan stream stopped' if unsubscribed else 'Not subscribed'
+            }
+        
+        elif command == 'list_devices':
+            return {
+                'command': 'list_devices',
+                'success': True,
+                'devices': self.zkt_controller.pool.get_status()
             }
         
         elif command == 'status':
@@ -1078,8 +2007,16 @@ class ZK9500WebSocketServer:
                     'hostname': socket.gethostname(),
                     'tailscale_ip': self.zkt_controller.device_info['client_ip'],
                     'connected_clients': len(self.clients),
-                    'service_uptime': time.time()
-                }
+                    'service_uptime': self.zkt_controller.metrics.uptime()
+                },
+                'capture_queue': self.zkt_controller.scheduler.get_status(),
+                'health_monitor': self.zkt_controller.health_monitor.get_status(),
+                'event_loop': self.zkt_controller.loop_watchdog.get_status(),
+                'devices': self.zkt_controller.pool.get_status(),
+                'scan_stream': self.zkt_controller.scan_stream.get_status(),
+                'identifier': self.zkt_controller.identifier.get_status(),
+                'upload_queue': await asyncio.to_thread(self.zkt_controller.upload_spool.get_status),
+                'simulator': self.zkt_controller.simulator.get_status() if self.zkt_controller.simulator else None
             }
         
         else:
@@ -1099,17 +2036,31 @@ class ZK9500WebSocketServer:
         self.server = await websockets.serve(
             self.handle_client,
             host,
-            port
+            port,
+            subprotocols=[BINARY_SUBPROTOCOL] + ([MSGPACK_SUBPROTOCOL] if HAS_MSGPACK else [])
         )
         
         self.is_running = True
-        logger.info(f"✅ ZK9500 WebSocket Server running on ws://{self.zkt_controller.device_info['client_ip']}:{port}/zk9500")
+        logger.info(f"✅ ZK9500 WebSocket Server running on ws://{host}:{port}/zk9500")
         
-        # Try to connect to device on startup
-        if self.zkt_controller.connect():
-            logger.info("✅ ZK9500 device connected on startup")
-        else:
-            logger.warning("⚠️ ZK9500 device not found on startup")
+        # Resolve the Tailscale IP now that we are listening
+        self.zkt_controller.ip_resolver.start()
+        
+        # Reports handlers that block the loop shared by every client
+        self.zkt_controller.loop_watchdog.start()
+        
+        # Connects on startup, then keeps the device connected in the background
+        self.zkt_controller.events.bind()
+        self.zkt_controller.health_monitor.start()
+        
+        # Opens any other attached scanners once the primary is connected
+        self.zkt_controller.pool.start()
+        
+        # Loads the enrolled templates for local identification
+        self.zkt_controller.identifier.start()
+        
+        # Spools results to disk and uploads them whenever the backend is reachable
+        await self.zkt_controller.upload_spool.start()
     
     async def stop_server(self):
         """Stop WebSocket server"""
@@ -1119,13 +2070,26 @@ class ZK9500WebSocketServer:
             self.is_running = False
             logger.info("WebSocket server stopped")
         
-        self.zkt_controller.disconnect()
+        for websocket, kind in list(self.event_subscriptions):
+            self.stop_forwarding(websocket, kind)
+        await self.zkt_controller.scan_stream.stop()
+        await self.zkt_controller.health_monitor.stop()
+        await self.zkt_controller.scheduler.close()
+        await self.zkt_controller.pool.stop()
+        await self.zkt_controller.identifier.stop()
+        await self.zkt_controller.upload_spool.stop()
+        await self.zkt_controller.ip_resolver.stop()
+        await self.zkt_controller.disconnect_async()
+        self.zkt_controller.worker.stop()
+        await self.zkt_controller.loop_watchdog.stop()
+        await asyncio.to_thread(tracer.close)
 
 class ZK9500WindowsService:
     """Windows Service wrapper for ZK9500 Bridge with WebSocket and HTTP API support"""
     
-    def __init__(self):
-        self.config = self.load_config()
+    def __init__(self, config: Optional[configparser.ConfigParser] = None):
+        # config replaces config.ini, e.g. for the load-test benchmark
+        self.config = config or self.load_config()
         self.websocket_server = ZK9500WebSocketServer(self.config)
         
         # HTTP API server (optional)
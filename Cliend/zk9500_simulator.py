@@ -0,0 +1,639 @@
+#!/usr/bin/env python3
+"""
+ZK9500 Device Simulator
+=======================
+
+Simulated scanners behind the real SDK, USB HID and serial code paths,
+so capture, the capture queue, the device pool and reconnects can be
+load-tested and benchmarked on a Linux box with no ZK9500 and no
+libzkfp.dll.
+
+When [simulator] is enabled it replaces the real backends: the
+controller gets a SimulatedSDK instead of ZKFingerSDKInterface, and HID
+and serial discovery only find simulated devices (sim-hid-N paths, SIMN
+ports) that speak the scanner's wire protocol. Each scanner draws its
+latencies from configurable distributions and injects failed scans,
+timeouts, corrupt bytes and unplug/replug cycles at configurable rates.
+A script file replaces the random model with an exact sequence of
+responses, raw bytes included.
+
+No real scanner is used while it is on; never enable it on a branch PC.
+
+Author: Pattani Installment System
+Version: 1.0.0
+"""
+
+import collections
+import functools
+import json
+import logging
+import math
+import queue
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import serial
+
+from zk9500_protocol import encode_frame, HID_REPORT_SIZE, TEMPLATE_MAX_SIZE
+from zk9500_tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+TRANSPORTS = ('zkfinger_sdk', 'usb_hid', 'serial')
+
+# What simulated HID scanners enumerate as (a real ZK9500's IDs)
+SIMULATED_HID_ID = (0x1b55, 0x0124)
+FIRMWARE_VERSION = (6, 0)
+
+CAPTURE_COMMAND = bytes([0x02, 0x01, 0x00, 0x00])
+# ZKFPM_AcquireFingerprint results: no finger yet, and a failed capture
+ZKFP_ERR_CAPTURE = -8
+ZKFP_ERR_FAIL = -17
+
+SCRIPT_KEYS = {'command', 'device', 'delay', 'status', 'quality', 'template_size', 'template',
+               'timeout', 'raw', 'disconnect', 'replug_after'}
+
+class Distribution:
+    """Random value from a spec such as "uniform:0.3,1.2"
+
+    fixed:V (or just V), uniform:LOW,HIGH, normal:MEAN,STDDEV,
+    lognormal:MEDIAN,SIGMA and exponential:MEAN. Samples are clamped to
+    [minimum, maximum].
+    """
+
+    PARAMETERS = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2, 'exponential': 1}
+
+    def __init__(self, spec, minimum: float = 0.0, maximum: float = float('inf')):
+        kind, _, params = str(spec).strip().partition(':')
+        if not params:
+            kind, params = 'fixed', kind
+        kind = kind.strip().lower()
+        if kind not in self.PARAMETERS:
+            raise ValueError(f"Unknown distribution '{kind}' in '{spec}'")
+        values = [float(value) for value in params.split(',')]
+        if len(values) != self.PARAMETERS[kind]:
+            raise ValueError(f"'{kind}' takes {self.PARAMETERS[kind]} parameter(s), got '{spec}'")
+        if kind in ('lognormal', 'exponential') and values[0] <= 0:
+            raise ValueError(f"'{kind}' needs a positive median/mean, got '{spec}'")
+        self.spec = str(spec).strip()
+        self.kind = kind
+        self.params = values
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def sample(self, rng: random.Random) -> float:
+        p = self.params
+        if self.kind == 'fixed':
+            value = p[0]
+        elif self.kind == 'uniform':
+            value = rng.uniform(p[0], p[1])
+        elif self.kind == 'normal':
+            value = rng.gauss(p[0], p[1])
+        elif self.kind == 'lognormal':
+            value = rng.lognormvariate(math.log(p[0]), p[1])
+        else:
+            value = rng.expovariate(1 / p[0])
+        return min(max(value, self.minimum), self.maximum)
+
+    def __repr__(self) -> str:
+        return f"Distribution({self.spec!r})"
+
+def load_script(path: Path) -> List[Dict[str, Any]]:
+    """Scripted responses from a JSON file holding a list of steps
+
+    A step answers the next command of its kind ("capture" by default,
+    or "test"), optionally only on one "device" index:
+        {"delay": 0.4, "quality": 80, "template_size": 512}
+        {"status": 3}                          failed scan
+        {"timeout": true}                      no answer at all
+        {"raw": "00ff1234"}                    these bytes instead of a frame
+        {"disconnect": true, "replug_after": 5}
+    delay is seconds or a distribution spec.
+    """
+    steps = json.loads(Path(path).read_text(encoding='utf-8'))
+    if not isinstance(steps, list):
+        raise ValueError(f"{path}: expected a JSON list of steps")
+    for number, step in enumerate(steps, 1):
+        if not isinstance(step, dict):
+            raise ValueError(f"{path}: step {number} is not an object")
+        unknown = set(step) - SCRIPT_KEYS
+        if unknown:
+            raise ValueError(f"{path}: step {number} has unknown keys {sorted(unknown)}")
+        if step.get('command', 'capture') not in ('capture', 'test'):
+            raise ValueError(f"{path}: step {number} command must be 'capture' or 'test'")
+        if 'raw' in step:
+            bytes.fromhex(step['raw'])
+    return steps
+
+@functools.lru_cache(maxsize=128)
+def ridge_image(quality: int, width: int, height: int, block: int = 16) -> bytes:
+    """Greyscale image that image_quality() scores at about quality
+
+    Clean vertical ridges fill quality% of the blocks it counts as a fully
+    placed finger; the rest is flat background.
+    """
+    rows, cols = height // block, width // block
+    ridge_blocks = round(rows * cols * 0.4 * max(min(quality, 100), 0) / 100)
+    ridge_row = bytes(int(128 + 90 * math.sin(2 * math.pi * x / 8)) for x in range(width))
+    flat_row = bytes([128]) * width
+
+    image = bytearray()
+    for row in range(height):
+        filled = min(max(ridge_blocks - (row // block) * cols, 0), cols) * block if row < rows * block else 0
+        image += ridge_row[:filled] + flat_row[filled:]
+    return bytes(image)
+
+class SimulatedResponse:
+    """How a simulated scanner answers one command"""
+
+    __slots__ = ('action', 'delay', 'status', 'quality', 'payload', 'raw', 'replug_after')
+
+    def __init__(self, action: str, delay: float, status: int = 0, quality: int = 0, payload: bytes = b'',
+                 raw: bytes = b'', replug_after: float = 0.0):
+        self.action = action  # 'frame', 'raw', 'timeout' or 'disconnect'
+        self.delay = delay
+        self.status = status
+        self.quality = quality
+        self.payload = payload
+        self.raw = raw
+        self.replug_after = replug_after
+
+    def to_bytes(self) -> bytes:
+        return self.raw if self.action == 'raw' else encode_frame(self.status, self.quality, self.payload)
+
+class SimulatedScanner:
+    """One virtual ZK9500: decides how each command is answered"""
+
+    def __init__(self, simulator: "DeviceSimulator", transport: str, index: int):
+        self.simulator = simulator
+        self.transport = transport
+        self.index = index
+        self.rng = simulator.rng_for(transport, index)
+        self.serial_number = self.rng.randrange(10000, 100000)
+        self.script = collections.deque(
+            step for step in simulator.script if step.get('device', index) == index
+        )
+        self.generation = 0  # Bumped on every unplug; open handles from before go stale
+        self.unplugged_until = 0.0
+        self.stats: "collections.Counter[str]" = collections.Counter()
+        self.lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return f"{self.transport}/{self.index}"
+
+    @property
+    def plugged(self) -> bool:
+        return time.monotonic() >= self.unplugged_until
+
+    def unplug(self, duration: float):
+        """Drop off the bus for duration seconds"""
+        with self.lock:
+            self.generation += 1
+            self.unplugged_until = time.monotonic() + duration
+            self.stats['disconnects'] += 1
+        logger.info(f"Simulated scanner {self.name} unplugged for {duration:.1f}s")
+
+    def respond(self, command: bytes) -> SimulatedResponse:
+        """Answer for one command: scripted if a step is due, random otherwise"""
+        kind = 'capture' if command[:1] == CAPTURE_COMMAND[:1] else 'test'
+        with self.lock:
+            self.stats[kind] += 1
+            step = self.next_step(kind)
+            if step is not None:
+                response = self.scripted(kind, step)
+            elif kind == 'test':
+                response = SimulatedResponse(
+                    'frame', self.simulator.response_delay.sample(self.rng),
+                    payload=self.serial_number.to_bytes(4, 'little') + bytes(FIRMWARE_VERSION)
+                )
+            else:
+                response = self.random_capture()
+            if kind == 'capture':
+                self.stats[self.outcome(response)] += 1
+        return response
+
+    def next_step(self, kind: str) -> Optional[Dict[str, Any]]:
+        if not self.script or self.script[0].get('command', 'capture') != kind:
+            return None
+        step = self.script.popleft()
+        if self.simulator.script_repeat:
+            self.script.append(step)
+        return step
+
+    def scripted(self, kind: str, step: Dict[str, Any]) -> SimulatedResponse:
+        simulator, rng = self.simulator, self.rng
+        default_delay = simulator.finger_delay if kind == 'capture' else simulator.response_delay
+        delay = step.get('delay')
+        delay = default_delay.sample(rng) if delay is None else Distribution(delay).sample(rng)
+
+        if step.get('disconnect'):
+            replug_after = step.get('replug_after')
+            return SimulatedResponse(
+                'disconnect', delay,
+                replug_after=simulator.replug_delay.sample(rng) if replug_after is None else float(replug_after)
+            )
+        if step.get('timeout'):
+            return SimulatedResponse('timeout', delay)
+        if 'raw' in step:
+            return SimulatedResponse('raw', delay, raw=bytes.fromhex(step['raw']))
+
+        if 'template' in step:
+            payload = bytes.fromhex(step['template'])
+        elif kind == 'test':
+            payload = self.serial_number.to_bytes(4, 'little') + bytes(FIRMWARE_VERSION)
+        else:
+            payload = rng.randbytes(int(step.get('template_size') or simulator.template_size.sample(rng)))
+        quality = step.get('quality')
+        return SimulatedResponse(
+            'frame', delay,
+            status=int(step.get('status', 0)),
+            quality=round(simulator.quality.sample(rng)) if quality is None else int(quality),
+            payload=payload
+        )
+
+    def random_capture(self) -> SimulatedResponse:
+        simulator, rng = self.simulator, self.rng
+        delay = simulator.finger_delay.sample(rng)
+        roll = rng.random()
+
+        roll -= simulator.disconnect_rate
+        if roll < 0:
+            # Pulled out while waiting for the finger
+            return SimulatedResponse('disconnect', rng.uniform(0, delay), replug_after=simulator.replug_delay.sample(rng))
+        roll -= simulator.timeout_rate
+        if roll < 0:
+            return SimulatedResponse('timeout', delay)
+        roll -= simulator.failure_rate
+        if roll < 0:
+            return SimulatedResponse('frame', delay, status=rng.randint(1, 3))
+        roll -= simulator.garbage_rate
+        if roll < 0:
+            return SimulatedResponse('raw', delay, raw=rng.randbytes(rng.randint(1, 32)))
+
+        return SimulatedResponse(
+            'frame', delay,
+            quality=round(simulator.quality.sample(rng)),
+            payload=rng.randbytes(int(simulator.template_size.sample(rng)))
+        )
+
+    @staticmethod
+    def outcome(response: SimulatedResponse) -> str:
+        if response.action == 'frame':
+            return 'ok' if response.status == 0 else 'failed'
+        return {'raw': 'garbage', 'timeout': 'timeouts', 'disconnect': 'unplugs'}[response.action]
+
+    def get_status(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.stats)
+        return {
+            'name': self.name,
+            'serial': f"ZK{self.serial_number}",
+            'plugged': self.plugged,
+            **stats
+        }
+
+class SimulatedLink:
+    """Command/response plumbing shared by the simulated HID and serial devices
+
+    Commands are answered in order by a thread standing in for the
+    scanner firmware, after the delay the scanner model picked.
+    """
+
+    def __init__(self, scanner: SimulatedScanner, name: str):
+        self.scanner = scanner
+        self.generation = scanner.generation
+        self.condition = threading.Condition()
+        self.commands: "queue.Queue[Optional[bytes]]" = queue.Queue()
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"zk9500-sim-{name}", daemon=True)
+        self.thread.start()
+
+    @property
+    def lost(self) -> bool:
+        """The scanner was unplugged since this handle was opened"""
+        return self.generation != self.scanner.generation
+
+    def send(self, command: bytes):
+        self.commands.put(bytes(command))
+
+    def respond(self, command: bytes) -> Optional[SimulatedResponse]:
+        return self.scanner.respond(command)
+
+    def deliver(self, data: bytes):
+        raise NotImplementedError
+
+    def _run(self):
+        while True:
+            command = self.commands.get()
+            if command is None or self.closed.is_set():
+                return
+            response = self.respond(command)
+            if response is None:
+                continue
+            if self.closed.wait(response.delay):
+                return
+            if self.lost:
+                continue
+            if response.action == 'disconnect':
+                self.scanner.unplug(response.replug_after)
+                self.wake()
+            elif response.action != 'timeout':
+                self.deliver(response.to_bytes())
+
+    def wake(self):
+        with self.condition:
+            self.condition.notify_all()
+
+    def close(self):
+        self.closed.set()
+        self.commands.put(None)
+        self.wake()
+
+class SimulatedHIDDevice(SimulatedLink):
+    """hidapi-style handle on a simulated scanner
+
+    Responses come back as 64-byte reports, the last one zero-padded.
+    """
+
+    def __init__(self, scanner: SimulatedScanner, path: bytes):
+        self.path = path
+        self.reports: "collections.deque[bytes]" = collections.deque()
+        super().__init__(scanner, path.decode('ascii'))
+
+    def set_nonblocking(self, nonblocking: bool):
+        pass
+
+    def is_plugged(self) -> bool:
+        return self.scanner.plugged and not self.lost
+
+    def write(self, data) -> int:
+        if self.closed.is_set() or self.lost:
+            raise OSError("write error (device disconnected)")
+        self.send(bytes(data[:4]))
+        return len(data)
+
+    def read(self, size: int, timeout_ms: int = 0) -> List[int]:
+        deadline = time.monotonic() + timeout_ms / 1000
+        with self.condition:
+            while not self.reports:
+                if self.lost:
+                    raise OSError("read error (device disconnected)")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self.closed.is_set():
+                    return []
+                self.condition.wait(remaining)
+            return list(self.reports.popleft()[:size])
+
+    def deliver(self, data: bytes):
+        with self.condition:
+            for offset in range(0, len(data), HID_REPORT_SIZE):
+                self.reports.append(data[offset:offset + HID_REPORT_SIZE].ljust(HID_REPORT_SIZE, b'\x00'))
+            self.condition.notify_all()
+
+class SimulatedSerialPort(SimulatedLink):
+    """serial.Serial stand-in with a simulated scanner on the other end
+
+    Works with SerialFrameReader. Only answers at the scanner's baud rate,
+    like a real UART, and delivers responses in chunk_size pieces.
+    """
+
+    def __init__(self, scanner: SimulatedScanner, port: str, baudrate: int, timeout: Optional[float] = None):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.is_open = True
+        self.buffer = bytearray()
+        self.pending = bytearray()
+        self.cancelled = False
+        super().__init__(scanner, port)
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self.buffer)
+
+    def read(self, size: int = 1) -> bytes:
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self.condition:
+            while not self.buffer:
+                if self.lost:
+                    raise serial.SerialException(f"{self.port}: device disconnected")
+                if not self.is_open or self.cancelled:
+                    self.cancelled = False
+                    return b''
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return b''
+                self.condition.wait(remaining)
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            return data
+
+    def write(self, data) -> int:
+        if not self.is_open:
+            raise serial.SerialException("Attempting to use a port that is not open")
+        if self.lost:
+            raise serial.SerialException(f"{self.port}: device disconnected")
+        self.pending += data
+        while len(self.pending) >= len(CAPTURE_COMMAND):
+            self.send(self.pending[:len(CAPTURE_COMMAND)])
+            del self.pending[:len(CAPTURE_COMMAND)]
+        return len(data)
+
+    def respond(self, command: bytes) -> Optional[SimulatedResponse]:
+        if self.baudrate != self.scanner.simulator.baud_rate:
+            return None  # Wrong baud rate: the scanner never sees a valid command
+        return self.scanner.respond(command)
+
+    def deliver(self, data: bytes):
+        chunk_size = self.scanner.simulator.chunk_size
+        for offset in range(0, len(data), chunk_size):
+            with self.condition:
+                self.buffer += data[offset:offset + chunk_size]
+                self.condition.notify_all()
+            if self.closed.wait(self.scanner.simulator.chunk_gap):
+                return
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        with self.condition:
+            self.buffer.clear()
+
+    def reset_output_buffer(self):
+        self.pending.clear()
+
+    def cancel_read(self):
+        with self.condition:
+            self.cancelled = True
+            self.condition.notify_all()
+
+    def close(self):
+        self.is_open = False
+        super().close()
+
+class SimulatedSDKBuffers:
+    """Sensor size of one open handle, like SDKCaptureBuffers without the ctypes arrays"""
+
+    __slots__ = ('width', 'height')
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+
+class SimulatedSDK:
+    """Drop-in for ZKFingerSDKInterface backed by simulated scanners"""
+
+    def __init__(self, scanners: List[SimulatedScanner], image_width: int = 300, image_height: int = 400):
+        self.scanners = scanners
+        self.image_width = image_width
+        self.image_height = image_height
+        self.initialized = False
+        self.has_db = False  # No ZKFPM_DB* cache; matcher backend 'auto' picks bitwise under the simulator
+        self.devices = []
+        self.buffers: Dict[int, SimulatedSDKBuffers] = {}
+        self.handles: Dict[int, tuple] = {}  # handle -> (scanner, generation at open)
+        self.last_status: Dict[int, Optional[int]] = {}  # handle -> last capture result, as in the SDK
+        self.next_handle = 1
+        self.lock = threading.Lock()
+
+    def initialize(self):
+        self.initialized = True
+        return True, "Simulated SDK initialized"
+
+    def terminate(self):
+        self.initialized = False
+
+    def plugged(self) -> List[SimulatedScanner]:
+        return [scanner for scanner in self.scanners if scanner.plugged]
+
+    def get_device_count(self):
+        return len(self.plugged()) if self.initialized else 0
+
+    def open_device(self, index):
+        plugged = self.plugged() if self.initialized else []
+        if index >= len(plugged):
+            return None
+        scanner = plugged[index]
+        with self.lock:
+            handle = self.next_handle
+            self.next_handle += 1
+            self.handles[handle] = (scanner, scanner.generation)
+            self.buffers[handle] = SimulatedSDKBuffers(self.image_width, self.image_height)
+        return handle
+
+    def close_device(self, handle):
+        with self.lock:
+            self.handles.pop(handle, None)
+            self.buffers.pop(handle, None)
+            self.last_status.pop(handle, None)
+        return True
+
+    def capture_fingerprint(self, handle, include_image: bool = False):
+        """(image, template) like ZKFingerSDKInterface, or (None, None)"""
+        self.last_status[handle] = ZKFP_ERR_FAIL
+        scanner, generation = self.handles.get(handle, (None, None))
+        if scanner is None or scanner.generation != generation:
+            return None, None
+
+        response = scanner.respond(CAPTURE_COMMAND)
+        time.sleep(response.delay)
+        if response.action == 'disconnect':
+            scanner.unplug(response.replug_after)
+            return None, None
+        if response.action == 'timeout':
+            self.last_status[handle] = ZKFP_ERR_CAPTURE  # No finger within the delay
+            return None, None
+        if response.action != 'frame' or response.status != 0 or scanner.generation != generation:
+            return None, None
+
+        self.last_status[handle] = 0
+        tracer.annotate(template_bytes=len(response.payload), include_image=include_image)
+        image = memoryview(ridge_image(response.quality, self.image_width, self.image_height)) if include_image else None
+        return image, response.payload
+
+class DeviceSimulator:
+    """Simulated scanners for each configured transport"""
+
+    def __init__(self, transports=('zkfinger_sdk',), devices: int = 1,
+                 finger_delay: str = 'lognormal:0.8,0.4', response_delay: str = 'fixed:0.005',
+                 quality: str = 'uniform:55,95', template_size: str = '512',
+                 failure_rate: float = 0.0, timeout_rate: float = 0.0, garbage_rate: float = 0.0,
+                 disconnect_rate: float = 0.0, replug_delay: str = 'fixed:2',
+                 baud_rate: int = 115200, chunk_size: int = 64, chunk_gap: float = 0.002,
+                 image_width: int = 300, image_height: int = 400, seed: Optional[str] = None,
+                 script: Optional[List[Dict[str, Any]]] = None, script_repeat: bool = False):
+        unknown = set(transports) - set(TRANSPORTS)
+        if unknown:
+            raise ValueError(f"Unknown simulator transports {sorted(unknown)} (expected {', '.join(TRANSPORTS)})")
+        if failure_rate + timeout_rate + garbage_rate + disconnect_rate > 1:
+            raise ValueError("Simulator failure, timeout, garbage and disconnect rates add up to more than 1")
+
+        self.transports = list(transports)
+        self.finger_delay = Distribution(finger_delay)
+        self.response_delay = Distribution(response_delay)
+        self.replug_delay = Distribution(replug_delay)
+        self.quality = Distribution(quality, 0, 100)
+        self.template_size = Distribution(template_size, 1, TEMPLATE_MAX_SIZE)
+        self.failure_rate = failure_rate
+        self.timeout_rate = timeout_rate
+        self.garbage_rate = garbage_rate
+        self.disconnect_rate = disconnect_rate
+        self.baud_rate = baud_rate
+        self.chunk_size = max(chunk_size, 1)
+        self.chunk_gap = chunk_gap
+        self.seed = seed
+        self.script = script or []
+        self.script_repeat = script_repeat
+
+        self.scanners: Dict[str, List[SimulatedScanner]] = {
+            transport: [SimulatedScanner(self, transport, index) for index in range(devices)]
+            for transport in self.transports
+        }
+        self.sdk = SimulatedSDK(self.scanners.get('zkfinger_sdk', []), image_width, image_height)
+
+    def rng_for(self, transport: str, index: int) -> random.Random:
+        """Per-scanner generator, reproducible when a seed is set"""
+        return random.Random(f"{self.seed}:{transport}:{index}") if self.seed else random.Random()
+
+    def hid_devices(self) -> List[Dict]:
+        """Plugged-in simulated HID scanners, shaped like list_zk9500_hid_devices() entries"""
+        return [
+            {
+                'vendor_id': SIMULATED_HID_ID[0],
+                'product_id': SIMULATED_HID_ID[1],
+                'path': f"sim-hid-{scanner.index}".encode('ascii'),
+                'manufacturer': 'ZKTeco',
+                'product': 'ZK9500 (simulated)',
+                'type': 'simulator'
+            }
+            for scanner in self.scanners.get('usb_hid', []) if scanner.plugged
+        ]
+
+    def open_hid(self, device_info: Dict) -> SimulatedHIDDevice:
+        path = device_info.get('path') or b'sim-hid-0'
+        for scanner in self.scanners.get('usb_hid', []):
+            if f"sim-hid-{scanner.index}".encode('ascii') == path and scanner.plugged:
+                return SimulatedHIDDevice(scanner, path)
+        raise OSError(f"open failed: no simulated HID device at {path!r}")
+
+    def serial_ports(self) -> List[str]:
+        """Plugged-in simulated serial scanners' port names"""
+        return [f"SIM{scanner.index}" for scanner in self.scanners.get('serial', []) if scanner.plugged]
+
+    def open_serial(self, port_name: str, baudrate: int, timeout: Optional[float] = None) -> SimulatedSerialPort:
+        for scanner in self.scanners.get('serial', []):
+            if f"SIM{scanner.index}" == port_name and scanner.plugged:
+                return SimulatedSerialPort(scanner, port_name, baudrate, timeout)
+        raise serial.SerialException(f"could not open port {port_name}: no simulated scanner there")
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            'transports': self.transports,
+            'finger_delay': self.finger_delay.spec,
+            'scanners': [scanner.get_status() for scanners in self.scanners.values() for scanner in scanners]
+        }
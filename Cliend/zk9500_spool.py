@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+ZK9500 Upload Spool
+===================
+
+Durable outbox for scan results bound for the attendance backend.
+Results are taken off the event bus and written to a local SQLite queue
+first, so a dropped Tailscale link never loses a check-in. A background
+worker drains the queue in batches; every item carries an idempotency
+key so the backend can ignore duplicates when a batch is retried after
+a timeout. Failed batches back off with jitter; items the backend
+rejects outright are kept as dead rows for inspection.
+
+Author: Pattani Installment System
+Version: 1.0.0
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import random
+import socket
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    event_type TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    dead INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (dead, next_attempt_at, id);
+"""
+
+class UploadError(Exception):
+    """Batch upload failed; retryable unless permanent is set"""
+
+    def __init__(self, message: str, permanent: bool = False):
+        super().__init__(message)
+        self.permanent = permanent
+
+def encode_payload(data: Dict[str, Any]) -> str:
+    """JSON for a spooled result: binary fields as base64, images left out"""
+    data = {k: v for k, v in data.items() if k != 'fingerprint_data'}
+    return json.dumps(data, default=lambda value: base64.b64encode(bytes(value)).decode('ascii'))
+
+class UploadSpool:
+    """SQLite outbox plus the batch upload worker"""
+
+    def __init__(self, controller, path: Path, url: str = '', token: str = '',
+                 event_types: Iterable[str] = ('identify', 'scan'), batch_size: int = 50,
+                 interval: float = 5.0, backoff_max: float = 300.0, max_items: int = 100000):
+        self.controller = controller
+        self.path = Path(path)
+        self.url = url
+        self.token = token
+        self.event_types = tuple(event_types)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.backoff_max = backoff_max
+        self.max_items = max_items
+        self.failures = 0  # Consecutive failed batches
+        self.next_retry_at = 0.0  # Monotonic time of the next attempt after a failure
+        self.last_success_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.stats = {
+            'spooled': 0,
+            'uploaded': 0,
+            'batches': 0,
+            'failed_batches': 0,
+            'rejected': 0,
+            'evicted': 0
+        }
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()  # One connection shared by the worker threads
+        self._wake: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+    def open(self):
+        """Blocking: open (or create) the queue database"""
+        with self._lock:
+            if self._db is None:
+                self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+                self._db.execute('PRAGMA journal_mode=WAL')
+                self._db.execute('PRAGMA synchronous=FULL')  # A queued check-in survives power loss
+                self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def enqueue(self, event_type: str, data: Dict[str, Any], key: Optional[str] = None) -> str:
+        """Blocking: durably queue one result; returns its idempotency key"""
+        key = key or uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                'INSERT OR IGNORE INTO outbox (idempotency_key, event_type, payload, created_at) VALUES (?, ?, ?, ?)',
+                (key, event_type, encode_payload(data), time.time())
+            )
+            # Bounded disk use during a very long outage: oldest items go first
+            excess = self._db.execute('SELECT COUNT(*) FROM outbox').fetchone()[0] - self.max_items
+            if excess > 0:
+                self._db.execute(
+                    'DELETE FROM outbox WHERE id IN (SELECT id FROM outbox ORDER BY id LIMIT ?)', (excess,)
+                )
+                self.stats['evicted'] += excess
+                logger.warning(f"⚠️ Upload spool full, dropped {excess} oldest result(s)")
+        self.stats['spooled'] += 1
+        return key
+
+    def next_batch(self) -> List[tuple]:
+        """Blocking: oldest items that are due for an upload attempt"""
+        with self._lock:
+            return self._db.execute(
+                'SELECT id, idempotency_key, event_type, payload, created_at FROM outbox '
+                'WHERE dead = 0 AND next_attempt_at <= ? ORDER BY id LIMIT ?',
+                (time.time(), self.batch_size)
+            ).fetchall()
+
+    def post(self, batch: List[tuple]):
+        """Blocking: send one batch; raises UploadError on failure"""
+        body = json.dumps({
+            'hostname': socket.gethostname(),
+            'items': [
+                {
+                    'idempotencyKey': key,
+                    'type': event_type,
+                    'createdAt': created_at,
+                    'data': json.loads(payload)
+                }
+                for _, key, event_type, payload, created_at in batch
+            ]
+        }).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+
+        request = urllib.request.Request(self.url, data=body, headers=headers, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            # Client errors will not succeed on retry, except timeouts and rate limits
+            permanent = 400 <= e.code < 500 and e.code not in (408, 429)
+            raise UploadError(f"HTTP {e.code} {e.reason}", permanent=permanent)
+        except (urllib.error.URLError, OSError) as e:
+            raise UploadError(str(getattr(e, 'reason', e)))
+
+    def acknowledge(self, ids: List[int]):
+        with self._lock:
+            self._db.executemany('DELETE FROM outbox WHERE id = ?', [(i,) for i in ids])
+
+    def reschedule(self, ids: List[int], error: str, delay: float, dead: bool = False):
+        with self._lock:
+            self._db.executemany(
+                'UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?, dead = ? WHERE id = ?',
+                [(time.time() + delay, error, int(dead), i) for i in ids]
+            )
+
+    def backoff_delay(self) -> float:
+        """Exponential backoff with equal jitter, like the device health monitor"""
+        delay = min(self.backoff_max, self.interval * (2 ** max(self.failures - 1, 0)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def drain(self) -> int:
+        """Blocking: upload due batches until the queue is empty or a batch fails"""
+        uploaded = 0
+        while True:
+            batch = self.next_batch()
+            if not batch:
+                return uploaded
+
+            ids = [row[0] for row in batch]
+            try:
+                self.post(batch)
+            except UploadError as e:
+                self.stats['failed_batches'] += 1
+                self.last_error = str(e)
+                if e.permanent:
+                    self.stats['rejected'] += len(ids)
+                    logger.error(f"Backend rejected {len(ids)} spooled result(s): {e}")
+                    self.reschedule(ids, str(e), 0, dead=True)
+                    continue
+                self.failures += 1
+                delay = self.backoff_delay()
+                self.next_retry_at = time.monotonic() + delay
+                if self.failures == 1:
+                    logger.warning(f"⚠️ Backend unreachable ({e}), spooling results locally")
+                self.reschedule(ids, str(e), delay)
+                return uploaded
+
+            self.acknowledge(ids)
+            if self.failures:
+                logger.info(f"✅ Backend reachable again after {self.failures} failed batch(es)")
+            self.failures = 0
+            self.last_success_at = time.time()
+            self.stats['batches'] += 1
+            self.stats['uploaded'] += len(ids)
+            uploaded += len(ids)
+
+    async def collect(self, subscription):
+        """Write every subscribed result to the spool as it is published"""
+        try:
+            while True:
+                event = await subscription.get()
+                if not event['data'].get('success', True):
+                    continue
+                try:
+                    await asyncio.to_thread(self.enqueue, event['type'], event['data'])
+                except Exception as e:
+                    logger.error(f"Upload spool write error: {e}")
+                    continue
+                self._wake.set()
+        finally:
+            subscription.close()
+
+    async def run(self):
+        """Upload worker: drain when woken by new items, retry on a timer"""
+        while True:
+            try:
+                await asyncio.to_thread(self.drain)
+            except Exception as e:
+                logger.error(f"Upload spool error: {e}")
+            if self.failures:
+                # New results must not cut the backoff short during an outage
+                await asyncio.sleep(max(self.next_retry_at - time.monotonic(), 0))
+            else:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wake.clear()
+
+    async def start(self):
+        """Open the spool and start collecting and uploading (no-op without a URL)"""
+        if not self.enabled:
+            return
+        await asyncio.to_thread(self.open)
+        self._wake = asyncio.Event()
+        # Subscribe now so nothing published before the task first runs is missed
+        subscription = self.controller.events.subscribe(self.event_types, maxsize=1000)
+        loop = asyncio.get_running_loop()
+        self._tasks = [
+            loop.create_task(self.collect(subscription), name="zk9500_spool_collect"),
+            loop.create_task(self.run(), name="zk9500_spool_upload")
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.to_thread(self.close)
+
+    def depth(self) -> Dict[str, Any]:
+        """Blocking: pending and dead item counts plus the oldest pending age"""
+        with self._lock:
+            if self._db is None:
+                return {'depth': 0, 'dead': 0, 'oldest_age_s': 0.0}
+            pending, dead, oldest = self._db.execute(
+                'SELECT SUM(dead = 0), SUM(dead = 1), MIN(CASE WHEN dead = 0 THEN created_at END) FROM outbox'
+            ).fetchone()
+        return {
+            'depth': pending or 0,
+            'dead': dead or 0,
+            'oldest_age_s': round(time.time() - oldest, 1) if oldest else 0.0
+        }
+
+    def get_status(self) -> Dict[str, Any]:
+        """Queue depth and upload health for /status"""
+        return {
+            'enabled': self.enabled,
+            **self.depth(),
+            'failures': self.failures,
+            'last_success_at': self.last_success_at,
+            'last_error': self.last_error,
+            **self.stats
+        }
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+ZK9500 Template Store
+=====================
+
+Append-only on-disk store for the enrolled templates used by local
+identification, so the gallery survives restarts and works offline.
+
+The file is a 64-byte header followed by fixed-size records. At startup
+it is memory-mapped and only the small record headers are read, so a
+large gallery loads without JSON or base64 decoding. Changes are appended
+(new templates, or tombstones for deletions) and the header's record
+count is only advanced after the records are fsynced; a torn tail from a
+crash is cut off on the next open. Every record carries a CRC32, and
+corrupt records are skipped. compact() rewrites the file with only the
+live records once enough of it is dead.
+
+Author: Pattani Installment System
+Version: 1.0.0
+"""
+
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'ZKTS'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHHIQQ')  # magic, version, reserved, template_size, count, sync_version
+HEADER_SIZE = 64
+RECORD_HEADER = struct.Struct('<BBHQ32s')  # flags, finger, template length, sequence, user ID
+CRC = struct.Struct('<I')
+
+LIVE = 1
+TOMBSTONE = 2
+
+def parse_delete(delete) -> Tuple[str, Optional[int]]:
+    """(userId, finger or None for every finger) from a sync delete entry"""
+    if isinstance(delete, (str, int)) and not isinstance(delete, bool):
+        return str(delete), None
+    if isinstance(delete, dict) and delete.get('userId') not in (None, ''):
+        finger = delete.get('finger')
+        try:
+            return str(delete['userId']), None if finger is None else int(finger)
+        except (TypeError, ValueError):
+            pass
+    raise ValueError(f"Invalid delete entry (expected a user ID or {{'userId', 'finger'}}): {delete!r}")
+
+class TemplateStore:
+    """Fixed-size template records in one append-only file"""
+
+    def __init__(self, path: Path, template_size: int = 2048):
+        self.path = Path(path)
+        self.template_size = template_size
+        self.record_size = RECORD_HEADER.size + template_size + CRC.size
+        self.count = 0  # Committed records
+        self.sync_version = 0  # Backend cursor of the last applied delta
+        self.index: Dict[Tuple[str, int], int] = {}  # (userId, finger) -> offset of its live record
+        self.corrupt = 0
+        self.last_compaction: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def dead(self) -> int:
+        """Records that compaction would drop (replaced, tombstones, corrupt)"""
+        return self.count - len(self.index)
+
+    def _write_header(self, f):
+        f.seek(0)
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, 0, self.template_size, self.count, self.sync_version)
+        f.write(header + CRC.pack(zlib.crc32(header)))
+        f.flush()
+        os.fsync(f.fileno())
+
+    def open(self) -> int:
+        """Blocking: map the file and index its live records; returns how many"""
+        with self._lock:
+            if not self.path.exists():
+                self._rewrite([], 0)
+                return 0
+
+            with open(self.path, 'r+b') as f:
+                header = f.read(HEADER.size + CRC.size)
+                if len(header) < HEADER.size + CRC.size or \
+                        CRC.unpack_from(header, HEADER.size)[0] != zlib.crc32(header[:HEADER.size]):
+                    raise ValueError(f"Template store header is corrupt: {self.path}")
+                magic, version, _, template_size, count, sync_version = HEADER.unpack_from(header)
+                if magic != MAGIC or version != FORMAT_VERSION:
+                    raise ValueError(f"Not a template store (or unsupported version): {self.path}")
+
+                self.template_size = template_size
+                self.record_size = RECORD_HEADER.size + template_size + CRC.size
+                self.sync_version = sync_version
+
+                # Records past the committed count are a torn append from a crash
+                committed_end = HEADER_SIZE + count * self.record_size
+                size = os.fstat(f.fileno()).st_size
+                if size < committed_end:
+                    count = (size - HEADER_SIZE) // self.record_size
+                    logger.warning(f"⚠️ Template store is shorter than its header says, keeping {count} records")
+                self.count = count
+                if size != HEADER_SIZE + count * self.record_size:
+                    f.truncate(HEADER_SIZE + count * self.record_size)
+                    self._write_header(f)
+
+                self.index.clear()
+                self.corrupt = 0
+                if count:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                        # Slicing the memoryview checksums records in place, without copies
+                        for offset in range(HEADER_SIZE, HEADER_SIZE + count * self.record_size, self.record_size):
+                            self._index_record(view, offset)
+
+        logger.info(f"✅ Template store {self.path.name}: {len(self.index)} live of {self.count} records"
+                    + (f", {self.corrupt} corrupt" if self.corrupt else ""))
+        return len(self.index)
+
+    def _index_record(self, view: memoryview, offset: int):
+        flags, finger, length, _, raw_user = RECORD_HEADER.unpack_from(view, offset)
+        body_end = offset + RECORD_HEADER.size + min(length, self.template_size)
+        stored_crc = CRC.unpack_from(view, offset + self.record_size - CRC.size)[0]
+        if flags not in (LIVE, TOMBSTONE) or length > self.template_size or \
+                stored_crc != zlib.crc32(view[offset:body_end]):
+            self.corrupt += 1
+            return
+
+        key = (raw_user.rstrip(b'\0').decode('utf-8'), finger)
+        if flags == LIVE:
+            self.index[key] = offset
+        else:
+            self.index.pop(key, None)
+
+    def _pack(self, sequence: int, flags: int, user_id: str, finger: int, template: bytes = b'') -> bytes:
+        raw_user = str(user_id).encode('utf-8')
+        if len(raw_user) > 32:
+            raise ValueError(f"User ID longer than 32 bytes: {user_id}")
+        if len(template) > self.template_size:
+            raise ValueError(f"Template of {len(template)} bytes exceeds {self.template_size}")
+        body = RECORD_HEADER.pack(flags, finger, len(template), sequence, raw_user) + template
+        padding = b'\0' * (self.record_size - CRC.size - len(body))
+        return body + padding + CRC.pack(zlib.crc32(body))
+
+    def _read_live(self) -> List[Dict[str, Any]]:
+        if not self.index:
+            return []
+        records = []
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for (user_id, finger), offset in self.index.items():
+                length = RECORD_HEADER.unpack_from(mm, offset)[2]
+                start = offset + RECORD_HEADER.size
+                records.append({'userId': user_id, 'finger': finger, 'template': mm[start:start + length]})
+        return records
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Blocking: every live record, read through a memory map"""
+        with self._lock:
+            return self._read_live()
+
+    def apply(self, upserts: Iterable[Dict[str, Any]] = (), deletes: Iterable[Any] = (),
+              sync_version: Optional[int] = None) -> Tuple[List[Dict[str, Any]], List[Tuple[str, int]]]:
+        """Blocking: append templates and tombstones in one fsynced batch
+
+        A delete is a user ID, which removes every finger of that user, or
+        {'userId', 'finger'} (finger optional). Malformed deletes raise
+        ValueError before anything is written. Returns the applied upserts
+        and the deleted (userId, finger) keys.
+        """
+        deletes = [parse_delete(delete) for delete in deletes]
+        with self._lock:
+            chunks, offsets, applied, deleted = [], {}, [], []
+            end = HEADER_SIZE + self.count * self.record_size
+            count = self.count
+
+            for user_id, finger in deletes:
+                fingers = [finger] if finger is not None else \
+                    [finger for uid, finger in self.index if uid == user_id]
+                for finger in fingers:
+                    key = (user_id, finger)
+                    if key in self.index and key not in offsets:
+                        chunks.append(self._pack(count, TOMBSTONE, user_id, key[1]))
+                        offsets[key] = None
+                        deleted.append(key)
+                        count += 1
+
+            for record in upserts:
+                try:
+                    key = (str(record['userId']), int(record.get('finger', 0)))
+                    chunks.append(self._pack(count, LIVE, key[0], key[1], bytes(record['template'])))
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.warning(f"⚠️ Skipping template for the store: {e}")
+                    continue
+                offsets[key] = end + (len(chunks) - 1) * self.record_size
+                applied.append(record)
+                count += 1
+
+            with open(self.path, 'r+b') as f:
+                if chunks:
+                    f.seek(end)
+                    f.write(b''.join(chunks))
+                    f.flush()
+                    os.fsync(f.fileno())
+                # Only now do the new records count
+                self.count = count
+                if sync_version is not None:
+                    self.sync_version = sync_version
+                self._write_header(f)
+
+            for key, offset in offsets.items():
+                if offset is None:
+                    self.index.pop(key, None)
+                else:
+                    self.index[key] = offset
+            return applied, deleted
+
+    def _rewrite(self, records: Iterable[Dict[str, Any]], sync_version: int):
+        """Write a fresh file next to the old one, then atomically swap it in"""
+        temp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        self.count = 0
+        index = {}
+        with open(temp_path, 'w+b') as f:
+            f.write(b'\0' * HEADER_SIZE)
+            for record in records:
+                key = (str(record['userId']), int(record.get('finger', 0)))
+                try:
+                    f.write(self._pack(self.count, LIVE, key[0], key[1], bytes(record['template'])))
+                except ValueError as e:
+                    logger.warning(f"⚠️ Skipping template for the store: {e}")
+                    continue
+                index[key] = HEADER_SIZE + self.count * self.record_size
+                self.count += 1
+            self.sync_version = sync_version
+            self._write_header(f)
+        os.replace(temp_path, self.path)
+        self.index = index
+        self.corrupt = 0
+
+    def replace(self, records: Iterable[Dict[str, Any]], sync_version: int = 0):
+        """Blocking: swap in a full snapshot (first sync, or the backend asked for one)"""
+        with self._lock:
+            self._rewrite(list(records), sync_version)
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self.dead > 0 and self.dead >= max(len(self.index), 100)
+
+    def compact(self) -> int:
+        """Blocking: rewrite the file with only live records; returns records dropped"""
+        with self._lock:
+            before = self.count
+            self._rewrite(self._read_live(), self.sync_version)
+        self.last_compaction = time.time()
+        dropped = before - self.count
+        logger.info(f"✅ Compacted template store: dropped {dropped} dead records")
+        return dropped
+
+    def get_status(self) -> Dict[str, Any]:
+        """Store size and health for /status"""
+        return {
+            'file': self.path.name,
+            'live': len(self.index),
+            'records': self.count,
+            'dead': self.dead,
+            'corrupt': self.corrupt,
+            'sync_version': self.sync_version,
+            'last_compaction': self.last_compaction
+        }
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+ZK9500 Continuous Scan Stream
+=============================
+
+Push-mode scanning for check-in stations. While anyone is subscribed the
+wanted scanners stay armed: short capture windows are queued through the
+CaptureScheduler (so on-demand captures still get their turn), and each
+successful scan is published once on the event bus as a 'scan' event and
+fanned out to every subscriber's bounded queue.
+
+A scanner is only re-armed when at least one of its subscribers has room
+for another scan. After a scan it waits `debounce` seconds and then until
+the finger has left the sensor: short `lift_window` captures are queued
+and thrown away while they still find a finger, so a finger left on the
+sensor is reported once.
+
+Author: Pattani Installment System
+Version: 1.0.0
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+from zk9500_events import Subscription, event_device_id
+
+logger = logging.getLogger(__name__)
+
+class ScanStream:
+    """Keeps subscribed scanners armed and publishes every scan once"""
+
+    def __init__(self, controller, debounce: float = 1.5, window: float = 2.0,
+                 retry_interval: float = 0.2, queue_size: int = 16, lift_window: float = 0.5):
+        self.controller = controller
+        self.debounce = debounce
+        self.window = window  # Seconds per armed capture attempt
+        self.lift_window = lift_window  # Seconds per "is the finger still there" capture
+        self.retry_interval = retry_interval
+        self.queue_size = queue_size
+        self.subscriptions: Dict[Subscription, Optional[str]] = {}  # -> device_id, None = every scanner
+        self.stats = {
+            'scans': 0,
+            'attempts': 0,
+            'held_scans': 0,
+            'backpressure_waits': 0
+        }
+        self._armed: Dict[Any, asyncio.Task] = {}  # device -> arm loop
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    def subscribe(self, device_id: Optional[str] = None, types: Iterable[str] = ('scan',)) -> Subscription:
+        """Start receiving scans from one scanner, or from all of them
+
+        types may add other event types to the same subscription (used by
+        the HTTP /events stream).
+        """
+        predicate = None
+        if device_id:
+            predicate = lambda event: event_device_id(event) in (None, device_id)
+        subscription = self.controller.events.subscribe(types, maxsize=self.queue_size, predicate=predicate)
+        self.subscriptions[subscription] = device_id
+        self._ensure_running()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Stop receiving scans; scanners are disarmed once nobody wants them"""
+        subscription.close()
+        self.subscriptions.pop(subscription, None)
+        if self._wake:
+            self._wake.set()
+
+    def wants(self, device) -> bool:
+        return any(device_id is None or device_id == device.device_id
+                   for device_id in self.subscriptions.values())
+
+    def has_room(self, device) -> bool:
+        """Backpressure: only scan when a subscriber of this scanner can take the result"""
+        return any(subscription.has_room for subscription, device_id in self.subscriptions.items()
+                   if device_id is None or device_id == device.device_id)
+
+    def _ensure_running(self):
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        self._wake.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="zk9500_scan_stream")
+
+    async def _run(self):
+        """Arm and disarm scanners as subscribers and the device pool change"""
+        pool = self.controller.pool
+        try:
+            while self.subscriptions:
+                self._wake.clear()
+                devices = pool.devices()
+                for device in devices:
+                    wanted = self.wants(device) and device.device_info['connected']
+                    task = self._armed.get(device)
+                    if wanted and (task is None or task.done()):
+                        logger.info(f"Scan stream armed on {device.device_id}")
+                        self._armed[device] = asyncio.create_task(self._arm(device))
+                    elif not wanted and task:
+                        task.cancel()
+                        del self._armed[device]
+
+                for device in [d for d in self._armed if d not in devices]:
+                    self._armed.pop(device).cancel()
+
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.controller.health_monitor.check_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in self._armed.values():
+                task.cancel()
+            self._armed.clear()
+
+    async def _arm(self, device):
+        """Capture loop for one scanner"""
+        client_id = f"scan-stream:{device.device_id}"
+        waiting_for_room = False
+        while True:
+            if not self.has_room(device):
+                if not waiting_for_room:
+                    self.stats['backpressure_waits'] += 1
+                    waiting_for_room = True
+                await asyncio.sleep(self.retry_interval)
+                continue
+            waiting_for_room = False
+
+            self.stats['attempts'] += 1
+            result = await self.controller.scheduler.capture(
+                client_id=client_id,
+                timeout=self.window,
+                device_id=device.device_id,
+                publish=False,
+                mode='template'
+            )
+            if result.get('success'):
+                self.stats['scans'] += 1
+                self.controller.events.publish('scan', result)
+                await asyncio.sleep(self.debounce)
+                await self._wait_for_lift(device, client_id)
+            else:
+                # No finger in this window (or the scanner is busy); try again.
+                # Every transport waits out the window for a finger, so this is not a busy loop
+                await asyncio.sleep(self.retry_interval)
+
+    async def _wait_for_lift(self, device, client_id: str):
+        """Hold a scanner until a short capture comes back without a finger
+
+        A capture that still finds one (even one rejected as low quality)
+        is the same finger and is not published. Any other failed check
+        (device error, unplug) also ends the wait; the arm loop deals with it.
+        """
+        while True:
+            result = await self.controller.scheduler.capture(
+                client_id=client_id,
+                timeout=self.lift_window,
+                device_id=device.device_id,
+                publish=False,
+                mode='template'
+            )
+            if not result.get('success') and result.get('reason') != 'low_quality':
+                return
+            self.stats['held_scans'] += 1
+            await asyncio.sleep(self.retry_interval)
+
+    async def stop(self):
+        """Disarm everything and drop all subscribers"""
+        for subscription in list(self.subscriptions):
+            self.unsubscribe(subscription)
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def get_status(self) -> Dict[str, Any]:
+        """Subscriber and arming state for /status"""
+        return {
+            'subscribers': len(self.subscriptions),
+            'armed': [device.device_id for device in self._armed],
+            'debounce': self.debounce,
+            'queue_size': self.queue_size,
+            'dropped': sum(subscription.dropped for subscription in self.subscriptions),
+            **self.stats
+        }
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+ZK9500 Tracing
+==============
+
+Span-style timing of a request across transport, capture queue, device
+and serialization, so a slow check-in can be broken down into reconnect,
+queue wait, waiting for the finger, the SDK call and encoding the reply.
+
+Spans nest through a context variable: a span opened while another is
+current becomes its child, across awaits and, via DeviceWorker, onto the
+device thread. Finished spans go to an in-memory ring buffer served by
+GET /debug/traces, and optionally to a JSON-lines file in the OTLP/JSON
+format (what the OpenTelemetry Collector's otlpjsonfile receiver reads),
+which needs no network access.
+
+Author: Pattani Installment System
+Version: 1.0.0
+"""
+
+import asyncio
+import collections
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('zk9500_span', default=None)
+
+SPAN_KINDS = {'internal': 1, 'server': 2, 'client': 3}
+
+class Span:
+    """One timed operation; use as a context manager, or end() it explicitly"""
+
+    __slots__ = ('tracer', 'name', 'kind', 'trace_id', 'span_id', 'parent_id',
+                 'start_ns', 'end_ns', 'attributes', 'error', '_token')
+
+    def __init__(self, tracer: "Tracer", name: str, parent: Optional["Span"], kind: str = 'internal',
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes or {}
+        self.error: Optional[str] = None
+        self._token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.tracer.finish(self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        if exc_type is not None and self.error is None:
+            self.error = f"{exc_type.__name__}: {exc}" if str(exc) else exc_type.__name__
+        self.end()
+        return False
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self, trace_start_ns: int) -> Dict[str, Any]:
+        """Span as shown by /debug/traces"""
+        return {
+            'name': self.name,
+            'spanId': self.span_id,
+            'parentSpanId': self.parent_id,
+            'offsetMs': round((self.start_ns - trace_start_ns) / 1e6, 3),
+            'durationMs': round(self.duration_ms, 3),
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+class NoopSpan:
+    """Stand-in while tracing is disabled"""
+
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def end(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NOOP_SPAN = NoopSpan()
+
+def otlp_value(value) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+class OTLPFileExporter:
+    """Appends finished spans to a JSON-lines file, one OTLP/JSON request per line
+
+    Spans are batched and written by a background thread so the event
+    loop never waits on the disk. The file is rotated to <name>.1 once it
+    grows past max_bytes.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = 10 * 1024 * 1024, flush_interval: float = 2.0,
+                 service_name: str = 'zk9500-bridge'):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.resource = {
+            'attributes': [
+                {'key': 'service.name', 'value': {'stringValue': service_name}},
+                {'key': 'host.name', 'value': {'stringValue': socket.gethostname()}}
+            ]
+        }
+        self.exported = 0
+        self.errors = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=10000)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="zk9500-trace-export", daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.errors += 1  # Disk too slow; drop rather than block the caller
+
+    def encode(self, spans: List[Span]) -> Dict[str, Any]:
+        """ExportTraceServiceRequest in the OTLP/JSON encoding"""
+        return {
+            'resourceSpans': [{
+                'resource': self.resource,
+                'scopeSpans': [{
+                    'scope': {'name': 'zk9500', 'version': '1.0.0'},
+                    'spans': [
+                        {
+                            'traceId': span.trace_id,
+                            'spanId': span.span_id,
+                            **({'parentSpanId': span.parent_id} if span.parent_id else {}),
+                            'name': span.name,
+                            'kind': SPAN_KINDS.get(span.kind, 1),
+                            'startTimeUnixNano': str(span.start_ns),
+                            'endTimeUnixNano': str(span.end_ns),
+                            'attributes': [{'key': k, 'value': otlp_value(v)} for k, v in span.attributes.items()],
+                            'status': {'code': 2, 'message': span.error} if span.error else {'code': 0}
+                        }
+                        for span in spans
+                    ]
+                }]
+            }]
+        }
+
+    def _write(self, spans: List[Span]):
+        line = json.dumps(self.encode(spans), separators=(',', ':')) + '\n'
+        try:
+            if self.path.exists() and self.path.stat().st_size + len(line) > self.max_bytes:
+                os.replace(self.path, self.path.with_name(self.path.name + '.1'))
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self.exported += len(spans)
+        except OSError as e:
+            self.errors += 1
+            logger.warning(f"⚠️ Trace export to {self.path.name} failed: {e}")
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch, stop = [], item is None
+            if item is not None:
+                batch.append(item)
+            # Everything already queued goes out in the same line
+            while not stop:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+            if batch:
+                self._write(batch)
+            if stop:
+                return
+
+    def close(self, timeout: float = 5.0):
+        """Write out queued spans and stop the writer thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+class Tracer:
+    """Creates spans and keeps the most recent finished ones"""
+
+    def __init__(self, buffer_size: int = 2048, enabled: bool = True,
+                 exporter: Optional[OTLPFileExporter] = None):
+        self.enabled = enabled
+        self.exporter = exporter
+        self.spans: "collections.deque[Span]" = collections.deque(maxlen=buffer_size)
+
+    def configure(self, enabled: bool = True, buffer_size: int = 2048,
+                  exporter: Optional[OTLPFileExporter] = None):
+        self.close()
+        self.enabled = enabled
+        self.exporter = exporter
+        self.spans = collections.deque(self.spans, maxlen=buffer_size)
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.close()
+
+    def current(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def span(self, name: str, kind: str = 'internal', **attributes):
+        """New child of the current span (a root span if there is none)"""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, _current_span.get(), kind, attributes)
+
+    def start(self, name: str, parent: Optional[Span] = None, **attributes):
+        """Span that is not made current, for phases ended elsewhere (queue wait)"""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, parent or _current_span.get(), 'internal', attributes)
+
+    def annotate(self, **attributes):
+        """Add attributes to the current span, if any"""
+        span = _current_span.get()
+        if span is not None:
+            span.attributes.update(attributes)
+
+    @contextmanager
+    def activate(self, span: Optional[Span]):
+        """Make a span current for a block, e.g. a queued request's parent on the consumer task"""
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            _current_span.reset(token)
+
+    def traced(self, name: str, kind: str = 'internal'):
+        """Decorator running a function (sync or async) inside a span"""
+        def decorator(func):
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(name, kind):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name, kind):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def finish(self, span: Span):
+        self.spans.append(span)
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+    def traces(self, limit: int = 20, min_duration_ms: float = 0.0, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Recent traces from the ring buffer, newest first, spans ordered by start"""
+        grouped: Dict[str, List[Span]] = {}
+        for span in list(self.spans):
+            grouped.setdefault(span.trace_id, []).append(span)
+
+        traces = []
+        for trace_id, spans in grouped.items():
+            ids = {span.span_id for span in spans}
+            # Root: no parent, or its parent already fell out of the buffer
+            root = next((s for s in spans if s.parent_id is None), None) or \
+                next((s for s in spans if s.parent_id not in ids), spans[0])
+            start_ns = min(span.start_ns for span in spans)
+            duration_ms = (max(span.end_ns for span in spans) - start_ns) / 1e6
+            if duration_ms < min_duration_ms or (name and root.name != name):
+                continue
+            traces.append({
+                'traceId': trace_id,
+                'name': root.name,
+                'start': start_ns / 1e9,
+                'durationMs': round(duration_ms, 3),
+                'error': any(span.error for span in spans),
+                'spans': [span.to_dict(start_ns) for span in sorted(spans, key=lambda s: s.start_ns)]
+            })
+        traces.sort(key=lambda trace: trace['start'], reverse=True)
+        return traces[:limit]
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'buffered_spans': len(self.spans),
+            'buffer_size': self.spans.maxlen,
+            'export_file': self.exporter.path.name if self.exporter else None,
+            'exported': self.exporter.exported if self.exporter else 0,
+            'export_errors': self.exporter.errors if self.exporter else 0
+        }
+
+# Process-wide tracer, configured from [tracing] by the controller
+tracer = Tracer()
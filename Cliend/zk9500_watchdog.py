@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+ZK9500 Event Loop Watchdog
+==========================
+
+Measures event-loop lag and catches the handler responsible when the
+loop stalls. Every WebSocket client, HTTP request and /events stream
+shares one loop, so a single blocking call in a handler (device I/O, a
+sleep, a slow disk write) delays all of them at once.
+
+A task on the loop ticks every interval and records how late each tick
+ran in the zk9500_event_loop_lag_seconds histogram. A watcher thread
+checks the last tick; once the loop has been stuck for longer than the
+threshold it logs the loop thread's stack, which is the blocking call,
+while it is still blocking. The next tick logs the stall's full length.
+
+Author: Pattani Installment System
+Version: 1.0.0
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class LoopWatchdog:
+    """Lag probe on the event loop plus a thread reporting handlers that block it"""
+
+    def __init__(self, metrics, interval: float = 0.1, threshold: float = 0.25,
+                 stack_depth: int = 30, enabled: bool = True):
+        self.metrics = metrics
+        self.interval = interval
+        self.threshold = threshold
+        self.stack_depth = stack_depth
+        self.enabled = enabled
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread_id: Optional[int] = None
+        self.last_tick = 0.0  # time.monotonic() of the loop's last tick
+        self.stall_reported = False
+        self.stats = {
+            'ticks': 0,
+            'stalls': 0,
+            'max_lag_ms': 0.0,
+            'last_stall': None
+        }
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start watching the running event loop"""
+        if not self.enabled or self.running:
+            return
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.last_tick = time.monotonic()
+        self._stop.clear()
+        self._task = self.loop.create_task(self.run(), name="zk9500_loop_watchdog")
+        self._thread = threading.Thread(target=self.watch, name="zk9500-loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        """Stop watching"""
+        self._stop.set()
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def run(self):
+        """Tick on the loop and record how late each tick ran"""
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - expected, 0.0)
+            self.last_tick = now
+            self.stats['ticks'] += 1
+            self.stats['max_lag_ms'] = max(self.stats['max_lag_ms'], round(lag * 1000, 1))
+            self.metrics.loop_lag_seconds.observe(lag)
+
+            if lag >= self.threshold:
+                self.stats['stalls'] += 1
+                self.stats['last_stall'] = {'at': time.time(), 'duration_ms': round(lag * 1000, 1)}
+                self.metrics.loop_stalls.inc()
+                logger.warning(f"⚠️ Event loop was blocked for {lag * 1000:.0f} ms")
+            self.stall_reported = False
+
+    def watch(self):
+        """Watcher thread: log the loop thread's stack while the loop is blocked"""
+        check_interval = min(self.threshold / 2, self.interval)
+        while not self._stop.wait(check_interval):
+            blocked = time.monotonic() - self.last_tick - self.interval
+            if blocked >= self.threshold and not self.stall_reported:
+                self.stall_reported = True
+                logger.warning(
+                    f"⚠️ Event loop blocked for over {blocked * 1000:.0f} ms in {self.current_task_name()}, "
+                    f"blocking call:\n{self.loop_stack()}"
+                )
+
+    def current_task_name(self) -> str:
+        """Name of the task running on the loop (a plain callback if none)"""
+        try:
+            task = asyncio.current_task(self.loop)
+        except RuntimeError:
+            task = None
+        return f"task {task.get_name()}" if task else "a callback"
+
+    def loop_stack(self) -> str:
+        """Frames of the loop thread below the loop's own dispatch, i.e. the blocking call"""
+        frame = sys._current_frames().get(self.loop_thread_id)
+        if frame is None:
+            return "  (loop thread not found)"
+        stack = traceback.extract_stack(frame)
+        # Drop asyncio.run() and the loop internals above the handler
+        for index in range(len(stack) - 1, -1, -1):
+            if stack[index].name == '_run' and stack[index].filename.endswith(('asyncio/events.py', 'asyncio\\events.py')):
+                stack = stack[index + 1:]
+                break
+        return ''.join(traceback.format_list(stack[-self.stack_depth:])).rstrip()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Watchdog state for /status"""
+        return {
+            'running': self.running,
+            'interval_ms': round(self.interval * 1000, 1),
+            'threshold_ms': round(self.threshold * 1000, 1),
+            **self.stats
+        }
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+ZK9500 Device Worker
+====================
+
+Dedicated thread that owns the ZK9500 device handle.
+Blocking SDK, HID and serial calls run here so the asyncio event loop
+(WebSocket and HTTP API servers) stays responsive during a scan.
+
+CaptureScheduler sits in front of the workers and gives both front-ends
+one FIFO capture queue with coalescing, deadlines and cancellation. It
+runs one consumer per scanner in the device pool, so a request can target
+a device ID or go to whichever scanner is idle first.
+
+Author: Pattani Installment System
+Version: 1.0.0
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import contextvars
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from zk9500_tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Nobody put a finger on the scanner before the deadline: an idle outcome, not an error
+IDLE_REASONS = frozenset({'no_finger', 'timeout'})
+
+# Scans end this long before the request deadline so the waiter still gets the answer
+RESULT_MARGIN = 0.25
+
+class DeviceWorker:
+    """Single thread that serializes every blocking call to one device"""
+
+    def __init__(self, name: str = "zk9500-device"):
+        self.name = name
+        self.busy = False
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False  # stop() was called; the thread exits after its current call
+        self._lock = threading.Lock()
+
+    @property
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def in_worker_thread(self) -> bool:
+        """True when called from the worker thread itself"""
+        return threading.current_thread() is self._thread
+
+    def start(self):
+        """Start the worker thread (no-op if already running)"""
+        with self._lock:
+            self._start()
+
+    def _start(self):
+        # Also a no-op while a stopping thread is finishing a call: it still owns the device
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        logger.debug(f"Device worker {self.name} started")
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the worker thread after the current call finishes
+
+        The thread keeps its place until it has really exited, so calls
+        submitted meanwhile wait for it and then run on a fresh thread;
+        two threads never hold the device at once.
+        """
+        with self._lock:
+            thread = self._thread
+            if thread is None or self._stopping:
+                return
+            self._stopping = True
+            # Fail anything still queued so awaiting callers do not hang
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    item[0].set_exception(RuntimeError(f"Device worker {self.name} stopped"))
+            self._queue.put(None)
+
+        if thread is threading.current_thread():
+            return
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning(f"⚠️ Device worker {self.name} still busy after {timeout:g}s, it exits after the current call")
+        else:
+            logger.debug(f"Device worker {self.name} stopped")
+
+    def _run(self):
+        """Worker thread main loop"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                with self._lock:
+                    self._thread = None
+                    self._stopping = False
+                    # Calls submitted while this thread was stopping get a new one
+                    if not self._queue.empty():
+                        self._start()
+                break
+
+            future, func, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            self.busy = True
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                self.busy = False
+
+    def submit(self, func: Callable, *args, **kwargs) -> concurrent.futures.Future:
+        """Queue a call on the worker thread and return its future"""
+        future: concurrent.futures.Future = concurrent.futures.Future()
+
+        # Nested call from inside the worker would deadlock, run it inline
+        if self.in_worker_thread():
+            try:
+                future.set_result(func(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+
+        with self._lock:
+            self._start()
+            # Run in the caller's context so its trace span is the parent on this thread
+            self._queue.put((future, contextvars.copy_context().run, (func, *args), kwargs))
+        return future
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Await a call on the worker thread from the event loop"""
+        return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    def call(self, func: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Blocking call on the worker thread (for non-async callers)"""
+        return self.submit(func, *args, **kwargs).result(timeout)
+
+class CaptureRequest:
+    """A queued capture, possibly shared by several waiting callers"""
+
+    def __init__(self, key, options: Dict[str, Any], timeout: float, device_id: Optional[str] = None,
+                 publish: bool = True):
+        self.key = key
+        self.options = options
+        self.device_id = device_id  # None = any idle scanner
+        self.publish = publish  # Announce the result as a 'capture' event
+        self.enqueued_at = time.monotonic()
+        self.deadline = self.enqueued_at + timeout
+        self.future: "asyncio.Future" = asyncio.get_running_loop().create_future()
+        self.waiters = 0
+        self.started = False
+        # The first caller's span; the device call is traced under it
+        self.parent_span = tracer.current()
+        self.queue_span = tracer.start('capture.queue', device_id=device_id or 'any')
+
+class CaptureScheduler:
+    """FIFO capture queue shared by WebSocket and HTTP clients
+
+    One capture in flight per scanner; scanners come from controller.pool.
+    """
+
+    def __init__(self, controller, default_timeout: float = 30.0, quality_warning: int = 50):
+        self.controller = controller
+        self.default_timeout = default_timeout
+        self.quality_warning = quality_warning  # Captures below this quality raise a warning event
+        self.in_flight: Dict[Any, CaptureRequest] = {}  # device -> request
+        self._pending: "collections.deque[CaptureRequest]" = collections.deque()
+        self._by_key: Dict[Any, CaptureRequest] = {}
+        self._wakeups: Dict[Any, asyncio.Event] = {}  # device -> consumer wakeup
+        self._consumers: Dict[Any, asyncio.Task] = {}  # device -> consumer task
+        self.stats = {
+            'requests': 0,
+            'completed': 0,
+            'coalesced': 0,
+            'no_finger': 0,
+            'expired': 0,
+            'cancelled': 0,
+            'total_wait': 0.0,
+            'max_wait': 0.0,
+            'last_wait': 0.0
+        }
+
+    async def capture(self, client_id: Optional[str] = None, timeout: Optional[float] = None,
+                      device_id: Optional[str] = None, publish: bool = True, **options) -> Dict[str, Any]:
+        """Queue a capture and wait for its result
+
+        Requests from the same client with the same options coalesce into
+        the scan that is already queued or in flight. device_id pins the
+        request to one scanner; otherwise the first idle scanner takes it.
+        publish=False keeps the result off the event bus (the scan stream
+        publishes its own 'scan' events).
+        """
+        if device_id and self.controller.pool.get(device_id) is None:
+            self.controller.metrics.errors.inc(reason='unknown_device')
+            return {
+                'success': False,
+                'reason': 'unknown_device',
+                'message': f'Unknown device: {device_id}'
+            }
+
+        timeout = float(timeout or self.default_timeout)
+        key = (client_id, device_id, tuple(sorted(options.items()))) if client_id else None
+        self.stats['requests'] += 1
+
+        request = self._by_key.get(key) if key is not None else None
+        if request:
+            self.stats['coalesced'] += 1
+            logger.debug(f"Coalesced capture request from {client_id}")
+        else:
+            request = CaptureRequest(key, options, timeout, device_id or None, publish)
+            if key is not None:
+                self._by_key[key] = request
+            self._pending.append(request)
+            self.refresh_devices()
+
+        request.waiters += 1
+        timed_out = False
+        try:
+            remaining = max(request.deadline - time.monotonic(), 0)
+            return await asyncio.wait_for(asyncio.shield(request.future), remaining)
+        except asyncio.TimeoutError:
+            timed_out = True
+            self.controller.metrics.errors.inc(reason='request_timeout')
+            return {
+                'success': False,
+                'reason': 'request_timeout',
+                'message': f'Capture timed out after {timeout:g}s'
+            }
+        finally:
+            request.waiters -= 1
+            if request.waiters == 0 and not request.started and not request.future.done():
+                # Nobody is waiting any more, drop it before it reaches the device
+                request.future.cancel()
+                self.stats['expired' if timed_out else 'cancelled'] += 1
+                request.queue_span.set(outcome='expired' if timed_out else 'cancelled')
+                self._forget(request)
+
+    def cancel(self, client_id: str) -> int:
+        """Cancel queued (not yet started) captures for a client"""
+        cancelled = 0
+        for request in list(self._pending):
+            if request.key and request.key[0] == client_id and not request.future.done():
+                # Answer every waiter; a cancelled future would raise CancelledError in their tasks
+                self._pending.remove(request)
+                request.queue_span.set(outcome='cancelled')
+                self._forget(request)
+                request.future.set_result({
+                    'success': False,
+                    'reason': 'cancelled',
+                    'message': 'Capture request was cancelled'
+                })
+                cancelled += 1
+        self.stats['cancelled'] += cancelled
+        return cancelled
+
+    def refresh_devices(self):
+        """Start a consumer for every scanner in the pool and wake them all"""
+        loop = asyncio.get_running_loop()
+        for device in self.controller.pool.devices():
+            task = self._consumers.get(device)
+            if task is None or task.done():
+                self._wakeups[device] = asyncio.Event()
+                self._consumers[device] = loop.create_task(
+                    self._run(device), name=f"capture_scheduler:{device.device_id}"
+                )
+        for wakeup in self._wakeups.values():
+            wakeup.set()
+
+    def _forget(self, request: CaptureRequest):
+        request.queue_span.end()
+        if request.key is not None and self._by_key.get(request.key) is request:
+            del self._by_key[request.key]
+
+    def _accepts(self, device, request: CaptureRequest) -> bool:
+        """Whether this scanner should take the request"""
+        if request.device_id is not None:
+            return device.device_id == request.device_id
+        if device.device_info['connected']:
+            return True
+        # A disconnected primary only answers when no scanner at all is connected
+        return device is self.controller and not any(
+            d.device_info['connected'] for d in self.controller.pool.devices()
+        )
+
+    def _next_request(self, device) -> Optional[CaptureRequest]:
+        """Oldest queued request this scanner should take; fails stale ones on the way"""
+        now = time.monotonic()
+        for request in list(self._pending):
+            if request.future.done():
+                self._pending.remove(request)
+                self._forget(request)
+                continue
+
+            if now >= request.deadline:
+                reason, message = 'queue_expired', 'Capture request expired while queued'
+            elif request.device_id is not None and self.controller.pool.get(request.device_id) is None:
+                reason, message = 'device_gone', f'Device {request.device_id} is no longer available'
+            elif self._accepts(device, request):
+                self._pending.remove(request)
+                return request
+            else:
+                continue
+
+            self._pending.remove(request)
+            self.stats['expired'] += 1
+            request.queue_span.set(outcome=reason)
+            self._forget(request)
+            self.controller.metrics.errors.inc(reason=reason)
+            request.future.set_result({
+                'success': False,
+                'reason': reason,
+                'message': message
+            })
+        return None
+
+    async def _run(self, device):
+        """Consumer: hand queued captures to one scanner, one at a time"""
+        wakeup = self._wakeups[device]
+        while device in self.controller.pool.devices():
+            wakeup.clear()
+            request = self._next_request(device)
+            if request is None:
+                await wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            wait = now - request.enqueued_at
+            self.stats['last_wait'] = wait
+            self.stats['total_wait'] += wait
+            self.stats['max_wait'] = max(self.stats['max_wait'], wait)
+            self.controller.metrics.queue_wait_seconds.observe(wait)
+
+            request.started = True
+            request.queue_span.set(device_id=device.device_id)
+            request.queue_span.end()
+            self.in_flight[device] = request
+            try:
+                with tracer.activate(request.parent_span):
+                    result = await device.capture_fingerprint_async(
+                        timeout=max(request.deadline - now - RESULT_MARGIN, 0.1), **request.options
+                    )
+                result.setdefault('deviceId', device.device_id)
+            except Exception as e:
+                logger.error(f"Scheduled capture error on {device.device_id}: {e}")
+                result = {
+                    'success': False,
+                    'reason': 'capture_exception',
+                    'message': f'Capture error: {str(e)}'
+                }
+            finally:
+                del self.in_flight[device]
+                self._forget(request)
+
+            self.stats['completed'] += 1
+            if not result.get('success'):
+                if result.get('reason') in IDLE_REASONS:
+                    self.stats['no_finger'] += 1
+                else:
+                    self.controller.metrics.errors.inc(reason=result.get('reason', 'capture_failed'))
+            if not request.future.done():
+                request.future.set_result(result)
+            self._publish(request, result)
+
+        # Scanner left the pool
+        self._consumers.pop(device, None)
+        self._wakeups.pop(device, None)
+
+    def _publish(self, request: CaptureRequest, result: Dict[str, Any]):
+        """Announce a finished capture and any low-quality warning on the event bus"""
+        events = self.controller.events
+        if request.publish:
+            events.publish('capture', result)
+
+        quality = result.get('quality')
+        if result.get('success') and quality is not None and quality < self.quality_warning:
+            events.publish('quality_warning', {
+                'deviceId': result.get('deviceId'),
+                'quality': quality,
+                'threshold': self.quality_warning,
+                'captureTime': result.get('captureTime')
+            })
+
+    def get_status(self) -> Dict[str, Any]:
+        """Queue depth and wait-time statistics for /status"""
+        now = time.monotonic()
+        started = self.stats['completed'] + len(self.in_flight)
+        oldest = max((now - r.enqueued_at for r in self._pending if not r.future.done()), default=0.0)
+        return {
+            'depth': sum(1 for r in self._pending if not r.future.done()),
+            'in_flight': len(self.in_flight),
+            'devices': len(self._consumers),
+            'waiting_clients': sum(r.waiters for r in self._pending) + sum(r.waiters for r in self.in_flight.values()),
+            'requests': self.stats['requests'],
+            'completed': self.stats['completed'],
+            'coalesced': self.stats['coalesced'],
+            'no_finger': self.stats['no_finger'],
+            'expired': self.stats['expired'],
+            'cancelled': self.stats['cancelled'],
+            'oldest_wait_ms': round(oldest * 1000, 1),
+            'last_wait_ms': round(self.stats['last_wait'] * 1000, 1),
+            'avg_wait_ms': round(self.stats['total_wait'] / started * 1000, 1) if started else 0.0,
+            'max_wait_ms': round(self.stats['max_wait'] * 1000, 1)
+        }
+
+    async def close(self):
+        """Stop the consumer and fail anything still queued or in flight"""
+        shutting_down = {
+            'success': False,
+            'reason': 'shutting_down',
+            'message': 'Capture service is shutting down'
+        }
+        for request in [*self._pending, *self.in_flight.values()]:
+            if not request.future.done():
+                request.future.set_result(dict(shutting_down))
+        self._pending.clear()
+        self._by_key.clear()
+        tasks = list(self._consumers.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._consumers.clear()
+        self._wakeups.clear()